@@ -3,22 +3,84 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 
+from src.cot.alerts import STATUSES, load_alerts
+from src.cot.correlation import ALL_SCOPE, CORR_WINDOWS, load_crowding
+from src.cot.events import EVENT_HORIZONS, load_event_summary
+from src.cot.instrument import span
+from src.cot.publish import manifest_token, read_manifest, read_release_frame
+from src.cot.sketch import load_sketch_store
+from src.cot.tff_groups import TFF_GROUPS, load_tff_groups
+from src.cot.screener import (
+    BASES, BASIS_LABELS, LOOKBACK_LABELS, LOOKBACKS_BY_SCORE_TYPE, SCORE_TYPES,
+    change_column, extreme_direction, load_cube_index, lookup, score_column,
+)
+
 st.set_page_config(
     page_title="CFTC CoT Dashboard",
     layout="wide"
 )
 
-@st.cache_data
-def load_data():
-    metrics = pd.read_parquet("data/processed/cot_metrics.parquet")
-    latest = pd.read_parquet("data/processed/cot_latest_snapshot.parquet")
-    return metrics, latest
-
-metrics, latest = load_data()
-
-# --- Ensure types are correct for plotting ---
-metrics["date"] = pd.to_datetime(metrics["date"], errors="coerce")
-latest["date"] = pd.to_datetime(latest["date"], errors="coerce")
+# `token` is the stat() signature of CURRENT.json. A new publish changes it,
+# so the next rerun in any session misses the cache and loads the new release.
+# max_entries=2 keeps the previous version around while in-flight reruns finish.
+# cache_resource (not cache_data): the frames are memory-mapped Arrow views
+# shared by every session, so there is no per-hit pickle/copy. Treat as read-only.
+@st.cache_resource(max_entries=2)
+def load_data(token):
+    with span("app.load.load_data"):  # body only runs on a cache miss (load_test counts these)
+        manifest = read_manifest()
+        metrics = read_release_frame("cot_metrics.parquet", manifest=manifest)
+        latest = read_release_frame("cot_latest_snapshot.parquet", manifest=manifest)
+        return metrics, latest
+
+# The screener cube is small and read-only: keep one shared copy resident
+# per release instead of a pickled copy per session.
+@st.cache_resource(max_entries=2)
+def load_screener(token):
+    with span("app.load.load_screener"):
+        return load_cube_index()
+
+# Historical outcomes after extreme flags (None for releases without one)
+@st.cache_resource(max_entries=2)
+def load_events(token):
+    with span("app.load.load_events"):
+        return load_event_summary()
+
+# Rule-based alert diff (new / persisting / cleared), evaluated in the pipeline
+@st.cache_resource(max_entries=2)
+def load_alert_diff(token):
+    with span("app.load.load_alert_diff"):
+        return load_alerts()
+
+# Year-block quantile sketches: percentile over any number of years
+@st.cache_resource(max_entries=2)
+def load_sketches(token):
+    with span("app.load.load_sketches"):
+        return load_sketch_store()
+
+# Rolling cross-market correlation / crowding (None, None for older releases)
+@st.cache_resource(max_entries=2)
+def load_crowding_frames(token):
+    with span("app.load.load_crowding_frames"):
+        return load_crowding()
+
+# Dealer / asset manager / leveraged funds scores + divergences (None if not published)
+@st.cache_resource(max_entries=2)
+def load_trader_groups(token):
+    with span("app.load.load_trader_groups"):
+        return load_tff_groups()
+
+token = manifest_token()
+metrics, latest = load_data(token)
+cube_index = load_screener(token)
+events = load_events(token)
+alerts = load_alert_diff(token)
+sketches = load_sketches(token)
+crowd, corr_latest = load_crowding_frames(token)
+tff_groups = load_trader_groups(token)
+
+# NOTE: metrics/latest are shared across sessions -> never assign into them.
+# Dates are already datetime64 in the published files.
 
 # --- Altair: avoid max_rows issues ---
 alt.data_transformers.disable_max_rows()
@@ -36,7 +98,7 @@ st.sidebar.header("Controls")
 
 asset_class = st.sidebar.selectbox(
     "Asset Class",
-    options=["FX", "Equities", "Commodities", "Crypto", "Rates"]
+    options=["FX", "Equities", "Commodities", "Crypto", "Rates", "Composites"]
 )
 
 markets = (
@@ -60,12 +122,26 @@ expression = st.sidebar.selectbox(
 
 score_type = st.sidebar.selectbox(
     "Score type",
-    options=["percentile", "z", "minmax"]
+    options=SCORE_TYPES
 )
 
+# EW score types take a half-life instead of a window
 lookback = st.sidebar.selectbox(
     "Lookback window",
-    options=["3y", "5y", "max"]
+    options=LOOKBACKS_BY_SCORE_TYPE[score_type],
+    format_func=lambda lb: LOOKBACK_LABELS.get(lb, lb),
+)
+
+# own history vs same-date asset-class peers (e.g. JPY 5y z vs all FX this week)
+score_basis = st.sidebar.selectbox(
+    "Score basis",
+    options=BASES,
+    format_func=lambda b: BASIS_LABELS[b],
+)
+
+# 0 = off; any N uses the published year-block sketches (approximate)
+custom_years = st.sidebar.number_input(
+    "Custom percentile lookback (years)", min_value=0, max_value=30, value=0, step=1,
 )
 
 change_horizon = st.sidebar.selectbox(
@@ -78,17 +154,8 @@ change_horizon = st.sidebar.selectbox(
     format_func=lambda x: x[0]
 )[1]
 
-# map UI lookback → metrics suffix used in parquet (common: weeks)
-LOOKBACK_SUFFIX = {"3y": "156w", "5y": "260w", "max": "max"}
-lb = LOOKBACK_SUFFIX.get(lookback, lookback)
-
-score_col = {
-    "percentile": f"{expression}_pctile_{lookback}",
-    "z": f"{expression}_z_{lookback}",
-    "minmax": f"{expression}_minmax_{lookback}",
-}[score_type]
-
-chg_col = f"{expression}_chg_{change_horizon}"
+score_col = score_column(expression, score_type, lookback, score_basis)
+chg_col = change_column(expression, change_horizon)
 
 # -------------------------
 # Filter data (NOW hist exists)
@@ -132,37 +199,64 @@ st.subheader("Positioning Summary")
 row = row_latest
 
 c1, c2, c3, c4 = st.columns(4)
-c1.metric("Score", f"{row[score_col]:.1f}" if pd.notna(row[score_col]) else "—")
+c1.metric("Score", f"{row.get(score_col):.1f}" if pd.notna(row.get(score_col)) else "—")
 c2.metric("Net (contracts)", f"{row['net']:,.0f}" if pd.notna(row["net"]) else "—")
 c3.metric(f"Δ {change_horizon}", f"{row[chg_col]:+.0f}" if pd.notna(row[chg_col]) else "—")
 c4.metric("%OI Net", f"{row['pct_oi_net']:.2%}" if pd.notna(row["pct_oi_net"]) else "—")
 
-# flags
+if custom_years and sketches is not None and pd.notna(row[expression]):
+    p, err = sketches.percentile(
+        row["dataset"], row["group"], row["cftc_code"], expression,
+        float(row[expression]), int(custom_years), pd.Timestamp(row["date"]).year,
+    )
+    if pd.notna(p):
+        st.caption(
+            f"Percentile over the last {custom_years} calendar years: **{p:.1f}**"
+            + (f" (± {err:.1f} pts, sketch estimate)" if err else " (exact)")
+        )
+
+# flags: extreme zone of the selected score + published rule alerts for this market
 flags = []
 score = row.get(score_col)
-chg = row.get(chg_col)
-
-if pd.notna(score):
-    if score_type in ["percentile", "minmax"]:
-        # 0–100 scale
-        if score >= 90:
-            flags.append("Extreme long")
-        elif score <= 10:
-            flags.append("Extreme short")
-
-    elif score_type == "z":
-        # z-score scale (std devs from mean)
-        if score >= 2:
-            flags.append("Extreme long (>= +2σ)")
-        elif score <= -2:
-            flags.append("Extreme short (<= -2σ)")
-
-if pd.notna(chg) and abs(chg) >= 0.02 and expression == "pct_oi_net":
-    flags.append("⚡ Big weekly move (%OI)")
+direction = int(extreme_direction([score], score_type)[0]) if pd.notna(score) else 0
+
+if direction:
+    label = "Extreme long" if direction > 0 else "Extreme short"
+    if score_type in ("z", "ewma_z", "seasonal_z"):
+        label += " (>= +2σ)" if direction > 0 else " (<= -2σ)"
+    flags.append(label)
+
+if alerts is not None:
+    active = alerts[(alerts["market"] == market) & (alerts["status"] != "cleared")]
+    for rule, status in zip(active["rule"], active["status"]):
+        flags.append(f"⚡ {rule}" + (" (new)" if status == "new" else ""))
 
 if flags:
     st.info(" | ".join(flags))
 
+# What usually followed this flag (own-history scores only)
+if events is not None and direction != 0 and score_basis == "own":
+    ev = events[
+        (events["expression"] == expression)
+        & (events["score_type"] == score_type)
+        & (events["lookback"] == lookback)
+        & (events["direction"] == direction)
+    ]
+    ev_class = ev[ev["asset_class"] == asset_class]
+    ev = ev_class if not ev_class.empty else ev[ev["asset_class"] == "All"]
+    if not ev.empty:
+        ev_tbl = (
+            ev.pivot_table(index="horizon", columns="outcome", values=["n", "hit_rate", "median"])
+              .reindex([h for h in EVENT_HORIZONS if h in set(ev["horizon"])])
+        )
+        ev_tbl.columns = [f"{outcome} {stat}" for stat, outcome in ev_tbl.columns]
+        with st.expander(f"What followed past flags like this ({ev['asset_class'].iloc[0]})"):
+            st.caption(
+                "Every past episode where this score first entered the same extreme zone. "
+                "hit_rate = share of episodes where the outcome moved against the crowded side."
+            )
+            st.dataframe(ev_tbl, use_container_width=True)
+
 # -------------------------
 # Driver breakdown table (PM-intuitive sign convention)
 # Δ Long (1w) = L_t - L_{t-1}
@@ -219,6 +313,13 @@ else:
         level_title = "Net (contracts)"
         level_fmt = ",.0f"
 
+    seas_cols = [f"{level_col}_seas_{k}_5y" for k in ("mean", "lo", "hi")]
+    has_band = all(c in hist.columns for c in seas_cols) and hist[seas_cols[0]].notna().any()
+    if has_band:
+        scale = 100 if level_col == "pct_oi_net" else 1
+        for c, k in zip(seas_cols, ("seas_mean", "seas_lo", "seas_hi")):
+            base[k] = pd.to_numeric(hist.loc[base.index, c], errors="coerce") * scale
+
     # Make sure Altair doesn't silently choke on long series
     alt.data_transformers.disable_max_rows()
 
@@ -234,6 +335,17 @@ else:
         y=alt.Y("level_plot:Q", title=level_title),
     )
 
+    # DIS commodities: same-weeks-of-prior-years average and p10-p90 band,
+    # drawn on the level axis (nested layer so it shares that scale)
+    if has_band:
+        band = chart_base.mark_area(opacity=0.15).encode(
+            x="date:T", y="seas_lo:Q", y2="seas_hi:Q",
+        )
+        seas_mean = chart_base.mark_line(opacity=0.5, strokeDash=[1, 2]).encode(
+            x="date:T", y="seas_mean:Q",
+        )
+        level_line = alt.layer(band, seas_mean, level_line)
+
     layers = [level_line]
 
     # Dotted: score (right axis) if available
@@ -275,6 +387,9 @@ else:
         f"Legend — Solid: {level_title} (score not available for this selection)"
     )
 
+    if has_band:
+        st.caption("Shaded: seasonal p10-p90 band and average (same weeks of the prior 5 years)")
+
     st.caption(
         "Solid line shows how positioning is building/unwinding over time. "
         "Dotted score standardises today’s positioning vs its own history, helping to spot crowded extremes."
@@ -284,6 +399,43 @@ else:
 
     st.altair_chart(chart, use_container_width=True)
 
+# -------------------------
+# TFF trader categories side by side
+# -------------------------
+TFF_GROUP_NAMES = {"dealer": "Dealers", "asset_mgr": "Asset managers", "lev_money": "Leveraged funds"}
+
+if tff_groups is not None and row_latest.get("dataset") == "TFF":
+    cat_hist = tff_groups[tff_groups["cftc_code"] == row_latest["cftc_code"]].sort_values("date")
+    cat_tag = lookback if lookback in ("3y", "5y") else "5y"
+    cat_cols = {f"{g}_{expression}_pctile_{cat_tag}": TFF_GROUP_NAMES[g] for g in TFF_GROUPS}
+
+    if not cat_hist.empty and all(c in cat_hist.columns for c in cat_cols):
+        st.subheader("Trader Categories")
+        st.caption(
+            f"{cat_tag} percentile of {expression} for each TFF trader category. "
+            "Categories far apart (e.g. asset managers near their max long while leveraged funds "
+            "sit near their max short) show up as large divergences below."
+        )
+        cat_long = (
+            cat_hist[["date"] + list(cat_cols)]
+            .rename(columns=cat_cols)
+            .melt("date", var_name="Category", value_name="Percentile")
+            .dropna()
+        )
+        cat_chart = alt.Chart(cat_long).mark_line().encode(
+            x=alt.X("date:T", title="Date"),
+            y=alt.Y("Percentile:Q", scale=alt.Scale(domain=[0, 100])),
+            color=alt.Color("Category:N"),
+            tooltip=["date:T", "Category:N", alt.Tooltip("Percentile:Q", format=".1f")],
+        ).interactive()
+        st.altair_chart(cat_chart, use_container_width=True)
+
+        last = cat_hist.iloc[-1]
+        pairs = [(a, b) for i, a in enumerate(TFF_GROUPS) for b in TFF_GROUPS[i + 1:]]
+        for col, (a, b) in zip(st.columns(len(pairs)), pairs):
+            v = last.get(f"{a}_vs_{b}_{expression}_pctile_{cat_tag}")
+            col.metric(f"{TFF_GROUP_NAMES[a]} − {TFF_GROUP_NAMES[b]}", "n/a" if pd.isna(v) else f"{v:+.0f} pts")
+
 # -------------------------
 # Chart 2: Weekly Change Decomposition (consistent with driver table)
 # -------------------------
@@ -318,7 +470,9 @@ st.subheader("Cross-Asset Positioning Map")
 st.caption(
     "Each dot represents one market. \n\n"
     "X-axis shows how extreme current positioning is relative to its history "
-    f"({score_type} score, {lookback} lookback). "
+    f"({score_type} score, {lookback} lookback"
+    + (", ranked vs asset-class peers" if score_basis == "peer" else "")
+    + "). "
     "Higher values = more crowded long; lower values = more crowded short. \n\n"
     "Y-axis shows recent positioning momentum "
     f"(Δ {change_horizon}). "
@@ -329,46 +483,89 @@ st.caption(
     "bottom-left = depressed and still selling."
 )
 
-scatter_df = latest.query("asset_class == @asset_class")
-
-scatter = scatter_df[
-    ["market", score_col, chg_col]
-].dropna()
+# precomputed slice of the screener cube (score -> "score", change -> "chg")
+scatter = lookup(
+    cube_index, asset_class, expression, score_type, lookback, change_horizon, basis=score_basis
+)[["market", "score", "chg"]].dropna()
 
 chart = alt.Chart(scatter).mark_circle(size=120).encode(
-    x=alt.X(f"{score_col}:Q", title=score_col),
-    y=alt.Y(f"{chg_col}:Q", title=chg_col),
+    x=alt.X("score:Q", title=score_col),
+    y=alt.Y("chg:Q", title=chg_col),
     tooltip=[
         alt.Tooltip("market:N", title="Market"),
-        alt.Tooltip(f"{score_col}:Q", title=score_col, format=".2f"),
-        alt.Tooltip(f"{chg_col}:Q", title=chg_col, format=",.0f"),
+        alt.Tooltip("score:Q", title=score_col, format=".2f"),
+        alt.Tooltip("chg:Q", title=chg_col, format=",.0f"),
     ]
 ).interactive()
 
 st.altair_chart(chart, use_container_width=True)
 
+# -------------------------
+# Chart 4: Cross-market crowding
+# -------------------------
+if crowd is not None and len(crowd):
+    st.subheader("Cross-Market Crowding")
+
+    corr_expr = "pct_oi_net_chg_1w" if expression == "pct_oi_net" else "net_chg_1w"
+    corr_window = st.sidebar.selectbox("Correlation window", options=list(CORR_WINDOWS), index=1)
+
+    # composites are sums of single contracts, so they have no scope of their own
+    scope = asset_class if (crowd["scope"] == asset_class).any() else ALL_SCOPE
+    series = crowd[
+        (crowd["expression"] == corr_expr) & (crowd["window"] == corr_window) & (crowd["scope"] == scope)
+    ][["date", "eig_share", "avg_corr", "n_contracts"]]
+
+    st.caption(
+        f"How much of the weekly change in positioning ({corr_expr}) across {scope} contracts is one trade. "
+        f"Top-eigenvalue share of the rolling {corr_window} correlation matrix: 1/n when markets move "
+        "independently, towards 1 when they all move together (e.g. a single \"short USD\" trade in FX)."
+    )
+    crowd_chart = alt.Chart(series).mark_line().encode(
+        x=alt.X("date:T", title="Date"),
+        y=alt.Y("eig_share:Q", title="Top-eigenvalue share"),
+        tooltip=[
+            alt.Tooltip("date:T", title="Date"),
+            alt.Tooltip("eig_share:Q", title="Eigenvalue share", format=".2f"),
+            alt.Tooltip("avg_corr:Q", title="Avg pairwise corr", format=".2f"),
+            alt.Tooltip("n_contracts:Q", title="Contracts"),
+        ],
+    ).interactive()
+    st.altair_chart(crowd_chart, use_container_width=True)
+
+    if corr_latest is not None and scope != ALL_SCOPE:
+        heat = corr_latest[
+            (corr_latest["expression"] == corr_expr) & (corr_latest["window"] == corr_window)
+            & (corr_latest["asset_class_i"] == scope) & (corr_latest["asset_class_j"] == scope)
+        ]
+        if len(heat):
+            st.caption(f"Latest {corr_window} correlation matrix ({pd.to_datetime(heat['date'].iloc[0]).date()})")
+            heat_chart = alt.Chart(heat).mark_rect().encode(
+                x=alt.X("market_i:N", title=None),
+                y=alt.Y("market_j:N", title=None),
+                color=alt.Color("corr:Q", scale=alt.Scale(scheme="redblue", domain=[-1, 1], reverse=True)),
+                tooltip=["market_i:N", "market_j:N", alt.Tooltip("corr:Q", format=".2f")],
+            )
+            st.altair_chart(heat_chart, use_container_width=True)
+
 # -------------------------
 # Screener
 # -------------------------
 st.subheader("Cross-Asset Screener")
 
-screener_cols = ["market", "date", "net", "pct_oi_net", score_col, chg_col]
-
-tbl = (
-    latest.query("asset_class == @asset_class")[screener_cols]
-    .dropna(subset=[score_col])
-    .copy()
-)
+screener_cols = ["market", "date", "net", "pct_oi_net", "score", "chg"]
 
 sort_mode = st.sidebar.radio(
     "Screener sort",
     options=["Most extreme", "Biggest change"],
 )
 
-if sort_mode == "Most extreme":
-    tbl = tbl.sort_values(score_col, ascending=False)
-else:
-    tbl = tbl.sort_values(chg_col, ascending=False, key=lambda s: s.abs())
+# already sorted for this sort mode in the pipeline
+tbl = (
+    lookup(cube_index, asset_class, expression, score_type, lookback, change_horizon, sort_mode,
+           basis=score_basis)[screener_cols]
+    .dropna(subset=["score"])
+    .copy()
+)
 
 # -------------------------
 # Clean formatting
@@ -379,7 +576,7 @@ if "pct_oi_net" in tbl.columns:
     tbl["pct_oi_net"] = tbl["pct_oi_net"] * 100
 
 # Round numeric columns nicely
-round_cols = [score_col, "pct_oi_net"]
+round_cols = ["score", "pct_oi_net"]
 for col in round_cols:
     if col in tbl.columns:
         tbl[col] = tbl[col].round(2)
@@ -390,8 +587,8 @@ tbl = tbl.rename(columns={
     "date": "Date",
     "net": "Net (contracts)",
     "pct_oi_net": "%OI Net",
-    score_col: "Score",
-    chg_col: "Δ 1w"
+    "score": "Score",
+    "chg": f"Δ {change_horizon}"
 })
 
 # Reset index and add Rank column
@@ -407,6 +604,25 @@ st.caption(
 # Display
 st.dataframe(tbl, use_container_width=True, hide_index=True)
 
+# -------------------------
+# Alerts since the previous report
+# -------------------------
+if alerts is not None:
+    st.subheader("Alerts")
+    st.caption("Rule-based alerts for this asset class vs the previous report (rules: config.ALERT_RULES).")
+    cls_alerts = alerts[alerts["asset_class"] == asset_class]
+    counts = cls_alerts["status"].value_counts()
+    for col, status in zip(st.columns(len(STATUSES)), STATUSES):
+        col.metric(status.capitalize(), int(counts.get(status, 0)))
+    st.dataframe(
+        cls_alerts[["status", "rule", "severity", "market", "date"]]
+        .sort_values(["status", "rule"])
+        .rename(columns={"status": "Status", "rule": "Rule", "severity": "Severity",
+                         "market": "Market", "date": "Date"}),
+        use_container_width=True,
+        hide_index=True,
+    )
+
 # footer
 max_date = pd.to_datetime(latest["date"]).max()
 st.caption(f"As-of report date: {max_date.date()} (positions as of Tuesday; published Friday)")
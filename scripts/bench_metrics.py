@@ -0,0 +1,226 @@
+# scripts/bench_metrics.py
+# Benchmark + equivalence suite for add_position_metrics on synthetic panels.
+#
+#   python -m scripts.bench_metrics                      # default sizes, compare to baseline
+#   python -m scripts.bench_metrics --sizes 20x260 200x1040 --memory
+#   python -m scripts.bench_metrics --update-baseline    # after an intended speed change
+#
+# Exit code 1 if any engine's output differs from the frozen reference
+# implementation or a timing regresses past the stored baseline. Timings are
+# compared as a ratio to the reference engine timed in the same process (so a
+# slower or busier machine does not look like a regression); --advisory-timing
+# reports timing regressions as warnings without failing the run.
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from src.cot import instrument
+from src.cot.metrics import add_position_metrics
+from src.cot.metrics_cache import MetricsCache
+from src.cot.reference_metrics import reference_add_position_metrics
+from src.cot.synthetic import make_synthetic_panel
+
+BASELINE_PATH = "data/bench/metrics_baseline.json"
+SCORE_MARKERS = ("_pctile_", "_z_", "_minmax_", "_chg_")
+
+def _cached_cold(panel: pd.DataFrame) -> pd.DataFrame:
+    # fresh cache every call: measures fingerprint + split + write overhead
+    with tempfile.TemporaryDirectory() as d:
+        return add_position_metrics(panel, cache=MetricsCache(d))
+
+
+# name -> callable(tidy) -> metrics frame. Add alternative engines here.
+ENGINES = {
+    "reference": reference_add_position_metrics,
+    "current": add_position_metrics,
+    "cached_cold": _cached_cold,
+    "calendar": lambda panel: add_position_metrics(panel, calendar=True),
+}
+# different semantics by design (calendar weeks, not rows): timed, not compared
+TIMING_ONLY = {"calendar"}
+
+
+def parse_size(s: str) -> tuple[int, int]:
+    c, w = s.lower().split("x")
+    return int(c), int(w)
+
+
+def metric_columns(df: pd.DataFrame) -> list[str]:
+    return [c for c in df.columns if any(m in c for m in SCORE_MARKERS)]
+
+
+def run_engine(fn, panel: pd.DataFrame, memory: bool, repeat: int = 1) -> dict:
+    """
+    Time one engine, best of `repeat` runs. Family timings come from the
+    instrument spans inside metrics.py (the frozen reference has none, so it
+    only reports a total).
+    """
+    wall = float("inf")
+    for _ in range(max(repeat, 1)):
+        instrument.enable(memory=False)
+        t0 = time.perf_counter()
+        out = fn(panel)
+        t = time.perf_counter() - t0
+        if t < wall:
+            wall = t
+            families = {k: v["wall_s"] for k, v in instrument.report()["totals"].items() if k.startswith("metrics.")}
+        instrument.disable()
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn(panel)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    cells = len(out) * len(metric_columns(out))
+    return {
+        "out": out,
+        "wall_s": wall,
+        "families": families,
+        "cells": cells,
+        "cells_per_s": cells / wall if wall > 0 else None,
+        "peak_mem_bytes": peak,
+    }
+
+
+def compare(out: pd.DataFrame, ref: pd.DataFrame, rtol: float, atol: float) -> dict[str, float]:
+    """
+    Max abs difference per metric column (rows aligned on the input index).
+    Columns that differ beyond tolerance, or where NaN patterns differ, are returned.
+    """
+    out = out.sort_index()
+    ref = ref.sort_index()
+    bad: dict[str, float] = {}
+    for c in metric_columns(ref):
+        if c not in out.columns:
+            bad[c] = float("inf")
+            continue
+        a = out[c].to_numpy(dtype=float)
+        b = ref[c].to_numpy(dtype=float)
+        if not np.allclose(a, b, rtol=rtol, atol=atol, equal_nan=True):
+            both = ~np.isnan(a) & ~np.isnan(b)
+            diff = np.abs(a[both] - b[both]).max() if both.any() else 0.0
+            bad[c] = float(diff) if (np.isnan(a) == np.isnan(b)).all() else float("nan")
+    return bad
+
+
+def _baseline_ratio(baseline: dict, size: str, name: str):
+    """
+    The baseline's time-vs-reference ratio for an engine (older baselines only
+    stored wall times; the ratio is derived from them).
+    """
+    base, ref = baseline.get(f"{size}/{name}"), baseline.get(f"{size}/reference")
+    if not base:
+        return None
+    if base.get("vs_reference"):
+        return base["vs_reference"]
+    return base["wall_s"] / ref["wall_s"] if ref and ref["wall_s"] else None
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", nargs="+", default=["20x520", "60x1040"], help="contracts x weeks")
+    ap.add_argument("--engines", nargs="+", default=list(ENGINES))
+    ap.add_argument("--memory", action="store_true", help="extra tracemalloc pass per engine")
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per engine; the fastest counts")
+    ap.add_argument("--tolerance", type=float, default=0.25,
+                    help="allowed growth of the time-vs-reference ratio over the baseline's")
+    ap.add_argument("--advisory-timing", action="store_true",
+                    help="report timing regressions as warnings only")
+    ap.add_argument("--rtol", type=float, default=1e-9)
+    ap.add_argument("--atol", type=float, default=1e-9)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    results: dict[str, dict] = {}
+    failures: list[str] = []
+    warnings: list[str] = []
+
+    for size in args.sizes:
+        n_c, n_w = parse_size(size)
+        panel = make_synthetic_panel(n_contracts=n_c, n_weeks=n_w, seed=args.seed)
+        print(f"\n=== {size}: {len(panel):,} rows")
+
+        ref = None
+        for name in args.engines:
+            r = run_engine(ENGINES[name], panel, args.memory, args.repeat)
+            if name == "reference":
+                ref = r
+            elif ref is None:
+                ref = run_engine(reference_add_position_metrics, panel, False, args.repeat)
+            ref_out = ref["out"]
+            vs_ref = r["wall_s"] / ref["wall_s"] if ref["wall_s"] else None
+
+            mismatches = {} if name == "reference" or name in TIMING_ONLY else compare(r["out"], ref_out, args.rtol, args.atol)
+            key = f"{size}/{name}"
+            results[key] = {
+                "rows": len(panel),
+                "wall_s": round(r["wall_s"], 4),
+                "vs_reference": None if vs_ref is None else round(vs_ref, 3),
+                "cells_per_s": round(r["cells_per_s"] or 0.0),
+                "peak_mem_bytes": r["peak_mem_bytes"],
+                "families": {k: round(v, 4) for k, v in r["families"].items()},
+                "mismatched_columns": mismatches,
+            }
+
+            mem = f"  peak {r['peak_mem_bytes'] / 1e6:,.1f} MB" if r["peak_mem_bytes"] else ""
+            ratio = "" if vs_ref is None else f"  {vs_ref:5.2f}x ref"
+            print(f"{name:>10}: {r['wall_s']:8.3f}s  {r['cells_per_s']:>14,.0f} cells/s{ratio}{mem}")
+            for fam, secs in sorted(r["families"].items()):
+                print(f"{'':>12}{fam:<18} {secs:8.3f}s")
+
+            if mismatches:
+                failures.append(f"{key}: {len(mismatches)} columns differ from reference, e.g. "
+                                f"{list(mismatches.items())[:3]}")
+
+            base_ratio = _baseline_ratio(baseline, size, name)
+            if name != "reference" and vs_ref is not None and base_ratio and not args.update_baseline:
+                if vs_ref > base_ratio * (1 + args.tolerance):
+                    msg = (f"{key}: {vs_ref:.2f}x reference > baseline {base_ratio:.2f}x "
+                           f"(+{args.tolerance:.0%} allowed)")
+                    (warnings if args.advisory_timing else failures).append(msg)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "pandas": pd.__version__,
+                "machine": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+        print("\nbaseline written:", args.baseline)
+
+    if warnings:
+        print("\nWARN (timing, advisory)")
+        for msg in warnings:
+            print(" -", msg)
+
+    if failures:
+        print("\nFAIL")
+        for msg in failures:
+            print(" -", msg)
+        return 1
+
+    print("\nOK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
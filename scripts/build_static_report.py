@@ -0,0 +1,39 @@
+# scripts/build_static_report.py
+# Pre-render this week's report as a static site (data/site/ by default) from
+# the current release. Run after scripts.run_metrics; serve the folder with any
+# static file server, e.g. `python -m http.server -d data/site`.
+#
+#   python -m scripts.build_static_report --workers 8
+#   python -m scripts.build_static_report --force      # re-render every page
+import argparse
+import time
+
+from src.cot.instrument import enable_from_env, write_report
+from src.cot.pipeline import METRICS_FILE, SNAPSHOT_FILE
+from src.cot.publish import read_manifest, read_release_frame
+from src.cot.screener import CUBE_FILE
+from src.cot.static_report import SITE_DIR, build_site
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Render the weekly positioning report as flat files.")
+    ap.add_argument("--out", default=SITE_DIR)
+    ap.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="ignore the input hashes")
+    args = ap.parse_args()
+
+    enable_from_env()
+
+    manifest = read_manifest()
+    metrics = read_release_frame(METRICS_FILE, manifest=manifest)
+    latest = read_release_frame(SNAPSHOT_FILE, manifest=manifest)
+    cube = read_release_frame(CUBE_FILE, manifest=manifest)
+
+    t0 = time.perf_counter()
+    stats = build_site(metrics, latest, cube, out_dir=args.out,
+                       version=(manifest or {}).get("version"), workers=args.workers, force=args.force)
+    print(f"{stats['rendered']} pages rendered, {stats['skipped']} unchanged, {stats['removed']} removed "
+          f"({stats['pages']} total) in {time.perf_counter() - t0:.1f}s -> {args.out}")
+
+    report_path = write_report("build_static_report")
+    if report_path:
+        print("run report:", report_path)
@@ -0,0 +1,195 @@
+# scripts/load_test.py
+# Concurrent-session load test for the dashboard, driven headless through
+# Streamlit's AppTest (no browser, no server). Each simulated user opens a page
+# and keeps changing sidebar selections; every change is one timed rerun.
+#
+#   python -m scripts.load_test                                # 20 sessions x 25 reruns
+#   python -m scripts.load_test --sessions 50 --reruns 40 --screener-share 0.3
+#   python -m scripts.load_test --compare data/reports/load_test-20261016T090000.json
+#
+# Sessions run on threads in one process, like sessions in one Streamlit
+# server: they share st.cache_resource and contend for the GIL, which is what
+# makes Friday-afternoon reruns slow. Run it after scripts.run_metrics.
+#
+# The report (data/reports/load_test-<timestamp>.json) has, per page:
+#   p50 / p95 / p99 / max rerun latency, reruns, errors
+#   cache hit rate per cached loader: 1 - misses / lookups, where a miss is a
+#     recorded "<page>.load.<loader>" span and every rerun looks up each loader once
+# plus process RSS before / after and RSS growth per session.
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from src.cot import instrument
+from src.cot.instrument import REPORT_DIR
+from src.cot.publish import read_manifest
+
+# page name -> (script, span prefix of its cached loaders, sidebar selectboxes a user clicks)
+PAGES = {
+    "app": ("app.py", "app.load.", ["Asset Class", "Market", "Expression", "Score type",
+                                    "Lookback window", "Score basis", "Change horizon"]),
+    "screener": ("pages/1_Screener", "screener.load.", ["Asset Class", "Expression", "Score type",
+                                                        "Lookback", "Score basis", "Change horizon"]),
+}
+TIMEOUT_S = 120
+
+
+def cached_loaders(script: str) -> list[str]:
+    src = open(script).read()
+    return re.findall(r"@st\.cache_resource[^\n]*\n\s*def (\w+)\(", src)
+
+
+def _selectbox(at: AppTest, label: str):
+    for sb in at.sidebar.selectbox:
+        if sb.label == label:
+            return sb
+    return None
+
+
+def run_session(page: str, reruns: int, seed: int, start: threading.Barrier) -> dict:
+    """
+    One simulated user. Returns per-rerun latencies (first load included
+    separately) and the number of reruns that raised.
+    """
+    script, _, labels = PAGES[page]
+    rng = random.Random(seed)
+    at = AppTest.from_file(os.path.abspath(script), default_timeout=TIMEOUT_S)
+
+    start.wait()
+    t0 = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - t0
+    errors = int(len(at.exception) > 0)
+
+    lat = []
+    for _ in range(reruns):
+        sb = _selectbox(at, rng.choice(labels))
+        if sb is None or not sb.options:
+            continue
+        sb.select_index(rng.randrange(len(sb.options)))
+        t0 = time.perf_counter()
+        at.run()
+        lat.append(time.perf_counter() - t0)
+        errors += int(len(at.exception) > 0)
+
+    return {"page": page, "first_load_s": first, "latencies": lat, "errors": errors}
+
+
+def _quantiles(xs: list[float]) -> dict:
+    if not xs:
+        return {"n": 0}
+    a = np.asarray(xs)
+    return {
+        "n": len(a),
+        "mean_s": round(float(a.mean()), 4),
+        "p50_s": round(float(np.percentile(a, 50)), 4),
+        "p95_s": round(float(np.percentile(a, 95)), 4),
+        "p99_s": round(float(np.percentile(a, 99)), 4),
+        "max_s": round(float(a.max()), 4),
+    }
+
+
+def build_report(results: list[dict], spans: list[dict], args, rss0, rss1, wall: float) -> dict:
+    pages = {}
+    for page, (script, prefix, _) in PAGES.items():
+        rs = [r for r in results if r["page"] == page]
+        if not rs:
+            continue
+        lookups = sum(1 + len(r["latencies"]) for r in rs)
+        misses = {}
+        for name in cached_loaders(script):
+            misses[name] = sum(1 for s in spans if s["name"] == prefix + name)
+        pages[page] = {
+            "sessions": len(rs),
+            "rerun": _quantiles([x for r in rs for x in r["latencies"]]),
+            "first_load": _quantiles([r["first_load_s"] for r in rs]),
+            "errors": sum(r["errors"] for r in rs),
+            "cache": {
+                name: {"lookups": lookups, "misses": m, "hit_rate": round(1 - m / lookups, 4)}
+                for name, m in misses.items()
+            },
+        }
+
+    manifest = read_manifest() or {}
+    return {
+        "run": "load_test",
+        "at": datetime.now(timezone.utc).isoformat(),
+        "release": manifest.get("version", "legacy"),
+        "config": {"sessions": args.sessions, "reruns": args.reruns,
+                   "screener_share": args.screener_share, "seed": args.seed},
+        "wall_s": round(wall, 3),
+        "rss_before_bytes": rss0,
+        "rss_after_bytes": rss1,
+        "rss_per_session_bytes": int((rss1 - rss0) / max(args.sessions, 1)) if rss0 and rss1 else None,
+        "pages": pages,
+    }
+
+
+def print_report(rep: dict, base: dict | None = None) -> None:
+    print(f"release {rep['release']}  sessions {rep['config']['sessions']}  wall {rep['wall_s']:.1f}s")
+    if rep["rss_per_session_bytes"] is not None:
+        print(f"RSS {rep['rss_before_bytes'] / 2**20:.0f} -> {rep['rss_after_bytes'] / 2**20:.0f} MiB "
+              f"({rep['rss_per_session_bytes'] / 2**20:.1f} MiB / session)")
+    for page, p in rep["pages"].items():
+        r = p["rerun"]
+        line = (f"{page:9s} reruns {r.get('n', 0):5d}  p50 {r.get('p50_s', float('nan')):.3f}s  "
+                f"p95 {r.get('p95_s', float('nan')):.3f}s  p99 {r.get('p99_s', float('nan')):.3f}s  "
+                f"errors {p['errors']}")
+        old = (base or {}).get("pages", {}).get(page, {}).get("rerun", {})
+        if old.get("p95_s"):
+            line += f"  (p95 {100 * (r['p95_s'] / old['p95_s'] - 1):+.0f}% vs base)"
+        print(line)
+        for name, c in p["cache"].items():
+            print(f"{'':9s} cache {name:18s} hit rate {c['hit_rate']:.1%} ({c['misses']} misses)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Concurrent-session load test (Streamlit AppTest).")
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--reruns", type=int, default=25, help="widget changes per session")
+    ap.add_argument("--screener-share", type=float, default=0.25, help="fraction of sessions on the screener page")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--compare", default=None, help="earlier load_test report to diff against")
+    args = ap.parse_args()
+
+    # spans are how cache misses are counted
+    instrument.enable()
+
+    n_screener = int(round(args.sessions * args.screener_share))
+    pages = ["screener"] * n_screener + ["app"] * (args.sessions - n_screener)
+    start = threading.Barrier(len(pages))
+
+    rss0 = instrument.rss_bytes()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(pages)) as ex:
+        futures = [ex.submit(run_session, p, args.reruns, args.seed + i, start) for i, p in enumerate(pages)]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+    rss1 = instrument.rss_bytes()
+
+    rep = build_report(results, instrument.report("load_test")["spans"], args, rss0, rss1, wall)
+
+    out = args.out
+    if out is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        out = os.path.join(REPORT_DIR, f"load_test-{stamp}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(rep, f, indent=2)
+
+    base = None
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+    print_report(rep, base)
+    print("report:", out)
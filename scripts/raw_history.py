@@ -0,0 +1,59 @@
+# scripts/raw_history.py
+# Inspect / query / compact the bitemporal raw store (data/raw/history/<name>/).
+#
+#   python -m scripts.raw_history status tff
+#   python -m scripts.raw_history revisions tff --out data/reports/tff_revisions.csv
+#   python -m scripts.raw_history as-of tff 2026-01-16T21:00Z --out /tmp/tff_raw_asof.parquet
+#   python -m scripts.raw_history compact tff                       # merge parts, keep all versions
+#   python -m scripts.raw_history compact tff --horizon 2025-01-01  # also drop versions superseded before
+#
+# `as-of` writes the raw table exactly as it was known at that time (before any
+# later CFTC revisions); feed it to the transform + run_metrics to rebuild what
+# the dashboard showed on that Friday.
+import argparse
+import os
+
+from src.cot.raw_store import RAW_HISTORY_DIR, RawStore
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Bitemporal raw store maintenance.")
+    ap.add_argument("command", choices=["status", "revisions", "as-of", "compact"])
+    ap.add_argument("name", help="store name, e.g. tff or dis")
+    ap.add_argument("when", nargs="?", default=None, help="knowledge time for as-of (default: latest)")
+    ap.add_argument("--root", default=RAW_HISTORY_DIR)
+    ap.add_argument("--horizon", default=None, help="compact: drop versions superseded before this time")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    store = RawStore(args.name, root=args.root)
+    if store.empty:
+        raise SystemExit(f"no raw history under {store.dir}")
+
+    if args.command == "status":
+        size = sum(os.path.getsize(os.path.join(store.dir, p["file"])) for p in store.parts)
+        print(f"{store.dir}: {len(store.parts)} parts, {sum(p['rows'] for p in store.parts):,} row versions, "
+              f"{size / 2**20:.1f} MiB, horizon {store.manifest.get('horizon')}")
+        for p in store.parts:
+            print(f"  {p['file']}  {p['rows']:>8,} rows  known {p['known_min']} .. {p['known_max']}")
+        print("latest report date:", store.max_report_date())
+
+    elif args.command == "revisions":
+        rev = store.revisions()
+        print(f"{rev.groupby(store.keys).ngroups if len(rev) else 0} revised rows, {len(rev)} versions")
+        if args.out:
+            rev.to_csv(args.out, index=False)
+            print("saved:", args.out)
+        else:
+            print(rev.head(20))
+
+    elif args.command == "as-of":
+        df = store.as_of(args.when)
+        print(f"{len(df):,} rows as known at {args.when or 'latest'}")
+        if args.out:
+            df.to_parquet(args.out, index=False)
+            print("saved:", args.out)
+
+    elif args.command == "compact":
+        before = len(store.parts)
+        m = store.compact(horizon=args.horizon)
+        print(f"{before} parts -> {len(m['parts'])}, {m['parts'][0]['rows']:,} row versions kept")
@@ -0,0 +1,19 @@
+# scripts/run_api.py
+import argparse
+
+from src.cot.api import serve
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serve processed CoT data over HTTP (read-only).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+
+    httpd = serve(host=args.host, port=args.port)
+    print(f"serving on http://{args.host}:{args.port}  (/latest, /history/<code>, /cross_section)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
@@ -0,0 +1,47 @@
+# scripts/run_event_study.py
+# Ad-hoc event study over the current release. The pipeline already publishes
+# the summary table (cot_event_study.parquet); this adds episode-level output
+# and lets you try other horizons / price files / every-flagged-week mode.
+#
+#   python -m scripts.run_event_study --prices data/raw/prices.csv --horizons 2 8 52
+import argparse
+import time
+
+from src.cot.events import EVENT_HORIZONS, PRICES_PATH, find_episodes, load_prices, summarize_episodes
+from src.cot.instrument import enable_from_env, write_report
+from src.cot.pipeline import METRICS_FILE
+from src.cot.publish import read_release_frame
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Forward outcomes after extreme positioning flags.")
+    ap.add_argument("--prices", default=PRICES_PATH, help="parquet/csv with cftc_code, date, price")
+    ap.add_argument("--horizons", type=int, nargs="+", help="weeks ahead (default 1 4 13 26)")
+    ap.add_argument("--all-weeks", action="store_true", help="every flagged week, not just episode starts")
+    ap.add_argument("--episodes-out", default="data/processed/cot_event_episodes.parquet")
+    ap.add_argument("--summary-out", default=None)
+    args = ap.parse_args()
+
+    enable_from_env()
+
+    dfm = read_release_frame(METRICS_FILE)
+    prices = load_prices(args.prices)
+    horizons = {f"{w}w": w for w in args.horizons} if args.horizons else EVENT_HORIZONS
+
+    t0 = time.perf_counter()
+    episodes = find_episodes(dfm, horizons=horizons, prices=prices, onset_only=not args.all_weeks)
+    summary = summarize_episodes(episodes)
+    print(f"{len(episodes):,} episode-horizons -> {len(summary):,} summary rows "
+          f"in {time.perf_counter() - t0:.2f}s (prices: {'yes' if prices is not None else 'no'})")
+
+    episodes.to_parquet(args.episodes_out, index=False)
+    print("episodes:", args.episodes_out)
+    if args.summary_out:
+        summary.to_parquet(args.summary_out, index=False)
+        print("summary:", args.summary_out)
+
+    print(summary[(summary["asset_class"] == "All") & (summary["outcome"] == "fwd_pct_oi_net_chg")
+                  & (summary["lookback"] == "5y")].to_string(index=False))
+
+    report_path = write_report("run_event_study")
+    if report_path:
+        print("run report:", report_path)
@@ -4,6 +4,8 @@ import os
 import pandas as pd
 
 from src.cot.fetch import download_tff_by_codes, save_raw
+from src.cot.instrument import enable_from_env, write_report
+from src.cot.raw_store import RawStore
 
 UNIVERSE_PATHS = [
     "data/processed/tff_universe_raw.parquet",
@@ -12,17 +14,6 @@ UNIVERSE_PATHS = [
 
 RAW_OUT_PATH = "data/raw/tff_raw.parquet"  # full-history TFF raw
 
-# limit columns to speed up download
-TFF_SELECT = ",".join([
-    "report_date_as_yyyy_mm_dd",
-    "cftc_contract_market_code",
-    "market_and_exchange_names",
-    "contract_market_name",
-    "open_interest_all",
-    "lev_money_positions_long",
-    "lev_money_positions_short",
-    "lev_money_positions_spread",
-])
 
 
 def _first_existing(paths: list[str]) -> str:
@@ -33,6 +24,8 @@ def _first_existing(paths: list[str]) -> str:
 
 
 if __name__ == "__main__":
+    enable_from_env()
+
     universe_path = _first_existing(UNIVERSE_PATHS)
     u = pd.read_parquet(universe_path)
 
@@ -54,13 +47,9 @@ if __name__ == "__main__":
     print(f"Universe: {universe_path}")
     print(f"Codes to fetch: {len(codes)}")
 
-    # Fetch full history by code (stable across name changes)
-    df_tff_raw = download_tff_by_codes(
-        codes=codes,
-        select=TFF_SELECT,
-        chunk_size=50000,
-        in_clause_batch=50,
-    )
+    # Fetch full history by code (stable across name changes); the query
+    # planner selects only the transform's columns and sizes the IN-clauses
+    df_tff_raw = download_tff_by_codes(codes=codes)
 
     print("Downloaded rows:", len(df_tff_raw))
 
@@ -68,7 +57,15 @@ if __name__ == "__main__":
     save_raw(df_tff_raw, RAW_OUT_PATH)
     print("Saved:", RAW_OUT_PATH)
 
+    # Bitemporal history: only new or revised rows are appended
+    appended = RawStore("tff").ingest(df_tff_raw)
+    print("Raw history: +", len(appended), "new/revised rows")
+
     # Quick sanity check: min/max dates
     d = pd.to_datetime(df_tff_raw["report_date_as_yyyy_mm_dd"], errors="coerce")
     print("Min report date:", d.min())
     print("Max report date:", d.max())
+
+    report_path = write_report("run_fetch_tff")
+    if report_path:
+        print("run report:", report_path)
@@ -1,31 +1,45 @@
 # scripts/run_metrics.py
+#   python -m scripts.run_metrics               # changes / windows counted in reports
+#   python -m scripts.run_metrics --calendar    # counted in report-calendar weeks (+ coverage_<lookback>)
+import argparse
+
 import pandas as pd
 
-from src.cot.metrics import add_position_metrics
+from src.cot.instrument import enable_from_env, span, write_report
+from src.cot.metrics_cache import MetricsCache
+from src.cot.pipeline import METRICS_FILE, SNAPSHOT_FILE, publish_metrics
+from src.cot.screener import CUBE_FILE
 
 TIDY_PATH = "data/processed/cot_tidy.parquet"
-METRICS_PATH = "data/processed/cot_metrics.parquet"
-SNAPSHOT_PATH = "data/processed/cot_latest_snapshot.parquet"
 
 if __name__ == "__main__":
-    df = pd.read_parquet(TIDY_PATH)
-
-    dfm = add_position_metrics(df)
-    dfm.to_parquet(METRICS_PATH, index=False)
+    ap = argparse.ArgumentParser(description="Tidy panel -> metrics release.")
+    ap.add_argument("--calendar", action="store_true",
+                    help="align contracts to the weekly report calendar (gap-aware changes and windows)")
+    args = ap.parse_args()
+    enable_from_env()
 
-    # Latest row per (dataset, group, cftc_code)
-    latest = (
-        dfm.sort_values("date")
-           .groupby(["dataset", "group", "cftc_code"], as_index=False)
-           .tail(1)
-    )
+    with span("io.read_parquet", path=TIDY_PATH) as sp:
+        df = pd.read_parquet(TIDY_PATH)
+        sp.set(rows=len(df))
 
-    # A default ranking (you’ll let users change this in Streamlit)
-    latest = latest.sort_values("pct_oi_net_pctile_5y", ascending=False)
-    latest.to_parquet(SNAPSHOT_PATH, index=False)
+    # Metrics, latest snapshot and screener cube are written into a new release
+    # dir and the manifest is flipped atomically, so the dashboard never reads
+    # a half-written parquet.
+    # per-contract memo: only contracts whose rows (or the metric params) changed are recomputed
+    cache = MetricsCache()
+    manifest, frames = publish_metrics(df, cache=cache, calendar=args.calendar)
+    dfm, latest, cube = frames[METRICS_FILE], frames[SNAPSHOT_FILE], frames[CUBE_FILE]
 
-    print("metrics saved:", METRICS_PATH, "shape:", dfm.shape)
-    print("snapshot saved:", SNAPSHOT_PATH, "shape:", latest.shape)
+    print("published release:", manifest["version"])
+    print("metrics shape:", dfm.shape)
+    print("snapshot shape:", latest.shape)
+    print("screener cube shape:", cube.shape)
+    print("metrics cache:", cache.summary())
     print(latest[["dataset","group","market","cftc_code","date",
                   "net","net_pctile_5y","pct_oi_net","pct_oi_net_pctile_5y",
                   "net_chg_1w","pct_oi_net_chg_1w"]].head(10))
+
+    report_path = write_report("run_metrics")
+    if report_path:
+        print("run report:", report_path)
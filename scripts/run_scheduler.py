@@ -0,0 +1,14 @@
+# scripts/run_scheduler.py
+# Long-running refresh daemon: waits for the Friday CFTC release, polls for the
+# new report date and publishes a fresh release as soon as it lands.
+from src.cot.scheduler import REFRESH_LOG, RefreshScheduler, latency_summary
+
+if __name__ == "__main__":
+    sched = RefreshScheduler()
+    print("known report dates:", {k: (v.date() if v is not None else None) for k, v in sched.known.items()})
+    print("latency log:", REFRESH_LOG)
+    print(latency_summary())
+    try:
+        sched.run_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,12 @@
 from src.cot.fetch import load_raw
+from src.cot.instrument import enable_from_env, write_report
 from src.cot.transform import standardize_dis_managed_money
 
 RAW_PATH = "data/raw/dis_universe_raw.parquet"
 OUT_PATH = "data/processed/dis_managed_money_tidy.parquet"
 
 if __name__ == "__main__":
+    enable_from_env()
     df_raw = load_raw(RAW_PATH)
     df_tidy = standardize_dis_managed_money(df_raw)
 
@@ -12,3 +14,6 @@ if __name__ == "__main__":
     print(df_tidy.head())
     df_tidy.to_parquet(OUT_PATH, index=False)
     print("saved:", OUT_PATH)
+    report_path = write_report("run_transform_dis")
+    if report_path:
+        print("run report:", report_path)
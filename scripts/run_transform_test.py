@@ -1,11 +1,13 @@
 
 from src.cot.fetch import load_raw
+from src.cot.instrument import enable_from_env, write_report
 from src.cot.transform import standardize_tff_group
 
 RAW_PATH = "data/raw/tff_universe_raw.parquet"
 OUT_PATH = "data/processed/tff_levmoney_tidy.parquet"
 
 if __name__ == "__main__":
+    enable_from_env()
     df_raw = load_raw(RAW_PATH)
     df_tidy = standardize_tff_group(df_raw, group="lev_money")
 
@@ -13,3 +15,6 @@ if __name__ == "__main__":
     print(df_tidy.head())
     df_tidy.to_parquet(OUT_PATH, index=False)
     print("saved:", OUT_PATH)
+    report_path = write_report("run_transform_tff")
+    if report_path:
+        print("run report:", report_path)
@@ -0,0 +1,309 @@
+# src/cot/alerts.py
+from __future__ import annotations
+
+import ast
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.cot.config import ALERT_RULES
+from src.cot.instrument import span
+from src.cot.publish import read_manifest, release_path
+from src.cot.report_calendar import week_number
+
+### Declarative alert rules.
+###
+###   {"name": "Crowded long, still building",
+###    "rule": "pct_oi_net_pctile_5y >= 90 and net_chg_1w > 0"}
+###
+### A rule is a Python-syntax boolean expression over metrics columns, parsed
+### with `ast` (never eval'd) and compiled once into a tree of closures that
+### work on whole NumPy columns. Supported:
+###   and / or / not, comparisons (chained too), + - * /, unary -, numbers, strings
+###   abs(x), prev(x)                     previous report of the same contract
+###   crosses_above(x, t), crosses_below(x, t)   x crossed t since the previous report
+### NaN compares False (and counts as False inside and / or / not), so a rule
+### never fires on missing data. The top level must be a condition: a bare
+### column like `net_chg_1w` is rejected rather than read as "non-zero".
+###
+### alert_diff evaluates every rule on the last three reports per contract
+### (enough for crosses_* on the previous week) and classifies each
+### (rule, contract) as new / persisting / cleared between the release's latest
+### report week and the calendar week before it. Contracts that did not report
+### in the latest week are left out; a contract without a report in the
+### previous week counts as not active then. A rule that does not compile or
+### names an unknown column is reported and skipped, not fatal.
+
+ALERTS_FILE = "cot_alerts.parquet"
+RULES_PATH = "data/alerts/rules.json"
+PANEL_KEYS = ["dataset", "group", "cftc_code"]
+STATUSES = ["new", "persisting", "cleared"]
+
+_CMP = {
+    ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Lt: np.less, ast.LtE: np.less_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_BIN = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+
+class RuleError(ValueError):
+    pass
+
+
+class _Frame:
+    """
+    Column access for compiled rules: arrays are pulled out of the frame once
+    and lagged within each contract on demand (lag 1 = previous report).
+    """
+
+    def __init__(self, df: pd.DataFrame, keys: List[str]):
+        self.df = df
+        self.group = df.groupby(keys, sort=False).ngroup().to_numpy() if keys else np.zeros(len(df), dtype=int)
+        self._cols: Dict[tuple, np.ndarray] = {}
+
+    def col(self, name: str, lag: int) -> np.ndarray:
+        key = (name, lag)
+        if key not in self._cols:
+            if name not in self.df.columns:
+                raise RuleError(f"unknown column '{name}'")
+            s = self.df[name]
+            base = s.to_numpy(dtype=float, na_value=np.nan) if pd.api.types.is_numeric_dtype(s) \
+                else s.astype(object).to_numpy()
+            if lag == 0:
+                arr = base
+            else:
+                n = len(base)
+                idx = np.arange(n) - lag
+                ok = idx >= 0
+                idx = np.where(ok, idx, 0)
+                ok &= self.group[idx] == self.group
+                fill = np.nan if base.dtype.kind == "f" else None
+                arr = np.where(ok, base[idx], fill)
+            self._cols[key] = arr
+        return self._cols[key]
+
+
+Compiled = Callable[[_Frame, int], Any]
+
+
+def _compile(node: ast.AST) -> Compiled:
+    if isinstance(node, ast.Expression):
+        return _compile(node.body)
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(v) for v in node.values]
+        op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+        def f(fr, lag):
+            out = _truth(parts[0](fr, lag))
+            for p in parts[1:]:
+                out = op(out, _truth(p(fr, lag)))
+            return out
+        return f
+
+    if isinstance(node, ast.UnaryOp):
+        inner = _compile(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda fr, lag: np.logical_not(_truth(inner(fr, lag)))
+        if isinstance(node.op, ast.USub):
+            return lambda fr, lag: np.negative(inner(fr, lag))
+        raise RuleError(f"unsupported operator {type(node.op).__name__}")
+
+    if isinstance(node, ast.Compare):
+        left = _compile(node.left)
+        pairs = []
+        for op, right in zip(node.ops, node.comparators):
+            if type(op) not in _CMP:
+                raise RuleError(f"unsupported comparison {type(op).__name__}")
+            pairs.append((_CMP[type(op)], _compile(right)))
+
+        def f(fr, lag):
+            a = left(fr, lag)
+            out = None
+            for fn, right in pairs:
+                b = right(fr, lag)
+                with np.errstate(invalid="ignore"):
+                    r = _truth(fn(a, b))
+                out = r if out is None else out & r
+                a = b
+            return out
+        return f
+
+    if isinstance(node, ast.BinOp):
+        if type(node.op) not in _BIN:
+            raise RuleError(f"unsupported operator {type(node.op).__name__}")
+        fn, a, b = _BIN[type(node.op)], _compile(node.left), _compile(node.right)
+
+        def f(fr, lag):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return fn(a(fr, lag), b(fr, lag))
+        return f
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        return lambda fr, lag: fr.col(name, lag)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)) \
+            and not isinstance(node.value, bool):
+        value = node.value
+        return lambda fr, lag: value
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        fname, args = node.func.id, [_compile(a) for a in node.args]
+        if fname == "abs" and len(args) == 1:
+            return lambda fr, lag: np.abs(args[0](fr, lag))
+        if fname == "prev" and len(args) == 1:
+            return lambda fr, lag: args[0](fr, lag + 1)
+        if fname in ("crosses_above", "crosses_below") and len(args) == 2:
+            x, t = args
+            up = fname == "crosses_above"
+
+            def f(fr, lag):
+                now, before = x(fr, lag), x(fr, lag + 1)
+                t_now, t_before = t(fr, lag), t(fr, lag + 1)
+                with np.errstate(invalid="ignore"):
+                    if up:
+                        return _truth(now >= t_now) & _truth(before < t_before)
+                    return _truth(now <= t_now) & _truth(before > t_before)
+            return f
+        raise RuleError(f"unknown function {fname}() with {len(args)} argument(s)")
+
+    raise RuleError(f"unsupported syntax: {type(node).__name__}")
+
+
+def _truth(x) -> np.ndarray:
+    # NaN / None are False, so a bare column like `net_chg_1w` never fires on missing data
+    a = np.asarray(x)
+    if a.dtype.kind == "b":
+        return a
+    ok = ~pd.isna(a)
+    out = np.zeros(a.shape, dtype=bool)
+    out[ok] = a[ok].astype(bool)
+    return out
+
+
+def compile_rule(expr: str) -> Compiled:
+    """
+    Parse and compile one rule expression. Raises RuleError on bad syntax or
+    when the rule is not a condition (a bare column or arithmetic).
+    """
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise RuleError(f"cannot parse rule {expr!r}: {e.msg}") from None
+    if not _is_condition(tree.body):
+        raise RuleError(f"rule {expr!r} is not a condition: use a comparison, and/or/not or crosses_*()")
+    return _compile(tree)
+
+
+def _is_condition(node: ast.AST) -> bool:
+    if isinstance(node, (ast.Compare, ast.BoolOp)):
+        return True
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return True
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in ("crosses_above", "crosses_below"))
+
+
+def load_rules(path: str = RULES_PATH) -> List[Dict[str, Any]]:
+    """
+    Rules from a JSON list ({"name", "rule", optional "severity"}) if the file
+    exists, else config.ALERT_RULES.
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return list(ALERT_RULES)
+
+
+def evaluate_rules(
+    df: pd.DataFrame,
+    rules: Optional[List[Dict[str, Any]]] = None,
+    keys: Optional[List[str]] = None,
+    strict: bool = False,
+) -> Dict[str, np.ndarray]:
+    """
+    {rule name: boolean mask over df rows}. df must be sorted by keys + date
+    when rules use prev() / crosses_*(). Rules that fail to compile or
+    evaluate are skipped (and printed) unless strict=True.
+    """
+    rules = load_rules() if rules is None else rules
+    frame = _Frame(df, PANEL_KEYS if keys is None else keys)
+    masks: Dict[str, np.ndarray] = {}
+    for r in rules:
+        try:
+            m = np.broadcast_to(_truth(compile_rule(r["rule"])(frame, 0)), (len(df),))
+        except (RuleError, TypeError, ValueError) as e:
+            # TypeError / ValueError: compiles but the columns don't fit, e.g. market > 5
+            if strict:
+                raise RuleError(f"rule '{r['name']}': {e}") from None
+            print(f"[alerts] skipping rule '{r['name']}': {e}")
+            continue
+        masks[r["name"]] = m
+    return masks
+
+
+def alert_diff(dfm: pd.DataFrame, rules: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+    """
+    One row per (rule, contract) that is active in the latest report week or
+    was active in the week before, with status new / persisting / cleared.
+    """
+    rules = load_rules() if rules is None else rules
+    cols = ["rule", "severity", "status", *PANEL_KEYS, "market", "asset_class", "date", "prev_date"]
+
+    with span("alerts.evaluate", rules=len(rules)) as sp:
+        # last three reports per contract: now, previous, and the one before it
+        # (crosses_* on the previous report needs that)
+        tail = (
+            dfm.sort_values(PANEL_KEYS + ["date"])
+               .groupby(PANEL_KEYS, sort=False)
+               .tail(3)
+               .reset_index(drop=True)
+        )
+        masks = evaluate_rules(tail, rules)
+        rules = [r for r in rules if r["name"] in masks]
+
+        # "now" is the release's latest report week, "prev" the calendar week before
+        week = week_number(tail["date"])
+        latest = week.max() if len(week) else 0
+        g = tail.groupby(PANEL_KEYS, sort=False)
+        size = g["date"].transform("size").to_numpy()
+        pos = g.cumcount().to_numpy()
+        now_idx = np.flatnonzero((pos == size - 1) & (week == latest))
+        # rows are contiguous per contract, so the previous report is the row before
+        prev_idx = np.maximum(now_idx - 1, 0)
+        has_prev = (pos[now_idx] >= 1) & (week[prev_idx] == latest - 1)
+        now = tail.iloc[now_idx].reset_index(drop=True)
+        prev_dates = np.where(has_prev, tail["date"].to_numpy()[prev_idx], np.datetime64("NaT"))
+
+        # (rules x contracts) in one go
+        M = np.stack([masks[r["name"]] for r in rules]) if rules else np.zeros((0, len(tail)), dtype=bool)
+        a_now = M[:, now_idx]
+        a_prev = M[:, prev_idx] & has_prev[None, :]
+        status = np.select([a_now & ~a_prev, a_now & a_prev, ~a_now & a_prev], STATUSES, default="")
+        ri, ci = np.nonzero(status != "")
+
+        out = now.iloc[ci][PANEL_KEYS + ["market", "asset_class", "date"]].reset_index(drop=True)
+        out["prev_date"] = prev_dates[ci]
+        out["status"] = status[ri, ci]
+        out["rule"] = np.array([r["name"] for r in rules], dtype=object)[ri]
+        out["severity"] = np.array([r.get("severity", "info") for r in rules], dtype=object)[ri]
+        out = out[cols]
+        sp.set(rows=len(out))
+    return out
+
+
+def load_alerts(manifest: dict | None = None) -> Optional[pd.DataFrame]:
+    """
+    Published alert diff for the current release (None for releases without one).
+    """
+    if manifest is None:
+        manifest = read_manifest()
+    path = release_path(ALERTS_FILE, manifest=manifest)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
@@ -0,0 +1,284 @@
+# src/cot/api.py
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.cot.publish import PROCESSED_DIR, manifest_token, read_manifest, read_release_table
+
+### Local read-only positioning API.
+### Serves the current published release over HTTP for other teams' models:
+###   GET /health
+###   GET /latest?columns=...&asset_class=FX
+###   GET /history/<cftc_code>?columns=...&start=2020-01-01&end=2024-12-31
+###   GET /cross_section?date=2024-06-04&columns=...&asset_class=FX
+### Every endpoint returns an Arrow IPC stream (format=arrow, default) or JSON (format=json).
+### Tables are loaded once per release and sliced in memory; responses carry an
+### ETag and are kept in a small LRU so repeated requests skip serialization.
+
+METRICS_FILE = "cot_metrics.parquet"
+SNAPSHOT_FILE = "cot_latest_snapshot.parquet"
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+JSON_TYPE = "application/json"
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of serialized responses, bounded by total bytes.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, tuple[str, bytes, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[tuple[str, bytes, str]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: str, item: tuple[str, bytes, str]) -> None:
+        size = len(item[1])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._items[key] = item
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted[1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+class Release:
+    """
+    One immutable, indexed release.
+
+    History is sorted by (cftc_code, date) once at load so a per-contract
+    request is a zero-copy slice; cross-sections use a precomputed
+    date -> row indices map.
+    """
+
+    def __init__(self, version: str, metrics: pa.Table, latest: pa.Table):
+        metrics = metrics.sort_by([("cftc_code", "ascending"), ("date", "ascending")])
+        codes = metrics.column("cftc_code").to_numpy(zero_copy_only=False).astype(str)
+
+        # contiguous [start, stop) run per contract
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(codes)]
+        self._code_slices = {codes[s]: (int(s), int(e - s)) for s, e in zip(starts, stops)}
+
+        dates = metrics.column("date").to_numpy(zero_copy_only=False).astype("datetime64[ns]")
+        order = np.argsort(dates, kind="stable")
+        uniq, first = np.unique(dates[order], return_index=True)
+        bounds = np.r_[first, len(order)]
+        self._date_rows = {d: order[bounds[i]:bounds[i + 1]] for i, d in enumerate(uniq)}
+        self._dates = uniq
+
+        self.version = version
+        self.metrics = metrics
+        self.latest = latest
+
+    def history(self, code: str) -> pa.Table:
+        start, length = self._code_slices.get(code, (0, 0))
+        return self.metrics.slice(start, length)
+
+    def cross_section(self, date: Optional[str]) -> pa.Table:
+        """
+        All contracts on the latest report date on or before `date` (default: latest).
+        """
+        if len(self._dates) == 0:
+            return self.metrics.slice(0, 0)
+        if date is None:
+            d = self._dates[-1]
+        else:
+            pos = np.searchsorted(self._dates, np.datetime64(pd.Timestamp(date), "ns"), side="right") - 1
+            if pos < 0:
+                return self.metrics.slice(0, 0)
+            d = self._dates[pos]
+        return self.metrics.take(pa.array(self._date_rows[d]))
+
+
+class PositioningStore:
+    """
+    Holds the current Release. The manifest is stat()-ed on every request and a
+    new Release is built and swapped in (single attribute assignment) when a
+    new version is published; requests already running keep the one they took.
+    """
+
+    def __init__(self, root: str = PROCESSED_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._token: Any = object()
+        self._release: Optional[Release] = None
+
+    def current(self) -> Release:
+        token = manifest_token(self.root)
+        if token != self._token or self._release is None:
+            with self._lock:
+                if token != self._token or self._release is None:
+                    manifest = read_manifest(self.root)
+                    self._release = Release(
+                        version=manifest["version"] if manifest else "legacy",
+                        metrics=read_release_table(METRICS_FILE, self.root, manifest),
+                        latest=read_release_table(SNAPSHOT_FILE, self.root, manifest),
+                    )
+                    self._token = token
+        return self._release
+
+
+def _select_columns(table: pa.Table, columns: Optional[str]) -> pa.Table:
+    if not columns:
+        return table
+    wanted = [c.strip() for c in columns.split(",") if c.strip()]
+    missing = [c for c in wanted if c not in table.column_names]
+    if missing:
+        raise KeyError(f"Unknown columns: {missing}")
+    return table.select(wanted)
+
+
+def _filter_dates(table: pa.Table, start: Optional[str], end: Optional[str]) -> pa.Table:
+    if start is None and end is None:
+        return table
+    col = table.column("date")
+    mask = None
+    if start is not None:
+        mask = pc.greater_equal(col, pa.scalar(pd.Timestamp(start), type=col.type))
+    if end is not None:
+        m = pc.less_equal(col, pa.scalar(pd.Timestamp(end), type=col.type))
+        mask = m if mask is None else pc.and_(mask, m)
+    return table.filter(mask)
+
+
+def _filter_eq(table: pa.Table, column: str, value: Optional[str]) -> pa.Table:
+    if value is None or column not in table.column_names:
+        return table
+    return table.filter(pc.equal(table.column(column), value))
+
+
+def serialize(table: pa.Table, fmt: str) -> tuple[bytes, str]:
+    if fmt == "json":
+        body = table.to_pandas().to_json(orient="records", date_format="iso")
+        return body.encode(), JSON_TYPE
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue(), ARROW_STREAM
+
+
+def make_handler(store: PositioningStore, cache: ResponseCache):
+
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "cot-api/1.0"
+
+        def log_message(self, fmt, *args):  # keep stdout quiet under load
+            pass
+
+        def _send(self, status: int, body: bytes = b"", ctype: str = JSON_TYPE, etag: Optional[str] = None):
+            self.send_response(status)
+            if etag:
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+            if status != 304:
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if status != 304 and body:
+                self.wfile.write(body)
+
+        def _error(self, status: int, msg: str):
+            self._send(status, json.dumps({"error": msg}).encode())
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            fmt = q.pop("format", None) or ("json" if JSON_TYPE in self.headers.get("Accept", "") else "arrow")
+            if fmt not in ("arrow", "json"):
+                return self._error(400, "format must be 'arrow' or 'json'")
+
+            rel = store.current()
+
+            if url.path == "/health":
+                body = json.dumps({"version": rel.version, "rows": rel.metrics.num_rows,
+                                   "cache_hits": cache.hits, "cache_misses": cache.misses})
+                return self._send(200, body.encode())
+
+            # ETag only depends on the release and the normalized request
+            norm = json.dumps([rel.version, url.path, fmt, sorted(q.items())])
+            etag = '"' + hashlib.sha1(norm.encode()).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, etag=etag)
+
+            hit = cache.get(etag)
+            if hit is not None:
+                return self._send(200, hit[1], hit[2], etag=hit[0])
+
+            try:
+                table = self._route(rel, url.path, q)
+                if table is None:
+                    return self._error(404, f"Unknown endpoint: {url.path}")
+                table = _select_columns(table, q.get("columns"))
+            except (KeyError, ValueError) as e:
+                return self._error(400, str(e.args[0]) if e.args else repr(e))
+
+            body, ctype = serialize(table, fmt)
+            cache.put(etag, (etag, body, ctype))
+            self._send(200, body, ctype, etag=etag)
+
+        def _route(self, rel: Release, path: str, q: Dict[str, str]) -> Optional[pa.Table]:
+            if path == "/latest":
+                return _filter_eq(rel.latest, "asset_class", q.get("asset_class"))
+
+            if path.startswith("/history/"):
+                code = path[len("/history/"):]
+                t = rel.history(code)
+                return _filter_dates(t, q.get("start"), q.get("end"))
+
+            if path == "/cross_section":
+                t = rel.cross_section(q.get("date"))
+                return _filter_eq(t, "asset_class", q.get("asset_class"))
+
+            return None
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, root: str = PROCESSED_DIR,
+          cache_bytes: int = 256 * 1024 * 1024) -> ThreadingHTTPServer:
+    """
+    Build the server (does not block). Call .serve_forever() on the result.
+    """
+    store = PositioningStore(root)
+    store.current()
+    cache = ResponseCache(max_bytes=cache_bytes)
+    httpd = ThreadingHTTPServer((host, port), make_handler(store, cache))
+    httpd.daemon_threads = True
+    return httpd
@@ -0,0 +1,112 @@
+# src/cot/checkpoint.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from src.cot.instrument import span
+
+### Resumable downloads.
+### Every page a download receives is written straight to a part file and
+### recorded in a small manifest next to it:
+###
+###   <root>/<query id>/manifest.json
+###       {"query": {...}, "plans": [...], "created": ts,
+###        "parts": [{"batch": 0, "offset": 0, "rows": 50000, "file": "b0000_o00000000.parquet"}],
+###        "done": [0, 1, ...]}
+###   <root>/<query id>/b0000_o00000000.parquet ...
+###
+### The query id hashes the request (endpoint, keys, select, since, batching),
+### so rerunning the same download finds its checkpoint, keeps the batch plan
+### it started with and continues at the first page not on disk. The part file
+### is written before the manifest is (atomically) replaced, so a crash costs
+### at most the page in flight. Checkpoints older than max_age_s are discarded
+### rather than resumed: the dataset may have moved on since.
+
+CHECKPOINT_DIR = "data/raw/_checkpoints"
+CHECKPOINT_MAX_AGE_S = 24 * 3600
+
+
+def query_id(query: Dict[str, Any]) -> str:
+    blob = json.dumps(query, sort_keys=True, default=str).encode()
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+class DownloadCheckpoint:
+
+    def __init__(self, root: str, query: Dict[str, Any], max_age_s: float = CHECKPOINT_MAX_AGE_S):
+        self.dir = os.path.join(root, query_id(query))
+        self.path = os.path.join(self.dir, "manifest.json")
+        self.manifest: Dict[str, Any] = {}
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                m = json.load(f)
+            if time.time() - m.get("created", 0) <= max_age_s:
+                self.manifest = m
+            else:
+                shutil.rmtree(self.dir, ignore_errors=True)
+
+        if not self.manifest:
+            self.manifest = {"query": query, "plans": None, "created": time.time(), "parts": [], "done": []}
+
+    @property
+    def resumed(self) -> bool:
+        return self.manifest["plans"] is not None
+
+    @property
+    def plans(self) -> Optional[List[Dict[str, Any]]]:
+        return self.manifest["plans"]
+
+    def set_plans(self, plans: List[Dict[str, Any]]) -> None:
+        self.manifest["plans"] = plans
+        self._write()
+
+    def next_offset(self, batch: int) -> Optional[int]:
+        """
+        Offset of the first page of `batch` not on disk; None if the batch is done.
+        """
+        if batch in self.manifest["done"]:
+            return None
+        parts = [p for p in self.manifest["parts"] if p["batch"] == batch]
+        if not parts:
+            return 0
+        last = max(parts, key=lambda p: p["offset"])
+        return last["offset"] + self.manifest["plans"][batch]["chunk_size"]
+
+    def add_page(self, batch: int, offset: int, rows: List[Dict[str, Any]]) -> None:
+        name = f"b{batch:04d}_o{offset:08d}.parquet"
+        os.makedirs(self.dir, exist_ok=True)
+        with span("checkpoint.write", batch=batch, offset=offset) as sp:
+            pd.DataFrame(rows).to_parquet(os.path.join(self.dir, name), index=False)
+            sp.set(rows=len(rows))
+        self.manifest["parts"].append({"batch": batch, "offset": offset, "rows": len(rows), "file": name})
+        self._write()
+
+    def finish_batch(self, batch: int) -> None:
+        self.manifest["done"].append(batch)
+        self._write()
+
+    def rows_on_disk(self) -> int:
+        return sum(p["rows"] for p in self.manifest["parts"])
+
+    def merged(self) -> pd.DataFrame:
+        parts = sorted(self.manifest["parts"], key=lambda p: (p["batch"], p["offset"]))
+        frames = [pd.read_parquet(os.path.join(self.dir, p["file"])) for p in parts if p["rows"]]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _write(self) -> None:
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self.path)
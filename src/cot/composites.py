@@ -0,0 +1,262 @@
+# src/cot/composites.py
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.cot.config import COMPOSITE_BASKETS, DIS_MARKET_MAP
+from src.cot.instrument import span
+from src.cot.report_calendar import week_anchor
+
+### Composite positioning indices ("speculative USD across all FX futures",
+### "managed money in precious metals", ...).
+### Output rows look exactly like tidy rows (dataset="COMPOSITE",
+### asset_class="Composites"), so they go through add_position_metrics, peer
+### scores, the screener cube and the dashboard like any single contract.
+###
+### All baskets are built in one pass: the tidy panel is scattered into
+### (week x member) arrays once, and every composite is a column of a signed
+### weight matrix, so each level is a single matmul over all report dates.
+###
+### Missing data:
+###   - a member only counts between its first and last report (late listings,
+###     delistings and renames don't look like a collapse in positioning)
+###   - short gaps inside that span are forward-filled for `ffill_weeks`
+###   - `coverage` = reported members / listed members; weeks below the
+###     basket's min_coverage are dropped
+###   - weeks with fewer than the basket's min_members (default MIN_MEMBERS)
+###     members reporting are dropped, so a basket whose members never overlap
+###     (one delisted before the next listed) is left out instead of splicing
+###     unrelated contracts into one series
+### Levels (net, long, short, open_interest) are sums, so they still step when
+### a member lists; the %OI columns are ratios and don't.
+
+COMPOSITE_DATASET = "COMPOSITE"
+COMPOSITE_ASSET_CLASS = "Composites"
+MEMBER_KEYS = ["dataset", "group", "cftc_code"]
+WEIGHTS = ("oi", "equal", "notional")
+MIN_MEMBERS = 2
+
+_LEVELS = ["open_interest", "long", "short", "spreading"]
+
+
+def composite_code(name: str) -> str:
+    """
+    Stable pseudo CFTC code for a basket name, e.g. "Precious metals" -> "COMP_PRECIOUS_METALS".
+    """
+    return "COMP_" + re.sub(r"[^A-Z0-9]+", "_", name.upper()).strip("_")
+
+
+def _member_signs(markets: pd.DataFrame, members: Dict[str, float]) -> pd.Series:
+    """
+    Sign per member key; a key matches when any of its market names matches.
+    Members are base names (text before " - ") or DIS_MARKET_MAP keys, which
+    resolve to the base name of their mapped market.
+    """
+    def base_name(name: str) -> str:
+        return name.split(" - ")[0].strip()
+
+    mapped = {base_name(DIS_MARKET_MAP[k]): v for k, v in members.items() if k in DIS_MARKET_MAP}
+    names = {**mapped, **{base_name(k): v for k, v in members.items()}}
+    sign = markets["market"].map(base_name).map(names)
+    return sign.groupby([markets[k] for k in MEMBER_KEYS]).first().dropna()
+
+
+def resolve_baskets(
+    tidy: pd.DataFrame,
+    baskets: Optional[Dict[str, Dict[str, Any]]] = None,
+    by_asset_class: bool = True,
+) -> list[Dict[str, Any]]:
+    """
+    Expand basket definitions into one composite per (basket, group).
+
+    by_asset_class adds an unsigned, OI-weighted "<asset class> (all)" basket
+    for every asset class in the panel (except "Other").
+    """
+    baskets = COMPOSITE_BASKETS if baskets is None else baskets
+    rows = tidy[tidy["dataset"] != COMPOSITE_DATASET]
+    markets = rows.drop_duplicates(MEMBER_KEYS + ["market"])[MEMBER_KEYS + ["market"]]
+
+    resolved: list[tuple[str, Dict[str, Any], pd.Series]] = []
+    for name, spec in baskets.items():
+        weight = spec.get("weight", "oi")
+        if weight not in WEIGHTS:
+            raise ValueError(f"Unknown weight={weight} for basket '{name}'. Use one of: {list(WEIGHTS)}")
+        resolved.append((name, spec, _member_signs(markets, spec["members"])))
+
+    if by_asset_class:
+        # current label per key (renamed contracts can change class)
+        cls = rows.sort_values("date").groupby(MEMBER_KEYS)["asset_class"].last()
+        for c in sorted(set(cls) - {"Other", COMPOSITE_ASSET_CLASS}):
+            signs = pd.Series(1.0, index=cls.index[cls == c])
+            resolved.append((f"{c} (all)", {"weight": "oi"}, signs))
+
+    out: list[Dict[str, Any]] = []
+    for name, spec, signs in resolved:
+        if signs.empty:
+            continue
+        groups = signs.index.get_level_values("group")
+        for g in pd.unique(groups):
+            out.append({
+                "name": name,
+                "code": composite_code(name),
+                "group": g,
+                "weight": spec.get("weight", "oi"),
+                "min_coverage": float(spec.get("min_coverage", 0.5)),
+                "min_members": int(spec.get("min_members", MIN_MEMBERS)),
+                "start": pd.Timestamp(spec["start"]) if spec.get("start") else None,
+                "signs": signs[groups == g],
+            })
+    return out
+
+
+def _scatter(values: np.ndarray, w_idx: np.ndarray, k_idx: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    arr = np.full(shape, np.nan)
+    arr[w_idx, k_idx] = values
+    return arr
+
+
+def _ffill(arr: np.ndarray, limit: Optional[int], alive: np.ndarray) -> np.ndarray:
+    return pd.DataFrame(arr).ffill(limit=limit).to_numpy().copy() * np.where(alive, 1.0, np.nan)
+
+
+def build_composites(
+    tidy: pd.DataFrame,
+    baskets: Optional[Dict[str, Dict[str, Any]]] = None,
+    by_asset_class: bool = True,
+    notional: Optional[pd.DataFrame] = None,
+    ffill_weeks: int = 2,
+) -> pd.DataFrame:
+    """
+    Composite tidy rows for every basket x group x report date.
+
+    notional: optional [cftc_code, date, notional_per_contract] frame (e.g.
+    price x multiplier, in USD) for baskets with weight="notional". It is
+    carried forward to each report week; members without a notional are left
+    out of notional baskets.
+
+    Extra columns: n_members (members with data that week) and coverage.
+    """
+    comps = resolve_baskets(tidy, baskets, by_asset_class)
+    if any(c["weight"] == "notional" for c in comps) and notional is None:
+        raise ValueError("weight='notional' baskets need a `notional` frame")
+    if not comps:
+        return pd.DataFrame()
+
+    with span("composites.build", composites=len(comps)) as sp:
+        src = tidy[tidy["dataset"] != COMPOSITE_DATASET].copy()
+        src["_week"] = week_anchor(src["date"])
+        src = src.sort_values("date").drop_duplicates(MEMBER_KEYS + ["_week"], keep="last")
+
+        keys = pd.MultiIndex.from_frame(src[MEMBER_KEYS])
+        member_index = keys.unique()
+        weeks = np.sort(src["_week"].unique())
+        k_idx = member_index.get_indexer(keys)
+        w_idx = np.searchsorted(weeks, src["_week"].to_numpy())
+        shape = (len(weeks), len(member_index))
+        # reported date for each week (the Tuesday, or the holiday-shifted day)
+        week_dates = src.groupby("_week")["date"].max().reindex(weeks).to_numpy()
+
+        first = np.full(shape[1], shape[0])
+        last = np.full(shape[1], -1)
+        np.minimum.at(first, k_idx, w_idx)
+        np.maximum.at(last, k_idx, w_idx)
+        wk = np.arange(shape[0])[:, None]
+        alive = (wk >= first[None, :]) & (wk <= last[None, :])
+
+        raw_oi = _scatter(src["open_interest"].to_numpy(dtype=float), w_idx, k_idx, shape)
+        reported = ~np.isnan(raw_oi)
+        lv = {c: _ffill(_scatter(src[c].to_numpy(dtype=float), w_idx, k_idx, shape), ffill_weeks, alive)
+              for c in _LEVELS}
+        present = ~np.isnan(lv["open_interest"])
+
+        # signed weight matrix: one column per composite
+        W = np.zeros((shape[1], len(comps)))
+        for j, c in enumerate(comps):
+            W[member_index.get_indexer(c["signs"].index), j] = c["signs"].to_numpy(dtype=float)
+        # fractional signs (e.g. 0.5) scale a member; counts ignore the size
+        pos, neg, absw = np.clip(W, 0, None), np.clip(-W, 0, None), np.abs(W)
+        cnt = (W != 0).astype(float)
+
+        def combine(levels: Dict[str, np.ndarray], mask: np.ndarray) -> Dict[str, np.ndarray]:
+            z = {c: np.where(mask, np.nan_to_num(levels[c]), 0.0) for c in _LEVELS}
+            oi = z["open_interest"]
+            # a negative sign swaps the member's long and short side
+            res = {
+                "long": z["long"] @ pos + z["short"] @ neg,
+                "short": z["short"] @ pos + z["long"] @ neg,
+                "spreading": z["spreading"] @ absw,
+                "open_interest": oi @ absw,
+                "n_members": mask.astype(float) @ cnt,
+            }
+            # per-member %OI for equal weights
+            ok = mask & (oi > 0)
+            safe = np.where(ok, oi, 1.0)
+            pl = np.where(ok, z["long"] / safe, 0.0)
+            ps = np.where(ok, z["short"] / safe, 0.0)
+            n_ok = ok.astype(float) @ absw
+            n_ok = np.where(n_ok > 0, n_ok, np.nan)
+            res["eq_long"] = (pl @ pos + ps @ neg) / n_ok
+            res["eq_short"] = (ps @ pos + pl @ neg) / n_ok
+            return res
+
+        agg = combine(lv, present)
+
+        notional_cols = np.array([c["weight"] == "notional" for c in comps])
+        if notional_cols.any():
+            n = notional.assign(_week=week_anchor(pd.to_datetime(notional["date"])))
+            n = n.sort_values("date").drop_duplicates(["cftc_code", "_week"], keep="last")
+            by_code = n.pivot(index="_week", columns="cftc_code", values="notional_per_contract")
+            by_code = by_code.reindex(by_code.index.union(weeks)).ffill().reindex(weeks)
+            N = by_code.reindex(columns=member_index.get_level_values("cftc_code")).to_numpy(dtype=float)
+            scaled = {c: lv[c] * N for c in _LEVELS}
+            agg_n = combine(scaled, present & ~np.isnan(N))
+            for c in agg:
+                agg[c][:, notional_cols] = agg_n[c][:, notional_cols]
+
+        net = agg["long"] - agg["short"]
+        oi = agg["open_interest"]
+        oi_pos = np.where(oi > 0, oi, np.nan)
+        pct_long = agg["long"] / oi_pos
+        pct_short = agg["short"] / oi_pos
+        equal_cols = np.array([c["weight"] == "equal" for c in comps])
+        pct_long[:, equal_cols] = agg["eq_long"][:, equal_cols]
+        pct_short[:, equal_cols] = agg["eq_short"][:, equal_cols]
+
+        listed = alive.astype(float) @ cnt
+        coverage = (reported.astype(float) @ cnt) / np.where(listed > 0, listed, np.nan)
+
+        min_cov = np.array([c["min_coverage"] for c in comps])
+        min_n = np.array([max(c["min_members"], 1) for c in comps])
+        start = np.array([c["start"] or week_dates[0] for c in comps], dtype=week_dates.dtype)
+        keep = ((agg["n_members"] >= min_n[None, :]) & (coverage >= min_cov[None, :])
+                & (week_dates[:, None] >= start[None, :]))
+        wi, ci = np.nonzero(keep)
+
+        names = np.array([c["name"] for c in comps], dtype=object)
+        out = pd.DataFrame({
+            "contract_name": names[ci],
+            "market": np.char.add(names[ci].astype(str), " - COMPOSITE").astype(object),
+            "cftc_code": np.array([c["code"] for c in comps], dtype=object)[ci],
+            "date": week_dates[wi],
+            "open_interest": oi[wi, ci],
+            "long": agg["long"][wi, ci],
+            "short": agg["short"][wi, ci],
+            "spreading": agg["spreading"][wi, ci],
+            "net": net[wi, ci],
+            "pct_oi_net": pct_long[wi, ci] - pct_short[wi, ci],
+            "pct_oi_long": pct_long[wi, ci],
+            "pct_oi_short": pct_short[wi, ci],
+            "dataset": COMPOSITE_DATASET,
+            "group": np.array([c["group"] for c in comps], dtype=object)[ci],
+            "asset_class": COMPOSITE_ASSET_CLASS,
+            "n_members": agg["n_members"][wi, ci].astype(int),
+            "coverage": coverage[wi, ci],
+        })
+        out = out.sort_values(["cftc_code", "group", "date"]).reset_index(drop=True)
+        sp.set(rows=len(out))
+
+    return out
@@ -113,6 +113,86 @@ DIS_MARKET_MAP = {
 
 
 
+# Asset class labels used by Streamlit filtering
+# (TFF categories + the DIS "Commodities" bucket)
+
+ASSET_CLASS_MAP = {**UNIVERSE_TFF, **UNIVERSE_DIS}
+
+
+# Composite baskets (see src/cot/composites.py)
+# members: base market name (text before " - ", or a DIS_MARKET_MAP key) -> sign.
+# A sign of -1 flips the contract's long/short, e.g. long EURO FX futures is
+# short USD, so the USD basket holds every foreign-currency contract at -1.
+# Renamed contracts can be listed under both names; they never overlap in time.
+# weight: "oi" (positions summed in contracts, %OI is OI-weighted),
+#         "equal" (%OI is a plain average of members) or
+#         "notional" (positions scaled by a per-contract notional series).
+# optional: min_coverage (share of listed members reporting, default 0.5),
+#           min_members (members reporting at once, default 2), start (date).
+
+COMPOSITE_BASKETS = {
+    "USD vs FX futures": {
+        "members": {
+            "EURO FX": -1,
+            "JAPANESE YEN": -1,
+            "BRITISH POUND": -1,
+            "BRITISH POUND STERLING": -1,
+            "SWISS FRANC": -1,
+            "AUSTRALIAN DOLLAR": -1,
+            "CANADIAN DOLLAR": -1,
+            "NZ DOLLAR": -1,
+            "MEXICAN PESO": -1,
+            "BRAZILIAN REAL": -1,
+            "SO AFRICAN RAND": -1,
+            "USD INDEX": 1,
+        },
+        "weight": "oi",
+    },
+    "Precious metals": {
+        "members": {"GOLD": 1, "SILVER": 1, "PLATINUM": 1, "PALLADIUM": 1},
+        "weight": "oi",
+    },
+    "Energy": {
+        # base names as reported, before and after the CFTC's 2022 renames
+        "members": {
+            "CRUDE OIL, LIGHT SWEET": 1,
+            "CRUDE OIL, LIGHT SWEET-WTI": 1,
+            "WTI CRUDE OIL": 1,
+            "GASOLINE RBOB": 1,
+            "GASOLINE BLENDSTOCK (RBOB)": 1,
+        },
+        "weight": "oi",
+    },
+    "Grains": {
+        "members": {"CORN": 1, "SOYBEANS": 1, "OATS": 1},
+        "weight": "oi",
+    },
+    "Softs": {
+        "members": {"COCOA": 1, "COFFEE C": 1, "SUGAR NO. 11": 1},
+        "weight": "equal",
+    },
+}
+
+
+# Alert rules (see src/cot/alerts.py for the expression syntax).
+# data/alerts/rules.json, if present, replaces this list.
+
+ALERT_RULES = [
+    {"name": "Crowded long, still building",
+     "rule": "pct_oi_net_pctile_5y >= 90 and net_chg_1w > 0", "severity": "warning"},
+    {"name": "Crowded short, still building",
+     "rule": "pct_oi_net_pctile_5y <= 10 and net_chg_1w < 0", "severity": "warning"},
+    {"name": "Entered extreme long (5y z >= 2)",
+     "rule": "crosses_above(pct_oi_net_z_5y, 2)", "severity": "warning"},
+    {"name": "Entered extreme short (5y z <= -2)",
+     "rule": "crosses_below(pct_oi_net_z_5y, -2)", "severity": "warning"},
+    {"name": "Big weekly move (%OI)",
+     "rule": "abs(pct_oi_net_chg_1w) >= 0.02", "severity": "info"},
+    {"name": "Extreme vs asset-class peers",
+     "rule": "abs(pct_oi_net_z_5y_peer_z) >= 2", "severity": "info"},
+]
+
+
 # Helpers
 
 def flatten_universe(universe: dict[str, list[str]]) -> list[str]:
@@ -0,0 +1,203 @@
+# src/cot/correlation.py
+from __future__ import annotations
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.cot.composites import COMPOSITE_DATASET
+from src.cot.instrument import span
+from src.cot.publish import read_manifest, release_path
+from src.cot.report_calendar import week_anchor
+
+### Rolling cross-market correlation of weekly positioning changes, and a
+### crowding indicator derived from it.
+###
+### The panel is weeks x contracts (composites excluded: they are sums of the
+### single contracts). Window sums come from prefix sums over time of
+###   x_i x_j,   x_i 1[j],   x_i^2 1[j],   1[i] 1[j]      (N x N per week)
+### so every window of every length is one subtraction, and all correlation
+### matrices (pairwise-complete) come out as a (weeks x N x N) stack in a few
+### array operations.
+###
+### Crowding per (date, scope), scope = an asset class or "All":
+###   eig_share  largest eigenvalue of the correlation matrix / n contracts.
+###              1/n when positioning moves independently, -> 1 when it is all
+###              one trade (e.g. every FX contract moving as "short USD").
+###   avg_corr   mean off-diagonal correlation (signed)
+### Contracts need `min_periods` weeks inside the window to count; pairs with
+### too little overlap are treated as uncorrelated.
+
+CROWDING_FILE = "cot_crowding.parquet"
+CORRELATION_FILE = "cot_correlation_latest.parquet"
+CORR_KEYS = ["dataset", "group", "cftc_code"]
+CORR_EXPRESSIONS = ["net_chg_1w", "pct_oi_net_chg_1w"]
+CORR_WINDOWS = {"13w": 13, "52w": 52, "156w": 156}
+ALL_SCOPE = "All"
+
+
+def _panel(dfm: pd.DataFrame, expr: str) -> tuple[pd.DatetimeIndex, pd.DataFrame, np.ndarray]:
+    """
+    (weeks, contract table, weeks x contracts values with NaN gaps).
+    """
+    rows = dfm[dfm["dataset"] != COMPOSITE_DATASET]
+    rows = rows[CORR_KEYS + ["market", "asset_class", "date", expr]].copy()
+    rows["week"] = week_anchor(pd.to_datetime(rows["date"]))
+    rows = rows.drop_duplicates(CORR_KEYS + ["week"], keep="last")
+
+    weeks = pd.DatetimeIndex(np.sort(rows["week"].unique()))
+    contracts = (
+        rows.sort_values("date")
+            .groupby(CORR_KEYS, sort=True)[["market", "asset_class"]]
+            .last()
+            .reset_index()
+    )
+    col = rows.groupby(CORR_KEYS, sort=True).ngroup().to_numpy()
+    t = weeks.get_indexer(rows["week"])
+    X = np.full((len(weeks), len(contracts)), np.nan)
+    X[t, col] = pd.to_numeric(rows[expr], errors="coerce").to_numpy(dtype=float)
+    return weeks, contracts, X
+
+
+def prefix_sums(X: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Running sums over time (with a leading zero row) of the per-week outer
+    products the window statistics need. Shared by every window length.
+    """
+    M = ~np.isnan(X)
+    X0 = np.where(M, X, 0.0)
+    Mf = M.astype(float)
+
+    def run(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        P = np.empty((len(a) + 1, a.shape[1], b.shape[1]))
+        P[0] = 0.0
+        np.cumsum(a[:, :, None] * b[:, None, :], axis=0, out=P[1:])
+        return P
+
+    return {
+        "n": run(Mf, Mf),
+        "sx": run(X0, Mf),          # sum of x_i over weeks where j also reported
+        "sxx": run(X0 * X0, Mf),
+        "sxy": run(X0, X0),
+    }
+
+
+def rolling_correlations(
+    X: np.ndarray,
+    window: int,
+    min_periods: Optional[int] = None,
+    prefix: Optional[Dict[str, np.ndarray]] = None,
+) -> np.ndarray:
+    """
+    (T x N x N) pairwise-complete correlations over the trailing `window` weeks
+    ending at each week. NaN where a pair has fewer than min_periods joint weeks.
+    """
+    min_periods = min_periods or max(8, int(window * 0.75))
+    prefix = prefix if prefix is not None else prefix_sums(X)
+
+    def window_sum(P: np.ndarray) -> np.ndarray:
+        out = P[1:].copy()
+        out[window:] -= P[1:-window]
+        return out
+
+    n, sx, sxx, sxy = (window_sum(prefix[k]) for k in ("n", "sx", "sxx", "sxy"))
+    sy = np.swapaxes(sx, 1, 2)
+    syy = np.swapaxes(sxx, 1, 2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / n
+        vx = sxx - sx * sx / n
+        vy = syy - sy * sy / n
+        corr = cov / np.sqrt(vx * vy)
+    corr[(n < min_periods) | ~(vx > 0) | ~(vy > 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0, out=corr)
+
+
+def crowding(corr: np.ndarray, members: np.ndarray) -> pd.DataFrame:
+    """
+    eig_share / avg_corr / n_contracts per week for the contracts in `members`
+    (boolean mask over the N axis).
+    """
+    C = corr[:, members][:, :, members]
+    live = ~np.isnan(np.diagonal(C, axis1=1, axis2=2))
+    n_live = live.sum(axis=1)
+
+    # contracts without enough history sit out as an identity block: they add
+    # eigenvalues of exactly 1 and leave the top eigenvalue alone
+    C = np.where(np.isnan(C), 0.0, C)
+    k = C.shape[1]
+    eye = np.broadcast_to(np.eye(k, dtype=bool), C.shape)
+    C = np.where(eye, 1.0, C)
+
+    lam = np.linalg.eigvalsh(C)[:, -1] if k else np.zeros(len(C))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pair = live[:, :, None] & live[:, None, :] & ~eye
+        avg = np.where(pair, C, 0.0).sum(axis=(1, 2)) / pair.sum(axis=(1, 2))
+        share = np.where(n_live >= 2, lam / n_live, np.nan)
+    return pd.DataFrame({"n_contracts": n_live, "eig_share": share, "avg_corr": np.where(n_live >= 2, avg, np.nan)})
+
+
+def build_correlations(
+    dfm: pd.DataFrame,
+    expressions: Optional[list[str]] = None,
+    windows: Optional[Dict[str, int]] = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (crowding time series, latest correlation matrices in long form).
+    """
+    expressions = expressions or CORR_EXPRESSIONS
+    windows = windows or CORR_WINDOWS
+    crowd, latest = [], []
+
+    for expr in expressions:
+        if expr not in dfm.columns:
+            continue
+        weeks, contracts, X = _panel(dfm, expr)
+        classes = contracts["asset_class"].astype(str).to_numpy()
+        scopes = {ALL_SCOPE: np.ones(len(contracts), dtype=bool)}
+        scopes.update({c: classes == c for c in sorted(set(classes))})
+        prefix = prefix_sums(X)
+
+        for tag, w in windows.items():
+            with span("correlation.window", expr=expr, window=tag) as sp:
+                corr = rolling_correlations(X, w, prefix=prefix)
+                for scope, mask in scopes.items():
+                    c = crowding(corr, mask)
+                    c.insert(0, "date", weeks)
+                    c.insert(1, "expression", expr)
+                    c.insert(2, "window", tag)
+                    c.insert(3, "scope", scope)
+                    crowd.append(c[c["n_contracts"] >= 2])
+
+                # last matrix, long form, for the heatmap
+                last = corr[-1]
+                i, j = np.nonzero(~np.isnan(last))
+                part = pd.DataFrame({
+                    "expression": expr, "window": tag, "date": weeks[-1],
+                    "market_i": contracts["market"].to_numpy()[i], "cftc_code_i": contracts["cftc_code"].to_numpy()[i],
+                    "market_j": contracts["market"].to_numpy()[j], "cftc_code_j": contracts["cftc_code"].to_numpy()[j],
+                    "asset_class_i": classes[i], "asset_class_j": classes[j],
+                    "corr": last[i, j],
+                })
+                latest.append(part)
+                sp.set(rows=len(weeks) * len(contracts))
+
+    crowd_df = pd.concat(crowd, ignore_index=True) if crowd else pd.DataFrame(
+        columns=["date", "expression", "window", "scope", "n_contracts", "eig_share", "avg_corr"])
+    latest_df = pd.concat(latest, ignore_index=True) if latest else pd.DataFrame()
+    return crowd_df, latest_df
+
+
+def load_crowding(manifest: dict | None = None) -> tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+    """
+    Published (crowding, latest correlations); None for releases without them.
+    """
+    if manifest is None:
+        manifest = read_manifest()
+    out = []
+    for fname in (CROWDING_FILE, CORRELATION_FILE):
+        path = release_path(fname, manifest=manifest)
+        out.append(pd.read_parquet(path) if os.path.exists(path) else None)
+    return out[0], out[1]
@@ -0,0 +1,221 @@
+# src/cot/events.py
+from __future__ import annotations
+
+import os
+from itertools import product
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.cot.instrument import span
+from src.cot.publish import read_manifest, release_path
+from src.cot.screener import EXPRESSIONS, LOOKBACKS, SCORE_TYPES, extreme_direction, score_column
+
+### Event study for the extreme-positioning flags.
+### "Last time JPY net was >= 90th pctile (5y), what happened next?"
+###
+### An episode starts on the first week a contract's score enters the extreme
+### zone (or every flagged week with onset_only=False). For every episode and
+### horizon we take the forward change in net / %OI net and, when a local price
+### file is given, the forward price return measured from release (Friday) to
+### release + horizon. Everything is array arithmetic over the sorted metrics
+### panel: one shift per horizon, one mask per score column, one merge_asof for
+### all price lookups; there is no per-episode loop.
+###
+### hit_rate = share of episodes where the outcome moved against the crowded
+### side (extreme long -> positioning / price fell), i.e. the contrarian read.
+
+EVENTS_FILE = "cot_event_study.parquet"
+PRICES_PATH = "data/raw/prices.parquet"
+
+EVENT_HORIZONS = {"1w": 1, "4w": 4, "13w": 13, "26w": 26}
+PANEL_KEYS = ["dataset", "group", "cftc_code"]
+# positions are as of Tuesday, released Friday 15:30 ET
+RELEASE_LAG_DAYS = 3
+# holiday-shifted report dates move by at most a couple of days
+_GAP_TOL_DAYS = 3
+
+OUTCOMES = {"net": "fwd_net_chg", "pct_oi_net": "fwd_pct_oi_net_chg"}
+SUMMARY_KEYS = ["asset_class", "expression", "score_type", "lookback", "direction", "horizon"]
+
+
+def load_prices(path: str = PRICES_PATH) -> Optional[pd.DataFrame]:
+    """
+    Optional local price file (parquet or csv) with columns cftc_code, date, price.
+    Returns None when the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path, dtype={"cftc_code": str}) if path.endswith(".csv") else pd.read_parquet(path)
+    missing = [c for c in ["cftc_code", "date", "price"] if c not in df.columns]
+    if missing:
+        raise KeyError(f"Missing columns in price file {path}: {missing}")
+    df = df[["cftc_code", "date", "price"]].copy()
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    return df.dropna().sort_values("date").reset_index(drop=True)
+
+
+def _forward_rows(group_id: np.ndarray, dates: np.ndarray, weeks: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Row `weeks` ahead within the same contract, valid only when that row really
+    is ~`weeks` calendar weeks later (a gap in the series invalidates it).
+    """
+    n = len(group_id)
+    idx = np.arange(n) + weeks
+    ok = idx < n
+    idx = np.where(ok, idx, 0)
+    days = (dates[idx] - dates).astype("timedelta64[D]").astype(np.int64)
+    ok &= (group_id[idx] == group_id) & (np.abs(days - 7 * weeks) <= _GAP_TOL_DAYS)
+    return idx, ok
+
+
+def _forward_returns(panel: pd.DataFrame, prices: pd.DataFrame, horizons: Dict[str, int]) -> Dict[str, np.ndarray]:
+    """
+    Price at each report's release and at release + h weeks, via a single
+    merge_asof over all (row, target date) pairs. Prices older than a week
+    before the target are treated as missing.
+    """
+    n = len(panel)
+    release = panel["date"].to_numpy(dtype="datetime64[ns]") + np.timedelta64(RELEASE_LAG_DAYS, "D")
+    offsets = {"0": 0, **horizons}
+    targets = pd.DataFrame({
+        "row": np.tile(np.arange(n), len(offsets)),
+        "slot": np.repeat(np.arange(len(offsets)), n),
+        "cftc_code": np.tile(panel["cftc_code"].astype(str).to_numpy(), len(offsets)),
+        "date": np.concatenate([release + np.timedelta64(7 * w, "D") for w in offsets.values()]),
+    }).sort_values("date")
+
+    px = prices.assign(cftc_code=prices["cftc_code"].astype(str),
+                       date=prices["date"].astype("datetime64[ns]")).sort_values("date")
+    hit = pd.merge_asof(targets, px, on="date", by="cftc_code", direction="backward",
+                        tolerance=pd.Timedelta(days=7))
+    grid = np.full((len(offsets), n), np.nan)
+    grid[hit["slot"].to_numpy(), hit["row"].to_numpy()] = hit["price"].to_numpy(dtype=float)
+
+    p0 = np.where(grid[0] > 0, grid[0], np.nan)
+    return {h: grid[i + 1] / p0 - 1.0 for i, h in enumerate(horizons)}
+
+
+def find_episodes(
+    dfm: pd.DataFrame,
+    horizons: Optional[Dict[str, int]] = None,
+    prices: Optional[pd.DataFrame] = None,
+    onset_only: bool = True,
+) -> pd.DataFrame:
+    """
+    One row per (episode, horizon) across every contract and every own-history
+    score column (expression x score type x lookback).
+
+    Columns: keys, asset_class, market, date, expression, score_type, lookback,
+    direction (+1 extreme long / -1 extreme short), score, horizon and the
+    forward outcomes fwd_net_chg, fwd_pct_oi_net_chg (+ fwd_ret with prices).
+    """
+    horizons = horizons or EVENT_HORIZONS
+    panel = dfm.sort_values(PANEL_KEYS + ["date"]).reset_index(drop=True)
+
+    group_id = panel.groupby(PANEL_KEYS, sort=False).ngroup().to_numpy()
+    dates = panel["date"].to_numpy(dtype="datetime64[ns]")
+    same_prev = np.r_[False, group_id[1:] == group_id[:-1]]
+
+    # forward outcomes for every row, once per horizon
+    levels = {name: pd.to_numeric(panel[col], errors="coerce").to_numpy(dtype=float)
+              for col, name in OUTCOMES.items()}
+    fwd: Dict[str, Dict[str, np.ndarray]] = {}
+    for h, w in horizons.items():
+        idx, ok = _forward_rows(group_id, dates, w)
+        fwd[h] = {name: np.where(ok, v[idx] - v, np.nan) for name, v in levels.items()}
+    if prices is not None:
+        for h, r in _forward_returns(panel, prices, horizons).items():
+            fwd[h]["fwd_ret"] = r
+
+    # episode starts per score column
+    grid = [(e, t, l) for e, t, l in product(EXPRESSIONS, SCORE_TYPES, LOOKBACKS)
+            if score_column(e, t, l) in panel.columns]
+    if not grid:
+        return pd.DataFrame()
+    rows, which, dirs, scores = [], [], [], []
+    for i, (expr, stype, lb) in enumerate(grid):
+        s = pd.to_numeric(panel[score_column(expr, stype, lb)], errors="coerce").to_numpy(dtype=float)
+        d = extreme_direction(s, stype)
+        start = d != 0
+        if onset_only:
+            prev = np.r_[0, d[:-1]]
+            start &= ~same_prev | (prev != d)
+        pos = np.flatnonzero(start)
+        rows.append(pos)
+        which.append(np.full(len(pos), i))
+        dirs.append(d[pos])
+        scores.append(s[pos])
+
+    pos = np.concatenate(rows)
+    m = np.concatenate(which)
+    n_ep, hz = len(pos), list(horizons)
+
+    ep = panel.loc[pos, PANEL_KEYS + ["asset_class", "market", "date"]].reset_index(drop=True)
+    ep["expression"] = np.array([g[0] for g in grid], dtype=object)[m]
+    ep["score_type"] = np.array([g[1] for g in grid], dtype=object)[m]
+    ep["lookback"] = np.array([g[2] for g in grid], dtype=object)[m]
+    ep["direction"] = np.concatenate(dirs)
+    ep["score"] = np.concatenate(scores)
+
+    # episodes x horizons, long format
+    out = ep.loc[np.tile(np.arange(n_ep), len(hz))].reset_index(drop=True)
+    out["horizon"] = np.repeat(np.array(hz, dtype=object), n_ep)
+    for name in fwd[hz[0]]:
+        out[name] = np.concatenate([fwd[h][name][pos] for h in hz])
+    return out
+
+
+def summarize_episodes(episodes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Hit-rate / distribution table per (asset_class, expression, score_type,
+    lookback, direction, horizon, outcome). asset_class "All" pools every class.
+    """
+    outcomes = [c for c in ["fwd_net_chg", "fwd_pct_oi_net_chg", "fwd_ret"] if c in episodes.columns]
+    if episodes.empty or not outcomes:
+        return pd.DataFrame(columns=SUMMARY_KEYS + ["outcome", "n", "hit_rate", "mean", "median",
+                                                    "p10", "p25", "p75", "p90"])
+
+    base = pd.concat([episodes, episodes.assign(asset_class="All")], ignore_index=True)
+    base["asset_class"] = base["asset_class"].astype(str)
+    long = base.melt(id_vars=SUMMARY_KEYS, value_vars=outcomes, var_name="outcome").dropna(subset=["value"])
+    # contrarian hit: outcome has the opposite sign of the crowded side
+    long["hit"] = (np.sign(long["value"]) == -long["direction"]).astype(float)
+
+    g = long.groupby(SUMMARY_KEYS + ["outcome"], sort=True)
+    table = g.agg(n=("value", "size"), hit_rate=("hit", "mean"), mean=("value", "mean"), median=("value", "median"))
+    q = g["value"].quantile([0.10, 0.25, 0.75, 0.90]).unstack()
+    q.columns = ["p10", "p25", "p75", "p90"]
+    return table.join(q).reset_index()
+
+
+def event_study(
+    dfm: pd.DataFrame,
+    horizons: Optional[Dict[str, int]] = None,
+    prices: Optional[pd.DataFrame] = None,
+    onset_only: bool = True,
+) -> pd.DataFrame:
+    """
+    find_episodes + summarize_episodes in one call (the published table).
+    """
+    with span("events.episodes") as sp:
+        episodes = find_episodes(dfm, horizons=horizons, prices=prices, onset_only=onset_only)
+        sp.set(rows=len(episodes))
+    with span("events.summary") as sp:
+        summary = summarize_episodes(episodes)
+        sp.set(rows=len(summary))
+    return summary
+
+
+def load_event_summary(manifest: dict | None = None) -> Optional[pd.DataFrame]:
+    """
+    Published event-study table for the current release (None for releases without one).
+    """
+    if manifest is None:
+        manifest = read_manifest()
+    path = release_path(EVENTS_FILE, manifest=manifest)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
@@ -0,0 +1,150 @@
+# src/cot/ewma.py
+from __future__ import annotations
+
+from statistics import NormalDist
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+### Exponentially weighted score family with O(1) state per contract.
+###
+### Rolling/expanding scores need the whole window and jump when an old
+### extreme drops out of it. These scores decay old observations smoothly
+### instead, and a new week is folded in with a handful of float operations:
+###
+###   ewma_z         (x - EW mean) / EW std, half-life h weeks
+###   ew_percentile  where x sits among EW quantile estimates: a fixed grid of
+###                  quantiles tracked by stochastic approximation
+###                  (q_p += step * EW std * (p - 1[x <= q_p])), interpolated
+###                  and clamped to [1, 99]
+###
+### State per contract: count, EW mean, EW variance and len(PCTILE_GRID)
+### quantiles. Both the batch path (add_ew_scores) and live updates go through
+### EWScorer.update, so they agree exactly. Observations are counted by report,
+### like the rolling windows; NaN weeks leave the state untouched.
+
+PCTILE_GRID = np.array([0.01, 0.025, 0.05, 0.10, 0.20, 0.30, 0.40, 0.50,
+                        0.60, 0.70, 0.80, 0.90, 0.95, 0.975, 0.99])
+_NORM_Q = np.array([NormalDist().inv_cdf(p) for p in PCTILE_GRID])
+
+
+def ew_alpha(halflife: float) -> float:
+    return 1.0 - np.exp(-np.log(2.0) / halflife)
+
+
+def _interp_rows(x: np.ndarray, q: np.ndarray, p: np.ndarray) -> np.ndarray:
+    """
+    Row-wise linear interpolation of x over sorted knots q[i] -> p, clamped
+    to the end values.
+    """
+    k = q.shape[1]
+    j = (q <= x[:, None]).sum(axis=1)
+    lo, hi = np.clip(j - 1, 0, k - 1), np.clip(j, 0, k - 1)
+    r = np.arange(len(x))
+    ql, qh = q[r, lo], q[r, hi]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(qh > ql, (x - ql) / (qh - ql), 0.0)
+    return p[lo] + w * (p[hi] - p[lo])
+
+
+class EWScorer:
+    """
+    Vectorized over `n` independent series (contracts). update(x) takes one
+    new observation per series (NaN = no report) and returns (z, pctile).
+    """
+
+    def __init__(self, n: int, halflife: float, min_periods: int = 52):
+        self.halflife = float(halflife)
+        self.min_periods = int(min_periods)
+        self.alpha = ew_alpha(halflife)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.mean = np.full(n, np.nan)
+        self.var = np.zeros(n)
+        self.q = np.full((n, len(PCTILE_GRID)), np.nan)
+
+    def update(self, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        x = np.asarray(x, dtype=float)
+        ok = ~np.isnan(x)
+        a = self.alpha
+
+        first = ok & (self.count == 0)
+        self.mean = np.where(first, x, self.mean)
+        rest = ok & ~first
+        d = np.where(rest, x - self.mean, 0.0)
+        self.mean = np.where(rest, self.mean + a * d, self.mean)
+        self.var = np.where(rest, (1.0 - a) * (self.var + a * d * d), self.var)
+        self.count = self.count + ok
+
+        std = np.sqrt(self.var)
+        warm = ok & (self.count >= self.min_periods)
+
+        # quantile trackers start from the normal fit once warmed up
+        init = warm & np.isnan(self.q[:, 0])
+        if init.any():
+            self.q[init] = self.mean[init, None] + std[init, None] * _NORM_Q[None, :]
+        live = warm & ~init
+        if live.any():
+            step = a * std[live, None]
+            below = x[live, None] <= self.q[live]
+            self.q[live] += step * (PCTILE_GRID[None, :] - below)
+            # keep the grid monotone
+            self.q[live] = np.maximum.accumulate(self.q[live], axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = np.where(warm & (std > 0), (x - self.mean) / std, np.nan)
+
+        pct = np.full(len(x), np.nan)
+        if warm.any():
+            pct[warm] = _interp_rows(x[warm], self.q[warm], PCTILE_GRID * 100.0)
+        return z, pct
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"count": self.count, "mean": self.mean, "var": self.var, "q": self.q}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray], halflife: float, min_periods: int = 52) -> "EWScorer":
+        sc = cls(len(state["count"]), halflife, min_periods)
+        sc.count = np.asarray(state["count"], dtype=np.int64).copy()
+        sc.mean = np.asarray(state["mean"], dtype=float).copy()
+        sc.var = np.asarray(state["var"], dtype=float).copy()
+        sc.q = np.asarray(state["q"], dtype=float).reshape(len(sc.count), len(PCTILE_GRID)).copy()
+        return sc
+
+
+def add_ew_scores(
+    out: pd.DataFrame,
+    keys: list[str],
+    compute_for: list[str],
+    halflives_weeks: dict[str, int],
+    min_periods: int = 52,
+) -> pd.DataFrame:
+    """
+    Add {expr}_ewz_{tag} and {expr}_ewpctile_{tag} columns. `out` must be
+    sorted by keys + date. All contracts are stepped together, one report
+    position at a time (rows are scattered into a position x contract grid).
+    """
+    gid = out.groupby(keys, sort=False).ngroup().to_numpy()
+    pos = out.groupby(keys, sort=False).cumcount().to_numpy()
+    n_groups = int(gid.max()) + 1 if len(gid) else 0
+    n_pos = int(pos.max()) + 1 if len(pos) else 0
+
+    new: Dict[str, np.ndarray] = {}
+    for expr in compute_for:
+        if expr not in out.columns:
+            continue
+        grid = np.full((n_pos, n_groups), np.nan)
+        grid[pos, gid] = pd.to_numeric(out[expr], errors="coerce").to_numpy(dtype=float)
+
+        for tag, hl in halflives_weeks.items():
+            sc = EWScorer(n_groups, hl, min_periods)
+            z = np.full_like(grid, np.nan)
+            p = np.full_like(grid, np.nan)
+            for t in range(n_pos):
+                z[t], p[t] = sc.update(grid[t])
+            new[f"{expr}_ewz_{tag}"] = z[pos, gid]
+            new[f"{expr}_ewpctile_{tag}"] = p[pos, gid]
+
+    if not new:
+        return out
+    return pd.concat([out, pd.DataFrame(new, index=out.index)], axis=1)
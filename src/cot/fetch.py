@@ -7,12 +7,16 @@ from __future__ import annotations
 
 import os
 import time
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 import pandas as pd
 import requests
 
+from src.cot.checkpoint import CHECKPOINT_DIR, DownloadCheckpoint
 from src.cot.config import BASE_TFF
+from src.cot.instrument import span
+from src.cot.query_plan import MAX_PAGE_ROWS, build_where, pack_in_clauses, plan_queries
+from src.cot.transform import TFF_GROUP_COLUMNS, required_raw_columns
 
 
 def soda_get(base_url: str, params: Dict[str, Any], timeout: int = 60) -> List[Dict[str, Any]]:
@@ -25,11 +29,13 @@ def soda_get(base_url: str, params: Dict[str, Any], timeout: int = 60) -> List[D
     if token:
         headers["X-App-Token"] = token
 
-    r = requests.get(base_url, params=params, headers=headers, timeout=timeout)
-    r.raise_for_status()
-    data = r.json()
-    if not isinstance(data, list):
-        raise ValueError(f"Unexpected response type: {type(data)}")
+    with span("fetch.page", url=base_url, offset=params.get("$offset")) as sp:
+        r = requests.get(base_url, params=params, headers=headers, timeout=timeout)
+        r.raise_for_status()
+        data = r.json()
+        if not isinstance(data, list):
+            raise ValueError(f"Unexpected response type: {type(data)}")
+        sp.set(rows=len(data), bytes=len(r.content))
     return data
 
 
@@ -40,12 +46,32 @@ def soda_download_all(
     order: Optional[str] = None,
     chunk_size: int = 50000,
     pause: float = 0.2,
+    start_offset: int = 0,
+    on_page: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None,
 ) -> pd.DataFrame:
     """
     Download all rows with paging using $limit/$offset.
+    With `on_page(offset, rows)` every page is handed over as it arrives
+    (e.g. to a checkpoint) instead of being collected; the result is then empty.
     """
+    with span("fetch.download_all", url=base_url, where=where) as sp:
+        df = _download_pages(base_url, where, select, order, chunk_size, pause, start_offset, on_page)
+        sp.set(rows=len(df))
+    return df
+
+
+def _download_pages(
+    base_url: str,
+    where: Optional[str],
+    select: Optional[str],
+    order: Optional[str],
+    chunk_size: int,
+    pause: float,
+    start_offset: int = 0,
+    on_page: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None,
+) -> pd.DataFrame:
     all_rows: List[Dict[str, Any]] = []
-    offset = 0
+    offset = start_offset
 
     while True:
         params: Dict[str, Any] = {"$limit": chunk_size, "$offset": offset}
@@ -60,7 +86,13 @@ def soda_download_all(
         if not rows:
             break
 
-        all_rows.extend(rows)
+        if on_page is not None:
+            on_page(offset, rows)
+        else:
+            all_rows.extend(rows)
+        # a short page is the last one; no need to ask for an empty one
+        if len(rows) < chunk_size:
+            break
         offset += chunk_size
         time.sleep(pause)
 
@@ -104,35 +136,35 @@ def download_universe_tff(
     market_names: Iterable[str],
     base_url: str = BASE_TFF,
     pause: float = 0.2,
+    select: Optional[str] = None,
 ) -> pd.DataFrame:
     """
-    For each market name in UNIVERSE, download all TFF rows.
-    We filter on `market_and_exchange_names` (TFF field).
+    Download all TFF rows for the UNIVERSE market names.
+    We filter on `market_and_exchange_names` (TFF field); names are packed
+    into planned IN-clauses and only the transform's columns are selected.
     """
-    frames = []
-    for mkt in market_names:
-        where = f"market_and_exchange_names = '{mkt}'"
-        df = soda_download_all(
-            base_url=base_url,
-            where=where,
-            order="report_date_as_yyyy_mm_dd asc",
-            pause=pause,
-        )
-        if not df.empty:
-            df["__requested_market__"] = mkt  # helpful for debugging mismatches
-        frames.append(df)
-
-    out = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    names = list(dict.fromkeys(market_names))
+    out = download_by_keys(
+        base_url, "market_and_exchange_names", names,
+        select=select or ",".join(required_raw_columns("TFF", groups=tuple(TFF_GROUP_COLUMNS))), pause=pause,
+    )
+    if not out.empty:
+        out["__requested_market__"] = out["market_and_exchange_names"]  # helpful for debugging mismatches
     return out
 
 
 def save_raw(df: pd.DataFrame, path: str) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_parquet(path, index=False)
+    with span("io.write_parquet", path=path) as sp:
+        df.to_parquet(path, index=False)
+        sp.set(rows=len(df), bytes=os.path.getsize(path))
 
 
 def load_raw(path: str) -> pd.DataFrame:
-    return pd.read_parquet(path)
+    with span("io.read_parquet", path=path) as sp:
+        df = pd.read_parquet(path)
+        sp.set(rows=len(df), bytes=os.path.getsize(path))
+    return df
 
 
 from src.cot.config import BASE_DIS
@@ -160,8 +192,8 @@ def get_distinct_market_names_dis(base_url: str = BASE_DIS) -> list[str]:
 
 from src.cot.config import DIS_MARKET_MAP
 
-def download_universe_dis(markets, base_url=BASE_DIS, pause=0.2):
-    frames = []
+def download_universe_dis(markets, base_url=BASE_DIS, pause=0.2, select=None):
+    requested: dict[str, str] = {}
 
     for mkt in markets:
         api_name = DIS_MARKET_MAP.get(mkt)
@@ -170,84 +202,166 @@ def download_universe_dis(markets, base_url=BASE_DIS, pause=0.2):
             print(f"[DIS] No mapping for: {mkt}")
             continue
 
-        where = f"market_and_exchange_names = '{api_name}'"
-        df = soda_download_all(
-            base_url=base_url,
-            where=where,
-            order="report_date_as_yyyy_mm_dd asc",
-            pause=pause,
-        )
+        requested.setdefault(api_name, mkt)
 
-        if not df.empty:
-            df["__requested_market__"] = mkt
-            df["__matched_market__"] = api_name
+    out = download_by_keys(
+        base_url, "market_and_exchange_names", list(requested),
+        select=select or ",".join(required_raw_columns("DIS")), pause=pause,
+    )
 
-        frames.append(df)
+    if not out.empty:
+        out["__matched_market__"] = out["market_and_exchange_names"]
+        out["__requested_market__"] = out["__matched_market__"].map(requested)
 
-    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return out
 
 def _chunked(xs: list[str], n: int):
     for i in range(0, len(xs), n):
         yield xs[i:i+n]
 
-def download_tff_by_codes(
-    codes: list[str],
+def count_rows_by(
+    base_url: str,
+    key_col: str,
+    values: list[str],
+    since: Optional[str] = None,
+) -> dict[str, int]:
+    """
+    Row count per key (grouped count(*)), one request per URL-sized batch.
+    Keys without rows are absent.
+    """
+    params = {"$select": f"{key_col}, count(*) AS n", "$group": key_col, "$limit": MAX_PAGE_ROWS}
+    counts: dict[str, int] = {}
+    for batch in pack_in_clauses(base_url, key_col, values, params=params, since=since):
+        for r in soda_get(base_url, {**params, "$where": build_where(key_col, batch, since)}):
+            if r.get(key_col) is not None:
+                counts[str(r[key_col])] = int(r["n"])
+    return counts
+
+def download_by_keys(
+    base_url: str,
+    key_col: str,
+    values: list[str],
     select: Optional[str] = None,
-    chunk_size: int = 50000,
-    in_clause_batch: int = 50,
+    since: Optional[str] = None,
+    chunk_size: int = MAX_PAGE_ROWS,
+    in_clause_batch: Optional[int] = None,
+    pause: float = 0.2,
+    checkpoint_dir: Optional[str] = CHECKPOINT_DIR,
 ) -> pd.DataFrame:
     """
-    Download TFF rows for a list of CFTC contract market codes using an IN (...) filter.
-    This is MUCH more stable than filtering by market_and_exchange_names.
+    Download rows whose `key_col` is in `values`.
+    By default the query planner (query_plan.py) sizes the IN-clauses and
+    pages from row counts; `in_clause_batch` forces fixed-size batches
+    paged at `chunk_size` instead.
+    Pages are checkpointed under `checkpoint_dir` (checkpoint.py), so an
+    interrupted run resumes where it stopped when called again with the same
+    arguments; the parts are merged and removed once every batch is done.
+    `checkpoint_dir=None` keeps everything in memory.
     """
-    codes = [str(c) for c in codes if pd.notna(c)]
-    if not codes:
+    values = [str(v) for v in values if pd.notna(v)]
+    if not values:
         return pd.DataFrame()
 
+    ck = None
+    if checkpoint_dir:
+        query = {"url": base_url, "key": key_col, "values": values, "select": select,
+                 "since": since, "chunk_size": chunk_size, "in_clause_batch": in_clause_batch}
+        ck = DownloadCheckpoint(checkpoint_dir, query)
+
+    with span("fetch.plan", url=base_url, keys=len(values)) as sp:
+        if ck is not None and ck.resumed:
+            # keep the plan the interrupted run used, so offsets stay valid
+            plans = ck.plans
+            print(f"[fetch] resuming {ck.dir}: {ck.rows_on_disk():,} rows already on disk")
+        elif in_clause_batch:
+            plans = [
+                {"where": build_where(key_col, batch, since), "select": select,
+                 "order": ":id", "chunk_size": chunk_size}
+                for batch in _chunked(values, in_clause_batch)
+            ]
+        else:
+            counts = count_rows_by(base_url, key_col, values, since=since)
+            plans = plan_queries(base_url, key_col, values, select, counts=counts,
+                                 since=since, max_page_rows=chunk_size)
+        if ck is not None and not ck.resumed:
+            ck.set_plans(plans)
+        sp.set(rows=sum(p.get("expected_rows") or 0 for p in plans), queries=len(plans))
+
     frames: list[pd.DataFrame] = []
 
-    for batch in _chunked(codes, in_clause_batch):
-        quoted = ",".join([f"'{c}'" for c in batch])
-        where = f"cftc_contract_market_code in ({quoted})"
+    for i, plan in enumerate(plans):
+        start = 0
+        on_page = None
+        if ck is not None:
+            start = ck.next_offset(i)
+            if start is None:
+                continue
+            on_page = lambda offset, rows, i=i: ck.add_page(i, offset, rows)
 
         df = soda_download_all(
-            base_url=BASE_TFF,
-            where=where,
-            select=select,           # None means pull default/all your columns
-            chunk_size=chunk_size,
+            base_url=base_url,
+            where=plan["where"],
+            select=plan["select"],
+            order=plan["order"],
+            chunk_size=plan["chunk_size"],
+            pause=pause,
+            start_offset=start,
+            on_page=on_page,
         )
-        if df is not None and len(df) > 0:
+        if ck is not None:
+            ck.finish_batch(i)
+        elif df is not None and len(df) > 0:
             frames.append(df)
 
+    if ck is not None:
+        out = ck.merged()
+        ck.cleanup()
+        return out
     return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
+def download_tff_by_codes(
+    codes: list[str],
+    select: Optional[str] = None,
+    chunk_size: int = MAX_PAGE_ROWS,
+    in_clause_batch: Optional[int] = None,
+    since: Optional[str] = None,
+    base_url: str = BASE_TFF,
+    checkpoint_dir: Optional[str] = CHECKPOINT_DIR,
+) -> pd.DataFrame:
+    """
+    Download TFF rows for a list of CFTC contract market codes using an IN (...) filter.
+    This is MUCH more stable than filtering by market_and_exchange_names.
+    `select=None` pulls just the columns standardize_tff_group reads, for every
+    trader category (tff_groups.py scores them side by side; "*" for all).
+    `since` (YYYY-MM-DD) restricts to report dates strictly after it (incremental refresh).
+    Interrupted runs resume from the last completed page (see download_by_keys).
+    """
+    return download_by_keys(
+        base_url, "cftc_contract_market_code", codes,
+        select=select or ",".join(required_raw_columns("TFF", groups=tuple(TFF_GROUP_COLUMNS))),
+        since=since, chunk_size=chunk_size, in_clause_batch=in_clause_batch,
+        checkpoint_dir=checkpoint_dir,
+    )
+
 
 def download_dis_by_codes(
     codes: list[str],
     select: Optional[str] = None,
-    chunk_size: int = 50000,
-    in_clause_batch: int = 50,
+    chunk_size: int = MAX_PAGE_ROWS,
+    in_clause_batch: Optional[int] = None,
+    since: Optional[str] = None,
+    base_url: str = BASE_DIS,
+    checkpoint_dir: Optional[str] = CHECKPOINT_DIR,
 ) -> pd.DataFrame:
     """
     Download DIS rows for a list of CFTC contract market codes using an IN (...) filter.
+    `select=None` pulls just the columns standardize_dis_managed_money reads ("*" for all).
+    `since` (YYYY-MM-DD) restricts to report dates strictly after it (incremental refresh).
+    Interrupted runs resume from the last completed page (see download_by_keys).
     """
-    codes = [str(c) for c in codes if pd.notna(c)]
-    if not codes:
-        return pd.DataFrame()
-
-    frames: list[pd.DataFrame] = []
-
-    for batch in _chunked(codes, in_clause_batch):
-        quoted = ",".join([f"'{c}'" for c in batch])
-        where = f"cftc_contract_market_code in ({quoted})"
-
-        df = soda_download_all(
-            base_url=BASE_DIS,
-            where=where,
-            select=select,
-            chunk_size=chunk_size,
-        )
-        if df is not None and len(df) > 0:
-            frames.append(df)
-
-    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return download_by_keys(
+        base_url, "cftc_contract_market_code", codes,
+        select=select or ",".join(required_raw_columns("DIS")),
+        since=since, chunk_size=chunk_size, in_clause_batch=in_clause_batch,
+        checkpoint_dir=checkpoint_dir,
+    )
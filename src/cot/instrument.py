@@ -0,0 +1,250 @@
+# src/cot/instrument.py
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+### Lightweight span / metrics recorder for the pipeline.
+###
+###   with span("metrics.pctile", expr="net", lookback="5y") as sp:
+###       ...
+###       sp.set(rows=len(df))
+###
+### Disabled by default: span() then returns one shared no-op object, so the
+### cost is a function call. Enable with COT_INSTRUMENT=1 (or enable()).
+### Each span records wall time, CPU time, rows, bytes, tracemalloc peak
+### (when COT_INSTRUMENT_MEMORY=1, it slows Python down) and process RSS.
+### COT_PROFILE=metrics.pctile,fetch dumps a cProfile .prof for every span whose
+### name starts with one of the listed prefixes.
+
+REPORT_DIR = "data/reports"
+
+_state: Dict[str, Any] = {
+    "enabled": False,
+    "memory": False,
+    "profile": (),
+    "profile_dir": os.path.join(REPORT_DIR, "profiles"),
+    "spans": [],
+    "started_at": None,
+}
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource  # not available on Windows
+        # ru_maxrss: kilobytes on Linux, bytes on macOS; peak rather than current
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if os.uname().sysname == "Darwin" else rss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **kwargs) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.rows: Optional[int] = None
+        self.bytes: Optional[int] = None
+        self.parent: Optional["Span"] = None
+        self._child_peak = 0
+        self._profiler: Optional[cProfile.Profile] = None
+
+    def set(self, rows: Optional[int] = None, bytes: Optional[int] = None, **attrs) -> None:
+        if rows is not None:
+            self.rows = int(rows)
+        if bytes is not None:
+            self.bytes = int(bytes)
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+
+        if _state["memory"] and tracemalloc.is_tracing():
+            cur, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                self.parent._child_peak = max(self.parent._child_peak, peak)
+            tracemalloc.reset_peak()
+            self._mem_start = cur
+
+        if any(self.name.startswith(p) for p in _state["profile"]):
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        self._cpu0 = time.process_time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._t0
+        cpu = time.process_time() - self._cpu0
+
+        prof_path = None
+        if self._profiler is not None:
+            self._profiler.disable()
+            os.makedirs(_state["profile_dir"], exist_ok=True)
+            prof_path = os.path.join(_state["profile_dir"], f"{self.name}-{time.time_ns()}.prof")
+            self._profiler.dump_stats(prof_path)
+
+        peak = None
+        if _state["memory"] and tracemalloc.is_tracing():
+            _, p = tracemalloc.get_traced_memory()
+            p = max(p, self._child_peak)
+            peak = max(0, p - self._mem_start)
+            if self.parent is not None:
+                self.parent._child_peak = max(self.parent._child_peak, p)
+
+        _stack().pop()
+
+        rec = {
+            "name": self.name,
+            "parent": self.parent.name if self.parent else None,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "peak_mem_bytes": peak,
+            "rss_bytes": _rss_bytes(),
+            "error": exc_type.__name__ if exc_type else None,
+            "attrs": self.attrs,
+        }
+        if prof_path:
+            rec["profile"] = prof_path
+        with _lock:
+            _state["spans"].append(rec)
+        return False
+
+
+def _stack() -> List[Span]:
+    st = getattr(_local, "stack", None)
+    if st is None:
+        st = _local.stack = []
+    return st
+
+
+def enabled() -> bool:
+    return _state["enabled"]
+
+
+def rss_bytes() -> Optional[int]:
+    """
+    Current resident set size of this process (peak on platforms without /proc).
+    """
+    return _rss_bytes()
+
+
+def span(name: str, **attrs):
+    """
+    Context manager timing a block. No-op unless instrumentation is enabled.
+    """
+    if not _state["enabled"]:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def enable(memory: bool = False, profile: tuple[str, ...] = (), profile_dir: Optional[str] = None) -> None:
+    _state["enabled"] = True
+    _state["memory"] = memory
+    _state["profile"] = tuple(p for p in profile if p)
+    if profile_dir:
+        _state["profile_dir"] = profile_dir
+    _state["spans"] = []
+    _state["started_at"] = datetime.now(timezone.utc).isoformat()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable() -> None:
+    _state["enabled"] = False
+    if _state["memory"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state["memory"] = False
+
+
+def enable_from_env() -> bool:
+    """
+    COT_INSTRUMENT=1 turns recording on; COT_INSTRUMENT_MEMORY=1 adds tracemalloc;
+    COT_PROFILE=<prefix>[,<prefix>...] adds cProfile dumps.
+    """
+    on = os.getenv("COT_INSTRUMENT", "").lower() in ("1", "true", "yes")
+    if on:
+        enable(
+            memory=os.getenv("COT_INSTRUMENT_MEMORY", "").lower() in ("1", "true", "yes"),
+            profile=tuple(os.getenv("COT_PROFILE", "").split(",")),
+        )
+    return on
+
+
+def report(run: str = "pipeline") -> Dict[str, Any]:
+    """
+    Machine-readable run report: every span plus per-name totals.
+    """
+    with _lock:
+        spans = list(_state["spans"])
+
+    totals: Dict[str, Dict[str, Any]] = {}
+    for s in spans:
+        t = totals.setdefault(s["name"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0, "bytes": 0,
+                                          "peak_mem_bytes": None})
+        t["count"] += 1
+        t["wall_s"] += s["wall_s"]
+        t["cpu_s"] += s["cpu_s"]
+        t["rows"] += s["rows"] or 0
+        t["bytes"] += s["bytes"] or 0
+        if s["peak_mem_bytes"] is not None:
+            t["peak_mem_bytes"] = max(t["peak_mem_bytes"] or 0, s["peak_mem_bytes"])
+
+    return {
+        "run": run,
+        "started_at": _state["started_at"],
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "max_rss_bytes": max((s["rss_bytes"] or 0 for s in spans), default=None),
+        "totals": totals,
+        "spans": spans,
+    }
+
+
+def write_report(run: str = "pipeline", path: Optional[str] = None) -> Optional[str]:
+    """
+    Dump report() to data/reports/<run>-<timestamp>.json. Returns the path,
+    or None when instrumentation is off.
+    """
+    if not _state["enabled"]:
+        return None
+    rep = report(run)
+    if path is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(REPORT_DIR, f"{run}-{stamp}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(rep, f, indent=2, default=str)
+    return path
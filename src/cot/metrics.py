@@ -4,6 +4,11 @@ from __future__ import annotations
 import numpy as np
 import pandas as pd
 
+from src.cot.ewma import add_ew_scores
+from src.cot.instrument import span
+from src.cot.metrics_cache import MetricsCache, cached_position_metrics
+from src.cot.report_calendar import calendar_coverage, calendar_diff, calendar_grid, calendar_window_scores
+
 
 ### this function calculates the percentile rank of the latest value in a rolling window.
 ### ie. “Within the past N weeks, what fraction of values are ≤ the current week’s value?”
@@ -37,17 +42,79 @@ def _rolling_minmax_last(x: np.ndarray) -> float:
     return float((x[-1] - xmin) / (xmax - xmin))
 
 
+BASE_CHANGE_COLS = ["long", "short", "spreading", "net", "open_interest"]
+PCT_CHANGE_COLS = ["pct_oi_net", "pct_oi_long", "pct_oi_short"]
+CHANGE_WEEKS = {"1w": 1, "4w": 4, "13w": 13}
+
+
+def _add_calendar_metrics(
+    out: pd.DataFrame,
+    lookbacks_weeks: dict[str, int],
+    compute_for: list[str],
+    include_score_changes: bool,
+    min_coverage: float,
+) -> pd.DataFrame:
+    """
+    Changes, fixed-lookback scores and coverage in calendar weeks: every column
+    is scattered onto the report-calendar grid once, computed there with array
+    operations, and gathered back to the input rows.
+    """
+    cal = calendar_grid(out, ["dataset", "group", "cftc_code"])
+    cols: dict[str, np.ndarray] = {}
+
+    for col in BASE_CHANGE_COLS + PCT_CHANGE_COLS:
+        if col in out.columns:
+            v = cal.scatter(pd.to_numeric(out[col], errors="coerce").to_numpy(dtype=float))
+            for h, k in CHANGE_WEEKS.items():
+                cols[f"{col}_chg_{h}"] = cal.gather(calendar_diff(v, cal.contract, k))
+
+    present = cal.scatter(np.ones(len(out))) == 1.0
+    for tag, w in lookbacks_weeks.items():
+        cols[f"coverage_{tag}"] = cal.gather(calendar_coverage(present, cal.contract, w))
+
+    for expr in compute_for:
+        if expr not in out.columns:
+            continue
+        v = cal.scatter(pd.to_numeric(out[expr], errors="coerce").to_numpy(dtype=float))
+        for tag, w in lookbacks_weeks.items():
+            scores = calendar_window_scores(v, cal.contract, w, min_coverage)
+            for kind in ("pctile", "minmax", "z"):
+                cols[f"{expr}_{kind}_{tag}"] = cal.gather(scores[kind])
+            if include_score_changes:
+                for h, k in CHANGE_WEEKS.items():
+                    cols[f"{expr}_pctile_{tag}_chg_{h}"] = cal.gather(calendar_diff(scores["pctile"], cal.contract, k))
+
+    return pd.concat([out, pd.DataFrame(cols, index=out.index)], axis=1)
+
+
 def add_position_metrics(
     df: pd.DataFrame,
     lookbacks_weeks: dict[str, int] | None = None,
     min_periods: int = 52,
     compute_for: list[str] | None = None,
     include_score_changes: bool = True,
+    cache: MetricsCache | None = None,
+    ew_halflives_weeks: dict[str, int] | None = None,
+    calendar: bool = False,
+    min_coverage: float = 0.9,
 ) -> pd.DataFrame:
-    
-    out = df.copy()
-    out = out.sort_values(["dataset", "group", "cftc_code", "date"])
-
+    """
+    Changes + rolling/expanding scores per (dataset, group, cftc_code), plus
+    the exponentially weighted family (ewz / ewpctile, see ewma.py) for each
+    half-life in `ew_halflives_weeks`.
+
+    By default changes and fixed lookbacks count reports (diff(4) = four rows
+    back). With `calendar=True` they count weeks of the CFTC report calendar
+    (see report_calendar.py): a 4w change compares with the report four weeks
+    earlier (NaN if that week is missing), a 5y window is the last 260 weeks,
+    scored once it holds min_coverage of them, and each row carries
+    coverage_<lookback> = reported weeks / window weeks. Expanding and EW
+    scores are unaffected (they use every report either way).
+
+    With `cache`, each contract's input slice is fingerprinted together with
+    these parameters; only contracts whose inputs or parameters changed are
+    recomputed, the rest are reassembled from disk (see metrics_cache.py).
+    """
     if lookbacks_weeks is None:
         lookbacks_weeks = {
             "3y": 156,
@@ -59,8 +126,41 @@ def add_position_metrics(
         # What users want to express/score on
         compute_for = ["net", "pct_oi_net"]
 
+    if ew_halflives_weeks is None:
+        ew_halflives_weeks = {
+            "hl1y": 52,
+            "hl3y": 156,
+        }
+
+    if cache is not None:
+        params = {
+            "lookbacks_weeks": lookbacks_weeks,
+            "min_periods": min_periods,
+            "compute_for": compute_for,
+            "include_score_changes": include_score_changes,
+            "ew_halflives_weeks": ew_halflives_weeks,
+            "calendar": calendar,
+            "min_coverage": min_coverage,
+        }
+        with span("metrics.cache") as sp:
+            res = cached_position_metrics(
+                lambda d: add_position_metrics(d, lookbacks_weeks, min_periods, compute_for, include_score_changes,
+                                               ew_halflives_weeks=ew_halflives_weeks, calendar=calendar,
+                                               min_coverage=min_coverage),
+                df, cache, params, keys=["dataset", "group", "cftc_code"],
+            )
+            sp.set(rows=len(res), **cache.summary())
+        return res
+
+    out = df.copy()
+    out = out.sort_values(["dataset", "group", "cftc_code", "date"])
+
     g = out.groupby(["dataset", "group", "cftc_code"], group_keys=False)
 
+    if calendar:
+        with span("metrics.calendar") as sp:
+            out = _add_calendar_metrics(out, lookbacks_weeks, compute_for, include_score_changes, min_coverage)
+            sp.set(rows=len(out))
     
     ### Changes metrics (WoW/MoM/13w) 
     ### For each contract (grouped by dataset, group, cftc_code), it computes differences:
@@ -69,20 +169,20 @@ def add_position_metrics(
     ### 13w change (quarter-ish): diff(13)
     ### for net, long, short, spreading, %OI 
   
-    base_change_cols = ["long", "short", "spreading", "net", "open_interest"]
-    for col in base_change_cols:
-        if col in out.columns:
-            out[f"{col}_chg_1w"] = g[col].diff(1)
-            out[f"{col}_chg_4w"] = g[col].diff(4)
-            out[f"{col}_chg_13w"] = g[col].diff(13)
-
-    # %OI-based changes 
-    pct_cols = ["pct_oi_net", "pct_oi_long", "pct_oi_short"]
-    for col in pct_cols:
-        if col in out.columns:
-            out[f"{col}_chg_1w"] = g[col].diff(1)
-            out[f"{col}_chg_4w"] = g[col].diff(4)
-            out[f"{col}_chg_13w"] = g[col].diff(13)
+    with span("metrics.changes") as sp:
+        for col in [] if calendar else BASE_CHANGE_COLS:
+            if col in out.columns:
+                out[f"{col}_chg_1w"] = g[col].diff(1)
+                out[f"{col}_chg_4w"] = g[col].diff(4)
+                out[f"{col}_chg_13w"] = g[col].diff(13)
+
+        # %OI-based changes 
+        for col in [] if calendar else PCT_CHANGE_COLS:
+            if col in out.columns:
+                out[f"{col}_chg_1w"] = g[col].diff(1)
+                out[f"{col}_chg_4w"] = g[col].diff(4)
+                out[f"{col}_chg_13w"] = g[col].diff(13)
+        sp.set(rows=len(out))
 
     
     ### Rolling percentile score (3y/5y/max)
@@ -134,11 +234,17 @@ def add_position_metrics(
         if expr not in out.columns:
             continue
 
-        # fixed lookbacks (3y/5y etc)
-        for tag, w in lookbacks_weeks.items():
-            pct01 = g[expr].apply(lambda s: roll_pct(s, w))
-            mm01 = g[expr].apply(lambda s: roll_minmax(s, w))
-            z = g[expr].apply(lambda s: roll_z(s, w))
+        # fixed lookbacks (3y/5y etc); calendar mode already added them
+        for tag, w in {} if calendar else lookbacks_weeks.items():
+            with span("metrics.pctile", expr=expr, lookback=tag) as sp:
+                pct01 = g[expr].apply(lambda s: roll_pct(s, w))
+                sp.set(rows=len(out))
+            with span("metrics.minmax", expr=expr, lookback=tag) as sp:
+                mm01 = g[expr].apply(lambda s: roll_minmax(s, w))
+                sp.set(rows=len(out))
+            with span("metrics.z", expr=expr, lookback=tag) as sp:
+                z = g[expr].apply(lambda s: roll_z(s, w))
+                sp.set(rows=len(out))
 
             out[f"{expr}_pctile_{tag}"] = pct01 
             out[f"{expr}_minmax_{tag}"] = mm01 
@@ -164,9 +270,22 @@ def add_position_metrics(
             sd = s.expanding(min_periods=min_periods).std(ddof=0)
             return (s - m) / sd
 
-        out[f"{expr}_pctile_max"] = g[expr].apply(expanding_pct) * 100.0
-        out[f"{expr}_minmax_max"] = g[expr].apply(expanding_minmax) * 100.0
-        out[f"{expr}_z_max"] = g[expr].apply(expanding_z)
-        
+        with span("metrics.pctile", expr=expr, lookback="max") as sp:
+            out[f"{expr}_pctile_max"] = g[expr].apply(expanding_pct) * 100.0
+            sp.set(rows=len(out))
+        with span("metrics.minmax", expr=expr, lookback="max") as sp:
+            out[f"{expr}_minmax_max"] = g[expr].apply(expanding_minmax) * 100.0
+            sp.set(rows=len(out))
+        with span("metrics.z", expr=expr, lookback="max") as sp:
+            out[f"{expr}_z_max"] = g[expr].apply(expanding_z)
+            sp.set(rows=len(out))
+
+    ### Exponentially weighted z / percentile (O(1) state per contract)
+    if ew_halflives_weeks:
+        with span("metrics.ew", halflives=len(ew_halflives_weeks)) as sp:
+            out = add_ew_scores(out, ["dataset", "group", "cftc_code"], compute_for,
+                                ew_halflives_weeks, min_periods=min_periods)
+            sp.set(rows=len(out))
+
     return out
 
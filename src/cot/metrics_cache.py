@@ -0,0 +1,155 @@
+# src/cot/metrics_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import uuid
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+### On-disk memo of add_position_metrics results, one file per contract slice.
+### The key is a content hash of the (dataset, group, cftc_code) input rows plus
+### the metric parameters plus the source of metrics.py (and the ewma.py and
+### report_calendar.py code it calls), so a CFTC revision to one contract, a new
+### contract, a parameter change or a code change each only invalidate what
+### they actually touch.
+
+CACHE_DIR = "data/cache/metrics"
+# metrics.py and the score / calendar modules it calls
+_METRICS_SRC = [os.path.join(os.path.dirname(__file__), f)
+                for f in ("metrics.py", "ewma.py", "report_calendar.py")]
+
+
+def _code_fingerprint() -> str:
+    h = hashlib.sha256()
+    try:
+        for path in _METRICS_SRC:
+            with open(path, "rb") as f:
+                h.update(f.read())
+    except OSError:
+        return "unknown"
+    return h.hexdigest()[:16]
+
+
+class MetricsCache:
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.code_fp = _code_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        self.written_bytes = 0
+        self.evicted = 0
+
+    def fingerprint(self, part: pd.DataFrame, params: Dict[str, Any]) -> str:
+        h = hashlib.sha256()
+        h.update(self.code_fp.encode())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        h.update(json.dumps([(c, str(t)) for c, t in part.dtypes.items()]).encode())
+        h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        return h.hexdigest()
+
+    def _path(self, fp: str) -> str:
+        return os.path.join(self.cache_dir, fp[:2], f"{fp}.parquet")
+
+    def get(self, fp: str) -> Optional[pd.DataFrame]:
+        path = self._path(fp)
+        try:
+            df = pd.read_parquet(path)
+        except (FileNotFoundError, OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)  # LRU by mtime
+        self.hits += 1
+        return df
+
+    def put(self, fp: str, df: pd.DataFrame) -> None:
+        path = self._path(fp)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        self.written_bytes += os.path.getsize(path)
+
+    def evict(self) -> int:
+        """
+        Drop least-recently-used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for f in files:
+                if f.endswith(".parquet"):
+                    p = os.path.join(root, f)
+                    st = os.stat(p)
+                    entries.append((st.st_mtime, st.st_size, p))
+
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(p)
+            total -= size
+            removed += 1
+        self.evicted += removed
+        return removed
+
+    def summary(self) -> Dict[str, Any]:
+        n = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / n, 4) if n else None,
+            "written_bytes": self.written_bytes,
+            "evicted": self.evicted,
+        }
+
+
+def cached_position_metrics(compute, df: pd.DataFrame, cache: MetricsCache, params: Dict[str, Any],
+                            keys: list[str]) -> pd.DataFrame:
+    """
+    Run `compute` (add_position_metrics without a cache) only on contract slices
+    whose fingerprint is not cached, and reassemble the full result in the
+    same row order / index as an uncached call would return.
+    """
+    out = df.sort_values(keys + ["date"])
+    positions = out.groupby(keys, sort=False).indices
+
+    results: list[pd.DataFrame] = []
+    order: list[np.ndarray] = []
+    miss_parts: list[tuple[str, np.ndarray]] = []
+
+    for _, pos in positions.items():
+        part = out.iloc[pos]
+        fp = cache.fingerprint(part, params)
+        hit = cache.get(fp)
+        if hit is not None and len(hit) == len(pos):
+            results.append(hit)
+            order.append(pos)
+        else:
+            miss_parts.append((fp, pos))
+
+    if miss_parts:
+        miss_pos = np.concatenate([p for _, p in miss_parts])
+        # positional index -> sort_index() restores exactly the slice order
+        computed = compute(out.iloc[miss_pos].reset_index(drop=True)).sort_index()
+        start = 0
+        for fp, pos in miss_parts:
+            res = computed.iloc[start:start + len(pos)].reset_index(drop=True)
+            start += len(pos)
+            cache.put(fp, res)
+            results.append(res)
+            order.append(pos)
+        cache.evict()
+
+    if not results:
+        return compute(out)
+
+    full = pd.concat(results, ignore_index=True)
+    full = full.iloc[np.argsort(np.concatenate(order), kind="stable")]
+    full.index = out.index
+    return full
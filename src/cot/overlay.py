@@ -0,0 +1,141 @@
+# src/cot/overlay.py
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.cot.instrument import span
+from src.cot.publish import PROCESSED_DIR, read_manifest, release_path
+from src.cot.report_calendar import week_date, week_number
+
+### Multi-market overlay: a handful of markets' score histories on one chart.
+###
+### Histories come straight from the release's metrics parquet: one read per
+### batch of markets not yet in memory, projected to (keys, date, the score
+### column) and filtered with dataset IN (...) AND cftc_code IN (...).
+### publish_release writes that file sorted by (cftc_code, date) in small row
+### groups (publish.PARQUET_ROW_GROUP_ROWS), so row groups whose cftc_code
+### range misses every selected code are skipped: a few markets read a few
+### groups, not the file. Releases published before that sort have contracts
+### spread over many groups and are read mostly in full. Slices are kept per
+### (contract, column) in a bounded LRU, so adding one market to a selection
+### reads just that market's slice.
+###
+### overlay_frame() aligns the slices on the report calendar (week anchors, so
+### holiday-shifted reports line up) and optionally normalizes each series:
+###   "none"    the score as published
+###   "z"       (x - mean) / std over the shown range
+###   "minmax"  0-100 between the shown range's min and max
+
+METRICS_FILE = "cot_metrics.parquet"
+MARKET_KEYS = ["dataset", "group", "cftc_code"]
+MAX_MARKETS = 20
+NORMALIZATIONS = {"none": "As published", "z": "Z-score (shown range)", "minmax": "Min-max 0-100 (shown range)"}
+SLICE_CACHE_ENTRIES = 2048
+
+MarketKey = Tuple[str, str, str]
+
+
+class HistorySlices:
+    """
+    (contract, column) -> date-sorted history, for one release. Thread-safe:
+    a Streamlit server shares one instance across sessions.
+    """
+
+    def __init__(self, root: str = PROCESSED_DIR, manifest: Optional[dict] = None,
+                 max_entries: int = SLICE_CACHE_ENTRIES):
+        self.manifest = manifest if manifest is not None else read_manifest(root)
+        self.path = release_path(METRICS_FILE, root, self.manifest)
+        self.max_entries = max_entries
+        self._items: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def get_many(self, keys: Sequence[MarketKey], column: str) -> Dict[MarketKey, pd.DataFrame]:
+        keys = list(dict.fromkeys(tuple(k) for k in keys))
+        with self._lock:
+            out = {k: self._items[(k, column)] for k in keys if (k, column) in self._items}
+            for k in out:
+                self._items.move_to_end((k, column))
+        missing = [k for k in keys if k not in out]
+
+        if missing:
+            fetched = self._read(missing, column)
+            with self._lock:
+                for k, df in fetched.items():
+                    self._items[(k, column)] = df
+                while len(self._items) > self.max_entries:
+                    self._items.popitem(last=False)
+            out.update(fetched)
+        return {k: out[k] for k in keys}
+
+    def _read(self, keys: List[MarketKey], column: str) -> Dict[MarketKey, pd.DataFrame]:
+        datasets = sorted({k[0] for k in keys})
+        codes = sorted({k[2] for k in keys})
+        with span("overlay.read", markets=len(keys), column=column) as sp:
+            table = pq.read_table(
+                self.path,
+                columns=MARKET_KEYS + ["date", column],
+                filters=[("dataset", "in", datasets), ("cftc_code", "in", codes)],
+            )
+            df = table.to_pandas()
+            self.reads += 1
+            sp.set(rows=len(df))
+
+        df = df.sort_values("date")
+        groups = dict(iter(df.groupby(MARKET_KEYS, sort=False)))
+        empty = df.iloc[0:0][["date", column]]
+        return {
+            k: groups[k][["date", column]].reset_index(drop=True) if k in groups else empty
+            for k in keys
+        }
+
+
+def _normalize(wide: pd.DataFrame, how: str) -> pd.DataFrame:
+    if how == "none":
+        return wide
+    if how == "z":
+        return (wide - wide.mean()) / wide.std().where(wide.std() != 0)
+    if how == "minmax":
+        lo, hi = wide.min(), wide.max()
+        return (wide - lo) / (hi - lo).where(hi != lo) * 100.0
+    raise ValueError(f"Unknown normalization={how}. Use one of: {list(NORMALIZATIONS)}")
+
+
+def overlay_frame(
+    slices: Dict[MarketKey, pd.DataFrame],
+    labels: Dict[MarketKey, str],
+    column: str,
+    normalize: str = "none",
+    start: Optional[pd.Timestamp] = None,
+) -> pd.DataFrame:
+    """
+    Long (date, market, value) frame of the selected series on the report
+    calendar, ready for a colour-by-market line chart.
+    """
+    series = {}
+    for k, df in slices.items():
+        if df.empty:
+            continue
+        wk = week_number(df["date"])
+        s = pd.Series(df[column].to_numpy(dtype=float), index=wk)
+        series[labels.get(k, k[2])] = s[~s.index.duplicated(keep="last")]
+    if not series:
+        return pd.DataFrame(columns=["date", "market", "value"])
+
+    lo = min(int(s.index.min()) for s in series.values())
+    hi = max(int(s.index.max()) for s in series.values())
+    weeks = np.arange(lo, hi + 1)
+    wide = pd.DataFrame({m: s.reindex(weeks).to_numpy() for m, s in series.items()},
+                        index=week_date(weeks))
+    if start is not None:
+        wide = wide[wide.index >= pd.Timestamp(start)]
+    wide = _normalize(wide, normalize)
+
+    out = wide.rename_axis("date").reset_index().melt("date", var_name="market", value_name="value")
+    return out.dropna(subset=["value"]).reset_index(drop=True)
@@ -0,0 +1,73 @@
+# src/cot/peers.py
+from __future__ import annotations
+
+import re
+
+import pandas as pd
+
+from src.cot.instrument import span
+
+### Cross-sectional (peer-relative) scores.
+### add_position_metrics scores each contract against its own history. Here
+### each contract is scored against its asset-class peers on the same report
+### date, e.g. "JPY 5y z-score vs all FX contracts this week":
+###   {col}_peer_pctile  (rank - 1) / (n - 1) within (date, asset_class), 0-100:
+###                      lowest 0, highest 100, ties share their mid-rank
+###   {col}_peer_z       z-score within (date, asset_class)
+###   {col}_peer_rank    1 = highest value within (date, asset_class)
+###   peer_count         contracts in the peer group with a value (first column)
+### n counts the peers with a value in that column; with fewer than
+### MIN_PEERS the three scores are NaN (one or two contracts are not a
+### cross-section, and a lone contract would always sit at 100).
+### One groupby over (date, asset_class) serves every column: ranks are a
+### single sort-based cython pass, mean/std/count are group transforms.
+
+PEER_KEYS = ["date", "asset_class"]
+MIN_PEERS = 3
+_TS_SCORE = re.compile(r"^(net|pct_oi_net)_(pctile|z|minmax|ewz|ewpctile)_[^_]+$")
+
+
+def default_peer_columns(df: pd.DataFrame) -> list[str]:
+    """
+    Levels (net, pct_oi_net) + every time-series score column present
+    (e.g. net_z_5y, pct_oi_net_pctile_max, net_ewz_hl1y), but not their *_chg_* columns.
+    """
+    base = [c for c in ["net", "pct_oi_net"] if c in df.columns]
+    scores = [c for c in df.columns if _TS_SCORE.match(c)]
+    return base + scores
+
+
+def add_peer_scores(
+    df: pd.DataFrame,
+    cols: list[str] | None = None,
+    keys: list[str] | None = None,
+    min_peers: int = MIN_PEERS,
+) -> pd.DataFrame:
+    out = df.copy()
+    keys = keys or PEER_KEYS
+    cols = cols if cols is not None else default_peer_columns(out)
+    if not cols:
+        return out
+
+    with span("metrics.peers", cols=len(cols)) as sp:
+        vals = out[cols].apply(pd.to_numeric, errors="coerce")
+        g = vals.groupby([out[k] for k in keys], sort=False)
+
+        n = g.transform("count")
+        enough = n >= max(min_peers, 2)
+        pctile = ((g.rank(method="average") - 1) / (n - 1) * 100.0).where(enough)
+        rank = g.rank(ascending=False, method="min").where(enough)
+        mean = g.transform("mean")
+        std = g.transform("std", ddof=0)
+        z = ((vals - mean) / std.where(std != 0)).where(enough)
+
+        new = {"peer_count": n[cols[0]].to_numpy()}
+        for c in cols:
+            new[f"{c}_peer_pctile"] = pctile[c].to_numpy()
+            new[f"{c}_peer_z"] = z[c].to_numpy()
+            new[f"{c}_peer_rank"] = rank[c].to_numpy()
+
+        out = pd.concat([out, pd.DataFrame(new, index=out.index)], axis=1)
+        sp.set(rows=len(out))
+
+    return out
@@ -0,0 +1,146 @@
+# src/cot/pipeline.py
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from src.cot.alerts import ALERTS_FILE, alert_diff
+from src.cot.composites import build_composites
+from src.cot.correlation import CORRELATION_FILE, CROWDING_FILE, build_correlations
+from src.cot.events import EVENTS_FILE, event_study, load_prices
+from src.cot.instrument import span
+from src.cot.metrics import add_position_metrics
+from src.cot.metrics_cache import MetricsCache
+from src.cot.peers import add_peer_scores
+from src.cot.publish import PROCESSED_DIR, publish_release
+from src.cot.screener import CUBE_FILE, build_screener_cube
+from src.cot.seasonal import add_seasonal_scores
+from src.cot.sketch import SKETCH_FILE, build_sketches
+from src.cot.tff_groups import TFF_GROUPS_FILE, build_tff_groups, load_tff_raw
+
+### Shared "tidy -> metrics -> release" step.
+### Used by scripts/run_metrics.py and by the refresh scheduler so both publish
+### exactly the same set of files.
+
+METRICS_FILE = "cot_metrics.parquet"
+SNAPSHOT_FILE = "cot_latest_snapshot.parquet"
+SERVING_FILES = (METRICS_FILE, SNAPSHOT_FILE)
+
+
+def latest_snapshot(dfm: pd.DataFrame) -> pd.DataFrame:
+    """
+    Latest row per (dataset, group, cftc_code), default-ranked by 5y %OI percentile.
+    """
+    latest = (
+        dfm.sort_values("date")
+           .groupby(["dataset", "group", "cftc_code"], as_index=False)
+           .tail(1)
+    )
+    if "pct_oi_net_pctile_5y" in latest.columns:
+        latest = latest.sort_values("pct_oi_net_pctile_5y", ascending=False)
+    return latest
+
+
+def build_release_frames(
+    tidy: pd.DataFrame,
+    cache: Optional[MetricsCache] = None,
+    composites: bool = True,
+    prices: Optional[pd.DataFrame] = None,
+    calendar: bool = False,
+    tff_raw: Optional[pd.DataFrame] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Compute every file that makes up one published release.
+
+    Composite basket indices are appended to the tidy panel first, so they
+    get the same changes, scores and peer ranks as single contracts.
+    `calendar` measures changes and lookback windows in report-calendar weeks
+    instead of reports (see add_position_metrics). With `tff_raw` (every TFF
+    trader category's columns) the release also gets per-category scores and
+    their pairwise divergences.
+    """
+    if composites:
+        with span("stage.composites") as sp:
+            comp = build_composites(tidy)
+            sp.set(rows=len(comp))
+        tidy = pd.concat([tidy, comp], ignore_index=True)
+
+    with span("stage.metrics") as sp:
+        dfm = add_position_metrics(tidy, cache=cache, calendar=calendar)
+        sp.set(rows=len(dfm))
+    with span("stage.seasonal") as sp:
+        # DIS commodities vs the same weeks of prior years
+        dfm = add_seasonal_scores(dfm)
+        sp.set(rows=len(dfm))
+    with span("stage.peers") as sp:
+        # same-date, same-asset-class ranks of levels and time-series scores
+        dfm = add_peer_scores(dfm)
+        sp.set(rows=len(dfm))
+    # rolling cross-market correlation of weekly changes -> crowding indicator
+    with span("stage.correlation") as sp:
+        crowd, corr_latest = build_correlations(dfm)
+        sp.set(rows=len(crowd))
+    with span("stage.snapshot") as sp:
+        latest = latest_snapshot(dfm)
+        sp.set(rows=len(latest))
+
+    # per-year quantile sketches for arbitrary-lookback percentiles
+    with span("stage.sketches") as sp:
+        sketches = build_sketches(dfm)
+        sp.set(rows=len(sketches))
+
+    # declarative alert rules -> new / persisting / cleared since the previous report
+    with span("stage.alerts") as sp:
+        alerts = alert_diff(dfm)
+        sp.set(rows=len(alerts))
+
+    # what followed past extreme flags (forward returns only with a price file)
+    with span("stage.events") as sp:
+        events = event_study(dfm, prices=prices)
+        sp.set(rows=len(events))
+
+    # Every screener selection pre-sorted + flagged, so renders are dict lookups
+    with span("stage.screener_cube") as sp:
+        cube = build_screener_cube(latest)
+        sp.set(rows=len(cube))
+
+    frames = {
+        METRICS_FILE: dfm,
+        SNAPSHOT_FILE: latest,
+        CUBE_FILE: cube,
+        EVENTS_FILE: events,
+        ALERTS_FILE: alerts,
+        SKETCH_FILE: sketches,
+        CROWDING_FILE: crowd,
+        CORRELATION_FILE: corr_latest,
+    }
+
+    # dealer / asset manager / leveraged funds side by side, from one raw read
+    if tff_raw is not None:
+        with span("stage.tff_groups") as sp:
+            frames[TFF_GROUPS_FILE] = build_tff_groups(tff_raw)
+            sp.set(rows=len(frames[TFF_GROUPS_FILE]))
+    return frames
+
+
+def publish_metrics(
+    tidy: pd.DataFrame,
+    root: str = PROCESSED_DIR,
+    extra: Optional[Dict[str, Any]] = None,
+    cache: Optional[MetricsCache] = None,
+    calendar: bool = False,
+) -> tuple[Dict[str, Any], Dict[str, pd.DataFrame]]:
+    """
+    Build a release from the tidy panel and flip the manifest atomically.
+    Prices for the event study come from events.PRICES_PATH when it exists,
+    TFF raw rows with every trader category from the raw store / raw parquet.
+    Returns (manifest, frames).
+    """
+    frames = build_release_frames(tidy, cache=cache, prices=load_prices(), calendar=calendar,
+                                  tff_raw=load_tff_raw())
+    extra = {**(extra or {}), "calendar_aligned": calendar}
+    # the dashboard / API memory-map these instead of decoding parquet
+    with span("stage.publish"):
+        manifest = publish_release(frames, root=root, extra=extra, arrow_files=SERVING_FILES)
+    return manifest, frames
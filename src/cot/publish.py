@@ -0,0 +1,229 @@
+# src/cot/publish.py
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from src.cot.instrument import span
+
+### Versioned publishing of processed outputs.
+### Every pipeline run writes into data/processed/releases/<version>/ and then
+### atomically flips data/processed/CURRENT.json to point at it. Readers never
+### see a half-written parquet: they either see the old manifest or the new one.
+###
+### layout:
+###   data/processed/CURRENT.json
+###   data/processed/releases/20260206T153512004211-1a2b3c/cot_metrics.parquet
+###   data/processed/releases/20260206T153512004211-1a2b3c/cot_latest_snapshot.parquet
+###   data/processed/releases/20260206T153512004211-1a2b3c/cot_metrics.arrow   (serving copy)
+###
+### The .arrow files are uncompressed Arrow IPC (Feather v2). Readers memory-map
+### them, so opening is O(1), pages are shared across server processes through
+### the OS page cache, and numeric columns come back as zero-copy views.
+
+PROCESSED_DIR = "data/processed"
+RELEASES_DIRNAME = "releases"
+MANIFEST_NAME = "CURRENT.json"
+# smallish row groups so readers (sql.py, overlay.py) can skip whole groups
+# by their min/max stats; publish_release sorts frames by RELEASE_SORT_KEYS
+# first, so a contract's rows sit in one or two neighbouring groups
+PARQUET_ROW_GROUP_ROWS = 8192
+RELEASE_SORT_KEYS = ["cftc_code", "date"]
+
+
+def manifest_path(root: str = PROCESSED_DIR) -> str:
+    return os.path.join(root, MANIFEST_NAME)
+
+
+def _write_json_atomic(obj: Dict[str, Any], path: str) -> None:
+    """
+    Write JSON to a temp file in the same directory, fsync it, then os.replace.
+    os.replace is atomic on POSIX and Windows when src/dst share a filesystem.
+    """
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=2, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def new_version() -> str:
+    # sortable by publish time (to the microsecond); suffix guards against clashes
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    return f"{stamp}-{uuid.uuid4().hex[:6]}"
+
+
+def arrow_name(fname: str) -> str:
+    return os.path.splitext(fname)[0] + ".arrow"
+
+
+def write_arrow(df: pd.DataFrame, path: str) -> None:
+    """
+    Uncompressed Arrow IPC file for memory-mapped serving.
+    NaN stays NaN (no validity bitmap) so float columns can be viewed zero-copy.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, name in enumerate(table.column_names):
+        if pa.types.is_floating(table.schema.field(name).type):
+            values = df[name].to_numpy(dtype=table.schema.field(name).type.to_pandas_dtype())
+            table = table.set_column(i, table.schema.field(name), pa.array(values, from_pandas=False))
+    feather.write_feather(table, path, compression="uncompressed")
+
+
+def publish_release(
+    frames: Dict[str, pd.DataFrame],
+    root: str = PROCESSED_DIR,
+    keep: int = 3,
+    extra: Optional[Dict[str, Any]] = None,
+    arrow_files: tuple[str, ...] = (),
+) -> Dict[str, Any]:
+    """
+    Write {filename: DataFrame} into a fresh release directory and flip the manifest.
+    Frames named in `arrow_files` also get an uncompressed .arrow serving copy.
+    Frames with cftc_code and date columns are written sorted by them.
+
+    Files are staged in a hidden temp directory which is renamed into place once
+    everything is on disk, so a release directory is always complete.
+    Returns the manifest that was published.
+    """
+    version = new_version()
+    releases = os.path.join(root, RELEASES_DIRNAME)
+    final_dir = os.path.join(releases, version)
+    stage_dir = os.path.join(releases, f".{version}.staging")
+    os.makedirs(stage_dir, exist_ok=True)
+
+    files: Dict[str, Dict[str, Any]] = {}
+    try:
+        for fname, df in frames.items():
+            path = os.path.join(stage_dir, fname)
+            if set(RELEASE_SORT_KEYS) <= set(df.columns):
+                df = df.sort_values(RELEASE_SORT_KEYS, kind="stable").reset_index(drop=True)
+            with span("publish.write", file=fname) as sp:
+                df.to_parquet(path, index=False, row_group_size=PARQUET_ROW_GROUP_ROWS)
+                files[fname] = {"rows": int(len(df)), "bytes": os.path.getsize(path)}
+                sp.set(rows=len(df), bytes=files[fname]["bytes"])
+            if fname in arrow_files:
+                aname = arrow_name(fname)
+                with span("publish.write", file=aname) as sp:
+                    write_arrow(df, os.path.join(stage_dir, aname))
+                    files[aname] = {"rows": int(len(df)), "bytes": os.path.getsize(os.path.join(stage_dir, aname))}
+                    sp.set(rows=len(df), bytes=files[aname]["bytes"])
+        os.replace(stage_dir, final_dir)
+    except Exception:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        raise
+
+    manifest: Dict[str, Any] = {
+        "version": version,
+        "published_at": pd.Timestamp.now(tz="UTC").isoformat(),
+        "files": files,
+    }
+    if extra:
+        manifest.update(extra)
+
+    _write_json_atomic(manifest, manifest_path(root))
+    prune_releases(root=root, keep=keep)
+    return manifest
+
+
+def prune_releases(root: str = PROCESSED_DIR, keep: int = 3) -> list[str]:
+    """
+    Delete old release directories, keeping the newest `keep` plus whatever
+    the manifest currently points at. Older versions are kept around for a
+    while so dashboard reruns that started before a flip can finish reading.
+    """
+    releases = os.path.join(root, RELEASES_DIRNAME)
+    if not os.path.isdir(releases):
+        return []
+
+    current = read_manifest(root)
+    current_version = current.get("version") if current else None
+
+    versions = sorted(
+        d for d in os.listdir(releases)
+        if not d.startswith(".") and os.path.isdir(os.path.join(releases, d))
+    )
+    stale = [v for v in versions[:-keep] if v != current_version] if keep > 0 else []
+
+    for v in stale:
+        shutil.rmtree(os.path.join(releases, v), ignore_errors=True)
+    return stale
+
+
+def read_manifest(root: str = PROCESSED_DIR) -> Optional[Dict[str, Any]]:
+    path = manifest_path(root)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def manifest_token(root: str = PROCESSED_DIR) -> Optional[tuple[int, int, int]]:
+    """
+    Cheap change detector for the dashboard: a single stat() call, no file read.
+    The manifest is always replaced (new inode), never edited in place.
+    Returns None when nothing has been published yet (legacy flat files).
+    """
+    try:
+        st_ = os.stat(manifest_path(root))
+    except FileNotFoundError:
+        return None
+    return (st_.st_ino, st_.st_mtime_ns, st_.st_size)
+
+
+def release_path(
+    fname: str,
+    root: str = PROCESSED_DIR,
+    manifest: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Resolve a processed filename to the current release.
+    Falls back to data/processed/<fname> for trees that predate versioned publishing.
+    """
+    if manifest is None:
+        manifest = read_manifest(root)
+    if manifest and fname in manifest.get("files", {}):
+        return os.path.join(root, RELEASES_DIRNAME, manifest["version"], fname)
+    return os.path.join(root, fname)
+
+
+def read_release_table(
+    fname: str,
+    root: str = PROCESSED_DIR,
+    manifest: Optional[Dict[str, Any]] = None,
+) -> pa.Table:
+    """
+    Arrow table for a processed file: memory-mapped from the .arrow serving copy
+    when the release has one, otherwise decoded from parquet.
+    """
+    if manifest is None:
+        manifest = read_manifest(root)
+    aname = arrow_name(fname)
+    if manifest and aname in manifest.get("files", {}):
+        source = pa.memory_map(release_path(aname, root, manifest), "r")
+        return pa.ipc.open_file(source).read_all()
+    return pq.read_table(release_path(fname, root, manifest))
+
+
+def read_release_frame(
+    fname: str,
+    root: str = PROCESSED_DIR,
+    manifest: Optional[Dict[str, Any]] = None,
+) -> pd.DataFrame:
+    """
+    DataFrame view of read_release_table. split_blocks keeps one block per
+    column so eligible columns stay zero-copy views onto the mapped file;
+    treat the result as read-only.
+    """
+    return read_release_table(fname, root, manifest).to_pandas(split_blocks=True)
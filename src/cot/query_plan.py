@@ -0,0 +1,118 @@
+# src/cot/query_plan.py
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import requests
+
+### Query planner for key-filtered Socrata downloads (codes or market names).
+### For one fetch it decides:
+###   $select    only the raw columns the transform reads
+###              (transform.required_raw_columns: 8 of the ~190 DIS columns)
+###   IN-clauses keys are packed greedily so that every request URL stays under
+###              MAX_URL_LENGTH and the expected rows of a batch under
+###              MAX_ROWS_PER_QUERY (keys with no rows are dropped up front)
+###   $limit     from per-key row counts (grouped count(*) queries, see
+###              fetch.count_rows_by): a batch that fits in one page is fetched
+###              with a single request, limit = expected rows + headroom; bigger
+###              ones page at MAX_PAGE_ROWS ordered by :id so pages are stable.
+### Without counts it falls back to URL-sized batches paged at MAX_PAGE_ROWS.
+
+MAX_URL_LENGTH = 4000        # well under the usual 8KB server / proxy limits
+MAX_PAGE_ROWS = 50000
+MAX_ROWS_PER_QUERY = 50000
+ROW_HEADROOM = 0.02          # rows published between the count and the fetch
+ROW_SLACK = 50
+DATE_COL = "report_date_as_yyyy_mm_dd"
+
+
+def url_length(base_url: str, params: Mapping[str, Any]) -> int:
+    return len(requests.Request("GET", base_url, params=dict(params)).prepare().url)
+
+
+def build_where(key_col: str, values: Sequence[str], since: Optional[str] = None) -> str:
+    quoted = ",".join("'" + str(v).replace("'", "''") + "'" for v in values)
+    where = f"{key_col} in ({quoted})"
+    if since is not None:
+        where += f" AND {DATE_COL} > '{since}'"
+    return where
+
+
+def pack_in_clauses(
+    base_url: str,
+    key_col: str,
+    values: Sequence[str],
+    params: Optional[Mapping[str, Any]] = None,
+    since: Optional[str] = None,
+    expected: Optional[Mapping[str, int]] = None,
+    max_url_length: int = MAX_URL_LENGTH,
+    max_rows: int = MAX_ROWS_PER_QUERY,
+) -> List[List[str]]:
+    """
+    Greedy packing of `values` into IN-clause batches. `params` are the other
+    query parameters that go into the URL ($select, $limit, ...). A single key
+    that breaks a limit on its own still gets its own batch.
+    """
+    params = dict(params or {})
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    rows = 0
+    for v in values:
+        n = int(expected.get(v, 0)) if expected is not None else 0
+        cand = batch + [v]
+        too_long = url_length(base_url, {**params, "$where": build_where(key_col, cand, since)}) > max_url_length
+        if batch and (too_long or rows + n > max_rows):
+            batches.append(batch)
+            cand, rows = [v], 0
+        batch = cand
+        rows += n
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def plan_queries(
+    base_url: str,
+    key_col: str,
+    values: Sequence[str],
+    select: Optional[str],
+    counts: Optional[Mapping[str, int]] = None,
+    since: Optional[str] = None,
+    max_page_rows: int = MAX_PAGE_ROWS,
+    max_url_length: int = MAX_URL_LENGTH,
+) -> List[Dict[str, Any]]:
+    """
+    One dict per request batch:
+    {keys, where, select, order, chunk_size, expected_rows}.
+    """
+    values = list(dict.fromkeys(str(v) for v in values))
+    if counts is not None:
+        values = [v for v in values if counts.get(v, 0) > 0]
+
+    # the URL budget has to cover the largest $limit we might send
+    base_params = {"$limit": max_page_rows, "$offset": 0, "$order": ":id"}
+    if select:
+        base_params["$select"] = select
+    batches = pack_in_clauses(
+        base_url, key_col, values, params=base_params, since=since, expected=counts,
+        max_url_length=max_url_length, max_rows=min(max_page_rows, MAX_ROWS_PER_QUERY),
+    )
+
+    plans = []
+    for keys in batches:
+        expected = sum(int(counts.get(k, 0)) for k in keys) if counts is not None else None
+        if expected is None:
+            chunk, order = max_page_rows, ":id"
+        else:
+            need = int(expected * (1.0 + ROW_HEADROOM)) + ROW_SLACK
+            chunk = min(max_page_rows, need)
+            order = None if need <= max_page_rows else ":id"
+        plans.append({
+            "keys": keys,
+            "where": build_where(key_col, keys, since),
+            "select": select,
+            "order": order,
+            "chunk_size": chunk,
+            "expected_rows": expected,
+        })
+    return plans
@@ -0,0 +1,256 @@
+# src/cot/raw_store.py
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.cot.instrument import span
+
+### Bitemporal raw store: report date x knowledge date.
+###
+### CFTC occasionally revises past reports. A flat raw parquet only holds the
+### latest numbers, so what the dashboard showed on an earlier Friday is lost,
+### and every refresh rewrites the whole file. Here every raw row version is
+### kept with the time we first saw it:
+###
+###   <root>/<name>/MANIFEST.json
+###       {"seq": 3, "horizon": null,
+###        "parts": [{"file": "part-000001.parquet", "rows": 48210,
+###                   "known_min": "...", "known_max": "..."}, ...]}
+###   <root>/<name>/part-000001.parquet   raw columns + __known_at + __row_hash
+###
+### ingest(df) hashes each row's content and appends only the rows whose hash
+### differs from the latest stored version of the same (contract, report date)
+### as one new part, so storage grows with revisions, not with refreshes.
+### changes() + commit() are the same in two steps, for callers that must
+### finish their own writes before the rows count as stored.
+### as_of(t) answers "the raw table as known at t": parts whose known_min is
+### after t are never opened, the rest are read with a pushed-down
+### __known_at <= t filter, and the last version per key wins.
+### compact() folds all parts into one; with a horizon it also drops versions
+### superseded before it (as_of earlier than the horizon is then refused).
+###
+### Rows that disappear from a later fetch are not treated as deletions: a
+### refresh usually only asks for recent report dates.
+
+RAW_HISTORY_DIR = "data/raw/history"
+KEY_COLUMNS = ["cftc_contract_market_code", "report_date_as_yyyy_mm_dd"]
+KNOWN_COL = "__known_at"
+HASH_COL = "__row_hash"
+MANIFEST_NAME = "MANIFEST.json"
+
+
+def _utc(ts: Any = None) -> pd.Timestamp:
+    ts = pd.Timestamp.now(tz="UTC") if ts is None else pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Content hash per row over the raw (non "__") columns, independent of
+    column order. Values are hashed as strings so dtype drift between fetches
+    (int vs str from the API) does not look like a revision.
+    """
+    cols = sorted(c for c in df.columns if not c.startswith("__"))
+    return pd.util.hash_pandas_object(df[cols].astype(str), index=False).to_numpy(dtype=np.uint64)
+
+
+class RawStore:
+
+    def __init__(self, name: str, root: str = RAW_HISTORY_DIR, keys: Sequence[str] = KEY_COLUMNS):
+        self.dir = os.path.join(root, name)
+        self.keys = list(keys)
+        self.path = os.path.join(self.dir, MANIFEST_NAME)
+        self.manifest = self._read()
+
+    def _read(self) -> Dict[str, Any]:
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                return json.load(f)
+        return {"seq": 0, "horizon": None, "parts": []}
+
+    def _write(self) -> None:
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.path)
+
+    @property
+    def empty(self) -> bool:
+        return not self.manifest["parts"]
+
+    @property
+    def parts(self) -> List[Dict[str, Any]]:
+        return self.manifest["parts"]
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        Raw columns across all parts (parts written before a wider select lack some).
+        """
+        cols: Dict[str, None] = {}
+        for path in self._files():
+            cols.update(dict.fromkeys(n for n in pq.read_schema(path).names if not n.startswith("__")))
+        return list(cols)
+
+    def _files(self, known_at: Optional[pd.Timestamp] = None) -> List[str]:
+        parts = self.parts
+        if known_at is not None:
+            parts = [p for p in parts if _utc(p["known_min"]) <= known_at]
+        return [os.path.join(self.dir, p["file"]) for p in parts]
+
+    def _read_parts(self, files: List[str], columns: Optional[List[str]], filters=None) -> pd.DataFrame:
+        if not files:
+            return pd.DataFrame(columns=(columns or []))
+        frames = []
+        for path in files:
+            # parts may predate a wider select: ask each for the columns it has
+            have = pq.read_schema(path).names
+            cols = None if columns is None else [c for c in columns if c in have]
+            frames.append(pd.read_parquet(path, columns=cols, filters=filters))
+        return pd.concat(frames, ignore_index=True)
+
+    def _append(self, rows: pd.DataFrame) -> None:
+        self.manifest["seq"] += 1
+        name = f"part-{self.manifest['seq']:06d}.parquet"
+        os.makedirs(self.dir, exist_ok=True)
+        rows = rows.sort_values(self.keys, kind="stable")
+        with span("raw_store.write", store=os.path.basename(self.dir)) as sp:
+            rows.to_parquet(os.path.join(self.dir, name), index=False)
+            sp.set(rows=len(rows), bytes=os.path.getsize(os.path.join(self.dir, name)))
+        self.manifest["parts"].append({
+            "file": name,
+            "rows": len(rows),
+            "known_min": str(rows[KNOWN_COL].min()),
+            "known_max": str(rows[KNOWN_COL].max()),
+        })
+
+    def latest_hashes(self) -> pd.DataFrame:
+        """
+        (keys..., __row_hash) of the newest version of every key.
+        """
+        cur = self._read_parts(self._files(), self.keys + [KNOWN_COL, HASH_COL])
+        if cur.empty:
+            return cur
+        return cur.sort_values(KNOWN_COL, kind="stable").drop_duplicates(self.keys, keep="last")
+
+    def changes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        The rows of `df` that are new or changed (by content hash) against the
+        latest stored versions, with __row_hash. Nothing is written.
+        """
+        new = df.drop_duplicates(self.keys, keep="last").reset_index(drop=True)
+        new = new[[c for c in new.columns if not c.startswith("__")]]
+        new[HASH_COL] = row_hashes(new)
+
+        cur = self.latest_hashes()
+        if not cur.empty:
+            seen = new.merge(cur[self.keys + [HASH_COL]], on=self.keys, how="left",
+                             suffixes=("", "_stored"))
+            new = new[(seen[HASH_COL + "_stored"] != seen[HASH_COL]).to_numpy()]
+        return new.reset_index(drop=True)
+
+    def commit(self, rows: pd.DataFrame, known_at: Any = None) -> pd.DataFrame:
+        """
+        Append rows from changes() as known from `known_at` (default: now).
+        Returns them with __known_at.
+        """
+        known_at = _utc(known_at)
+        rows = rows.assign(**{KNOWN_COL: known_at})
+        if len(rows):
+            if self.parts and known_at < _utc(self.parts[-1]["known_max"]):
+                raise ValueError(f"known_at {known_at} is earlier than the store's latest knowledge time")
+            self._append(rows)
+            self._write()
+        return rows.reset_index(drop=True)
+
+    def ingest(self, df: pd.DataFrame, known_at: Any = None) -> pd.DataFrame:
+        """
+        Append the rows of `df` that are new or changed (by content hash) as
+        known from `known_at` (default: now). Returns the appended rows.
+        """
+        with span("raw_store.ingest", store=os.path.basename(self.dir)) as sp:
+            new = self.commit(self.changes(df), known_at)
+            sp.set(rows=len(new))
+        return new
+
+    def as_of(self, known_at: Any = None, columns: Optional[List[str]] = None,
+              with_meta: bool = False) -> pd.DataFrame:
+        """
+        The raw table as it was known at `known_at` (default: latest): newest
+        version per key among versions known by then.
+        """
+        horizon = self.manifest.get("horizon")
+        t = None if known_at is None else _utc(known_at)
+        if t is not None and horizon is not None and t < _utc(horizon):
+            raise ValueError(f"history before {horizon} was compacted away")
+
+        read_cols = None if columns is None else list(dict.fromkeys(self.keys + columns + [KNOWN_COL]))
+        filters = None if t is None else [(KNOWN_COL, "<=", t)]
+        with span("raw_store.as_of", store=os.path.basename(self.dir)) as sp:
+            df = self._read_parts(self._files(t), read_cols, filters)
+            if not df.empty:
+                df = (df.sort_values(KNOWN_COL, kind="stable")
+                        .drop_duplicates(self.keys, keep="last")
+                        .sort_values(self.keys)
+                        .reset_index(drop=True))
+            sp.set(rows=len(df))
+
+        if not with_meta:
+            df = df.drop(columns=[c for c in (KNOWN_COL, HASH_COL) if c in df.columns])
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df
+
+    def revisions(self) -> pd.DataFrame:
+        """
+        Every stored version of keys that were revised at least once.
+        """
+        df = self._read_parts(self._files(), None)
+        if df.empty:
+            return df
+        n = df.groupby(self.keys)[KNOWN_COL].transform("size")
+        return df[n > 1].sort_values(self.keys + [KNOWN_COL]).reset_index(drop=True)
+
+    def compact(self, horizon: Any = None) -> Dict[str, Any]:
+        """
+        Rewrite all parts as one. With `horizon`, versions already superseded
+        at that time are dropped: as_of(t) stays exact for t >= horizon.
+        """
+        if len(self.parts) <= 1 and horizon is None:
+            return self.manifest
+        old = self._files()
+        with span("raw_store.compact", store=os.path.basename(self.dir)) as sp:
+            df = self._read_parts(old, None)
+            if horizon is not None:
+                h = _utc(horizon)
+                before = df[KNOWN_COL] <= h
+                # the version in force at the horizon survives, earlier ones go
+                keep_old = (df[before].sort_values(KNOWN_COL, kind="stable")
+                            .drop_duplicates(self.keys, keep="last"))
+                df = pd.concat([keep_old, df[~before]], ignore_index=True)
+                self.manifest["horizon"] = str(h)
+
+            self.manifest["parts"] = []
+            self._append(df.sort_values(self.keys + [KNOWN_COL], kind="stable"))
+            self._write()
+            sp.set(rows=len(df), parts=len(old))
+
+        for path in old:
+            os.remove(path)
+        return self.manifest
+
+    def max_report_date(self) -> Optional[pd.Timestamp]:
+        date_col = self.keys[-1]
+        d = self.as_of(columns=[date_col])
+        if d.empty:
+            return None
+        d = pd.to_datetime(d[date_col], errors="coerce").max()
+        return None if pd.isna(d) else d.normalize()
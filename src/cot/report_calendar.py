@@ -0,0 +1,181 @@
+# src/cot/report_calendar.py
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+### The CFTC weekly report calendar, and calendar-true changes / windows.
+###
+### Row offsets (diff(4), rolling(260)) only mean "4 weeks" / "5 years" when a
+### contract reported every single week. Holiday shifts, delisting gaps and late
+### listings break that silently. Here every contract is laid out on the
+### canonical calendar (one slot per report Tuesday; holiday Monday/Wednesday
+### reports snap to their week's Tuesday) from its first to its last report:
+###
+###   grid slot  = start[contract] + (week - first_week[contract])
+###
+### which is one vectorized scatter, no per-contract reindex. Contracts are
+### contiguous on the grid, so a k-week change is v[t] - v[t-k] where both slots
+### belong to the same contract, and a w-week window is the last w slots; gap
+### weeks are NaN and simply not counted. `coverage` = reported weeks / w.
+
+_EPOCH = pd.Timestamp("1970-01-06")  # a Tuesday
+
+
+def week_anchor(dates: pd.Series) -> pd.Series:
+    """
+    Report Tuesday of each date's week: holiday weeks report on Monday or
+    Wednesday, which snap to that week's Tuesday.
+    """
+    shift = (dates.dt.dayofweek - 1 + 3) % 7 - 3
+    return (dates - pd.to_timedelta(shift, unit="D")).dt.normalize()
+
+
+def week_number(dates: pd.Series) -> np.ndarray:
+    """
+    Report-calendar week of each date (integer, consecutive report weeks differ by 1).
+    """
+    anchor = week_anchor(pd.to_datetime(dates))
+    return ((anchor - _EPOCH).dt.days // 7).to_numpy(dtype=np.int64)
+
+
+def week_date(week: np.ndarray) -> pd.DatetimeIndex:
+    return _EPOCH + pd.to_timedelta(np.asarray(week, dtype=np.int64) * 7, unit="D")
+
+
+@dataclass
+class CalendarGrid:
+    """
+    Dense per-contract calendar. `pos[i]` is the grid slot of input row i,
+    `contract[s]` / `week[s]` the contract id and calendar week of slot s.
+    """
+    pos: np.ndarray
+    contract: np.ndarray
+    week: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return len(self.contract)
+
+    def scatter(self, values: np.ndarray) -> np.ndarray:
+        """
+        Input-row values -> grid (NaN in gap weeks). Rows sharing a report week
+        resolve to the last one, as drop_duplicates(keep="last") would.
+        """
+        grid = np.full(self.size, np.nan)
+        last = np.ones(len(self.pos), dtype=bool)
+        order = np.argsort(self.pos, kind="stable")
+        p = self.pos[order]
+        last[order[:-1]] = p[:-1] != p[1:]
+        grid[self.pos[last]] = np.asarray(values, dtype=float)[last]
+        return grid
+
+    def gather(self, grid: np.ndarray) -> np.ndarray:
+        return grid[self.pos]
+
+
+def calendar_grid(df: pd.DataFrame, keys: Sequence[str], date_col: str = "date") -> CalendarGrid:
+    code = df.groupby(list(keys), sort=True, dropna=False).ngroup().to_numpy()
+    wk = week_number(df[date_col])
+    n = int(code.max()) + 1 if len(code) else 0
+
+    first = np.full(n, np.iinfo(np.int64).max)
+    last = np.full(n, np.iinfo(np.int64).min)
+    np.minimum.at(first, code, wk)
+    np.maximum.at(last, code, wk)
+    length = last - first + 1
+    start = np.concatenate([[0], np.cumsum(length)[:-1]])
+
+    contract = np.repeat(np.arange(n), length)
+    week = np.arange(int(length.sum())) - np.repeat(start, length) + np.repeat(first, length)
+    return CalendarGrid(pos=start[code] + wk - first[code], contract=contract, week=week)
+
+
+def calendar_diff(grid: np.ndarray, contract: np.ndarray, k: int) -> np.ndarray:
+    """
+    v[t] - v[t - k weeks]; NaN when either week is missing or before the listing.
+    """
+    out = np.full(len(grid), np.nan)
+    if k < len(grid):
+        same = contract[k:] == contract[:-k]
+        out[k:] = np.where(same, grid[k:] - grid[:-k], np.nan)
+    return out
+
+
+def calendar_coverage(grid_present: np.ndarray, contract: np.ndarray, w: int) -> np.ndarray:
+    """
+    Share of the trailing w calendar weeks with a report (weeks before the
+    listing count as missing).
+    """
+    cs = np.concatenate([[0.0], np.cumsum(grid_present, dtype=float)])
+    s = np.arange(len(grid_present))
+    start = np.flatnonzero(np.r_[True, contract[1:] != contract[:-1]])
+    lo = np.maximum(s - w + 1, np.repeat(start, np.diff(np.r_[start, len(s)])))
+    return (cs[s + 1] - cs[lo]) / w
+
+
+def _windows(grid: np.ndarray, contract: np.ndarray, w: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (view, row): view[row[s]] is the trailing w calendar weeks ending at slot s.
+    Each contract is padded with w-1 leading NaNs, so windows never reach into
+    the previous contract.
+    """
+    new = np.r_[True, contract[1:] != contract[:-1]]
+    padded = np.insert(grid, np.repeat(np.flatnonzero(new), w - 1), np.nan)
+    # slot s lands at s + (w-1) * (1-based ordinal of its contract) in `padded`
+    end = np.arange(len(grid)) + (w - 1) * np.cumsum(new)
+    return np.lib.stride_tricks.sliding_window_view(padded, w), end - (w - 1)
+
+
+def calendar_window_scores(
+    grid: np.ndarray,
+    contract: np.ndarray,
+    w: int,
+    min_coverage: float,
+    chunk: int = 1 << 21,
+) -> dict[str, np.ndarray]:
+    """
+    Over the trailing w calendar weeks: pctile (0-100, average rank of the
+    current value, as the row path's rank(pct=True)), minmax (0-100) and z
+    (ddof=1) of each slot's value. Scores need ceil(w * min_coverage) non-NaN
+    values in the window and a value this week.
+    """
+    n = len(grid)
+    out = {k: np.full(n, np.nan) for k in ("pctile", "minmax", "z")}
+    if n == 0:
+        return out
+    view, row = _windows(grid, contract, w)
+    need = max(int(math.ceil(w * min_coverage)), 2)
+    step = max(chunk // w, 1)
+
+    for a in range(0, n, step):
+        win = view[row[a:a + step]]
+        x = grid[a:a + step]
+        ok = ~np.isnan(win)
+        cnt = ok.sum(axis=1)
+
+        valid = (cnt >= need) & ~np.isnan(x)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            less = (win < x[:, None]).sum(axis=1)
+            eq = (win == x[:, None]).sum(axis=1)
+            pct = (less + (eq + 1) / 2.0) / cnt * 100.0
+
+            mn = np.where(ok, win, np.inf).min(axis=1)
+            mx = np.where(ok, win, -np.inf).max(axis=1)
+            rng = mx - mn
+            mm = np.where(rng != 0, (x - mn) / rng * 100.0, np.nan)
+
+            w0 = np.where(ok, win, 0.0)
+            mean = w0.sum(axis=1) / cnt
+            var = (np.where(ok, win - mean[:, None], 0.0) ** 2).sum(axis=1) / (cnt - 1)
+            sd = np.sqrt(var)
+            z = np.where(sd != 0, (x - mean) / sd, np.nan)
+
+        out["pctile"][a:a + step] = np.where(valid, pct, np.nan)
+        out["minmax"][a:a + step] = np.where(valid, mm, np.nan)
+        out["z"][a:a + step] = np.where(valid, z, np.nan)
+    return out
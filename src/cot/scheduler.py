@@ -0,0 +1,470 @@
+# src/cot/scheduler.py
+from __future__ import annotations
+
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+import pytz
+import requests
+
+from src.cot.config import BASE_DIS, BASE_TFF
+from src.cot.fetch import download_dis_by_codes, download_tff_by_codes, load_raw, save_raw
+from src.cot.metrics_cache import MetricsCache
+from src.cot.pipeline import publish_metrics
+from src.cot.publish import PROCESSED_DIR
+from src.cot.raw_store import HASH_COL, RAW_HISTORY_DIR, RawStore
+from src.cot.tff_groups import TFF_GROUPS
+from src.cot.transform import (
+    combine_tidy,
+    required_raw_columns,
+    standardize_dis_managed_money,
+    standardize_tff_group,
+)
+
+### Release-aware refresh scheduler.
+### CFTC publishes CoT data (positions as of Tuesday) on Friday at 15:30 US/Eastern,
+### shifted to the next business day around federal holidays. The scheduler:
+###   - sleeps until shortly before the next scheduled release,
+###   - polls a cheap max(report_date) probe per dataset (with If-None-Match),
+###   - on a new report date fetches only recent rows (REVISION_LOOKBACK_WEEKS
+###     before what is on disk, to catch CFTC revisions), keeps the rows whose
+###     content changed in the bitemporal raw store (raw_store.py), transforms
+###     just those rows, recomputes metrics and publishes a release,
+###   - logs "scheduled publication -> dashboard release" latency per refresh.
+### A dataset with no raw data yet is bootstrapped by one full fetch of the
+### contracts in its tidy file (or the combined tidy panel); one with neither
+### is dropped with a warning. A failing dataset is logged and skipped for
+### that poll, the others still refresh.
+### Endpoints and the clock are injectable so it can be driven against a local
+### stand-in Socrata server with a SimulatedClock.
+
+EASTERN = pytz.timezone("America/New_York")
+RELEASE_WEEKDAY = 4          # Friday
+RELEASE_TIME = (15, 30)      # 3:30pm ET
+DATE_COL = "report_date_as_yyyy_mm_dd"
+
+STATE_DIR = "data/state"
+REFRESH_LOG = os.path.join(STATE_DIR, "refresh_log.jsonl")
+COMBINED_TIDY_PATH = "data/processed/cot_tidy.parquet"
+# re-fetch this far behind the newest stored report so revisions get recorded
+REVISION_LOOKBACK_WEEKS = 4
+
+DATASETS: Dict[str, Dict[str, Any]] = {
+    "TFF": {
+        "base_url": BASE_TFF,
+        "raw_path": "data/raw/tff_raw.parquet",
+        "history": "tff",
+        # every trader category: tff_groups.py reads dealer / asset manager too
+        "columns": required_raw_columns("TFF", groups=TFF_GROUPS),
+        "tidy_path": "data/processed/tff_levmoney_tidy.parquet",
+        "download": download_tff_by_codes,
+        "standardize": lambda raw: standardize_tff_group(raw, group="lev_money"),
+    },
+    "DIS": {
+        "base_url": BASE_DIS,
+        "raw_path": "data/raw/dis_universe_raw.parquet",
+        "history": "dis",
+        "columns": required_raw_columns("DIS"),
+        "tidy_path": "data/processed/dis_managed_money_tidy.parquet",
+        "download": download_dis_by_codes,
+        "standardize": standardize_dis_managed_money,
+    },
+}
+
+
+# Clocks
+
+
+class SystemClock:
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(max(0.0, seconds))
+
+
+class SimulatedClock:
+    """
+    Deterministic clock for tests / dry runs: sleep() just advances time.
+    """
+
+    def __init__(self, start: datetime):
+        self._now = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+        self.slept: float = 0.0
+
+    def now(self) -> datetime:
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        seconds = max(0.0, seconds)
+        self._now += timedelta(seconds=seconds)
+        self.slept += seconds
+
+
+# Release calendar
+
+
+def scheduled_release(report_date) -> datetime:
+    """
+    Scheduled publication (UTC) for a report date: the following Friday, 15:30 ET.
+    Holiday shifts are absorbed by the polling window rather than a holiday table.
+    """
+    d = pd.Timestamp(report_date).date()
+    days = (RELEASE_WEEKDAY - d.weekday()) % 7 or 7
+    local = EASTERN.localize(datetime(d.year, d.month, d.day, *RELEASE_TIME) + timedelta(days=days))
+    return local.astimezone(timezone.utc)
+
+
+def latest_release_on_or_before(now: datetime) -> datetime:
+    """
+    Most recent scheduled Friday release at or before `now` (UTC).
+    """
+    local = now.astimezone(EASTERN)
+    days_back = (local.weekday() - RELEASE_WEEKDAY) % 7
+    cand = EASTERN.localize(
+        datetime(local.year, local.month, local.day, *RELEASE_TIME) - timedelta(days=days_back)
+    )
+    if cand > local:
+        cand = EASTERN.localize(cand.replace(tzinfo=None) - timedelta(days=7))
+    return cand.astimezone(timezone.utc)
+
+
+def report_date_for_release(release: datetime) -> pd.Timestamp:
+    """
+    Tuesday "as of" date covered by a Friday release.
+    """
+    return pd.Timestamp(release.astimezone(EASTERN).date()) - pd.Timedelta(days=3)
+
+
+# Probing
+
+
+class ReportProbe:
+    """
+    Cheap "has a new report landed?" check for one Socrata dataset.
+    Asks only for max(report date) and sends If-None-Match, so an unchanged
+    dataset costs a 304 with no body.
+    """
+
+    def __init__(self, base_url: str, timeout: int = 30):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.etag: Optional[str] = None
+        self.last: Optional[pd.Timestamp] = None
+        self.requests = 0
+
+    def poll(self) -> Optional[pd.Timestamp]:
+        headers = {}
+        token = os.getenv("SODA_APP_TOKEN")
+        if token:
+            headers["X-App-Token"] = token
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+
+        params = {"$select": f"max({DATE_COL}) AS max_date"}
+        r = requests.get(self.base_url, params=params, headers=headers, timeout=self.timeout)
+        self.requests += 1
+        if r.status_code == 304:
+            return self.last
+        r.raise_for_status()
+
+        self.etag = r.headers.get("ETag", self.etag)
+        rows = r.json()
+        if rows and rows[0].get("max_date"):
+            self.last = pd.Timestamp(rows[0]["max_date"]).normalize()
+        return self.last
+
+
+# Incremental refresh
+
+
+def _max_report_date(raw: pd.DataFrame) -> Optional[pd.Timestamp]:
+    if raw.empty or DATE_COL not in raw.columns:
+        return None
+    d = pd.to_datetime(raw[DATE_COL], errors="coerce").max()
+    return None if pd.isna(d) else d.normalize()
+
+
+def raw_store(spec: Dict[str, Any]) -> Optional[RawStore]:
+    """
+    The dataset's bitemporal raw store, seeded from the flat raw parquet (as
+    known at its mtime) the first time. None for specs without "history".
+    """
+    if not spec.get("history"):
+        return None
+    store = RawStore(spec["history"], root=spec.get("history_root", RAW_HISTORY_DIR))
+    if store.empty and os.path.exists(spec["raw_path"]):
+        mtime = pd.Timestamp(os.path.getmtime(spec["raw_path"]), unit="s", tz="UTC")
+        store.ingest(load_raw(spec["raw_path"]), known_at=mtime)
+    return store
+
+
+def _known_report_date(spec: Dict[str, Any]) -> Optional[pd.Timestamp]:
+    store = raw_store(spec)
+    if store is not None:
+        return store.max_report_date()
+    return _max_report_date(load_raw(spec["raw_path"])) if os.path.exists(spec["raw_path"]) else None
+
+
+def seed_codes(name: str, spec: Dict[str, Any], combined_tidy_path: str = COMBINED_TIDY_PATH) -> list[str]:
+    """
+    Contract codes to bootstrap a dataset with no raw data: its tidy file,
+    else its rows of the combined tidy panel. Empty when neither exists.
+    """
+    if os.path.exists(spec["tidy_path"]):
+        codes = pd.read_parquet(spec["tidy_path"], columns=["cftc_code"])["cftc_code"]
+    elif os.path.exists(combined_tidy_path):
+        tidy = pd.read_parquet(combined_tidy_path, columns=["dataset", "cftc_code"])
+        codes = tidy.loc[tidy["dataset"] == name, "cftc_code"]
+    else:
+        return []
+    return sorted(codes.dropna().astype(str).unique())
+
+
+def refresh_dataset(
+    name: str,
+    spec: Dict[str, Any],
+    since: Optional[pd.Timestamp],
+    combined_tidy_path: str = COMBINED_TIDY_PATH,
+) -> Optional[pd.DataFrame]:
+    """
+    Fetch rows newer than `since` for the codes already on disk, record them
+    and return their new tidy rows (None if nothing new).
+
+    With a raw store, the fetch reaches REVISION_LOOKBACK_WEEKS further back
+    and only rows whose content changed are transformed, then appended once
+    the tidy file is written (a failed transform or write leaves them unstored,
+    so the next poll picks them up again); otherwise the flat raw parquet is
+    rewritten with the new rows merged in, also after the tidy write.
+    With no raw data yet, the full history of seed_codes() is fetched.
+
+    The select is the stored columns plus spec["columns"]; when stored data
+    lacks some of those (e.g. a leveraged-funds-only TFF pull), the whole
+    history is re-fetched so older report dates get them too.
+    """
+    store = raw_store(spec)
+    if store is not None and not store.empty:
+        codes_col = store.as_of(columns=["cftc_contract_market_code"])["cftc_contract_market_code"]
+        columns = store.columns
+        if since is not None:
+            since = since - pd.Timedelta(weeks=REVISION_LOOKBACK_WEEKS)
+    elif store is None and os.path.exists(spec["raw_path"]):
+        raw = load_raw(spec["raw_path"])
+        codes_col = raw["cftc_contract_market_code"]
+        columns = list(raw.columns)
+    else:
+        raw = None
+        codes_col = pd.Series(seed_codes(name, spec, combined_tidy_path), dtype=object)
+        columns, since = [], None
+    codes = sorted(codes_col.dropna().astype(str).unique())
+    if not codes:
+        raise ValueError(f"[{name}] no contract codes to fetch (no raw data and no tidy file)")
+    # keep the raw schema stable (never drop a stored column) and add what the
+    # pipeline needs; missing required columns -> full re-fetch to backfill them
+    stored = [c for c in columns if not c.startswith("__")]
+    required = list(spec.get("columns", []))
+    missing = [c for c in required if c not in stored]
+    if stored and missing:
+        print(f"[{name}] stored raw lacks {len(missing)} required columns; re-fetching full history")
+        since = None
+    select = ",".join(dict.fromkeys(stored + required)) or None
+
+    new_raw = spec["download"](
+        codes=codes,
+        select=select,
+        since=None if since is None else since.strftime("%Y-%m-%d"),
+        base_url=spec["base_url"],
+    )
+    if new_raw is None or new_raw.empty:
+        return None
+
+    if store is not None:
+        # new report dates + revised rows; unchanged re-fetched rows are dropped
+        changed = store.changes(new_raw)
+        if changed.empty:
+            return None
+        new_raw = changed.drop(columns=[HASH_COL])
+
+    # only the new rows go through the transform
+    new_tidy = spec["standardize"](new_raw)
+    tidy = pd.read_parquet(spec["tidy_path"]) if os.path.exists(spec["tidy_path"]) else new_tidy.iloc[0:0]
+    tidy = (
+        pd.concat([tidy, new_tidy], ignore_index=True)
+        .sort_values(["cftc_code", "date"])
+        .drop_duplicates(["cftc_code", "date"], keep="last")
+        .reset_index(drop=True)
+    )
+    tidy.to_parquet(spec["tidy_path"], index=False)
+
+    # raw rows count as stored only now that their tidy rows are on disk
+    if store is not None:
+        store.commit(changed)
+    else:
+        merged = new_raw if raw is None else pd.concat([raw, new_raw], ignore_index=True)
+        merged = merged.drop_duplicates(["cftc_contract_market_code", DATE_COL], keep="last")
+        save_raw(merged, spec["raw_path"])
+    print(f"[{name}] +{len(new_tidy)} tidy rows after {'the start' if since is None else since.date()}")
+    return new_tidy
+
+
+class RefreshScheduler:
+
+    def __init__(
+        self,
+        datasets: Optional[Dict[str, Dict[str, Any]]] = None,
+        clock=None,
+        poll_seconds: float = 60,
+        slow_poll_seconds: float = 1800,
+        lead_minutes: float = 5,
+        fast_window_hours: float = 6,
+        processed_root: str = PROCESSED_DIR,
+        combined_tidy_path: str = COMBINED_TIDY_PATH,
+        log_path: str = REFRESH_LOG,
+        on_publish: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.datasets = dict(datasets or DATASETS)
+        self.clock = clock or SystemClock()
+        self.poll_seconds = poll_seconds
+        self.slow_poll_seconds = slow_poll_seconds
+        self.lead = timedelta(minutes=lead_minutes)
+        self.fast_window = timedelta(hours=fast_window_hours)
+        self.processed_root = processed_root
+        self.combined_tidy_path = combined_tidy_path
+        self.log_path = log_path
+        self.on_publish = on_publish
+
+        self.known: Dict[str, Optional[pd.Timestamp]] = {}
+        for name, spec in list(self.datasets.items()):
+            self.known[name] = _known_report_date(spec)
+            # no raw data and nothing to bootstrap from: it would never catch up
+            if self.known[name] is None and not seed_codes(name, spec, combined_tidy_path):
+                print(f"[scheduler] {name}: no raw data and no tidy file to bootstrap from; not scheduled")
+                del self.datasets[name], self.known[name]
+        self.probes = {k: ReportProbe(v["base_url"]) for k, v in self.datasets.items()}
+        # refreshed on disk but not published yet: `known` only moves once a
+        # release is out, so a failed publish is retried on the next poll
+        self.pending: Dict[str, pd.Timestamp] = {}
+        self._detected_at: Optional[datetime] = None
+
+    def caught_up(self, report_date: pd.Timestamp) -> bool:
+        # holiday weeks can shift the as-of date by a day, so allow a small slack
+        return all(k is not None and k >= report_date - pd.Timedelta(days=2) for k in self.known.values())
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """
+        Poll every dataset once; if any has a newer report, refresh and publish
+        (also publishes refreshes whose earlier publish failed). Returns the
+        refresh record (also appended to the log) or None.
+        """
+        detected_at = self.clock.now()
+
+        for name, probe in self.probes.items():
+            try:
+                remote = probe.poll()
+                # already on disk up to `pending`; known is None: no raw data yet -> full bootstrap fetch
+                on_disk = self.pending.get(name, self.known.get(name))
+                if remote is None or (on_disk is not None and remote <= on_disk):
+                    continue
+                new_rows = refresh_dataset(name, self.datasets[name], on_disk, self.combined_tidy_path)
+            except Exception as e:
+                # one dataset failing (network, schema, disk) must not stall the others
+                print(f"[scheduler] {name}: refresh failed: {type(e).__name__}: {e}")
+                continue
+            if new_rows is not None:
+                self.pending[name] = remote
+                self._detected_at = self._detected_at or detected_at
+
+        if not self.pending:
+            return None
+        updated = dict(self.pending)
+        detected_at = self._detected_at or detected_at
+
+        tidy_paths = {k: v["tidy_path"] for k, v in self.datasets.items() if os.path.exists(v["tidy_path"])}
+        combined = combine_tidy(
+            pd.read_parquet(tidy_paths["TFF"]) if "TFF" in tidy_paths else pd.DataFrame(),
+            pd.read_parquet(tidy_paths["DIS"]) if "DIS" in tidy_paths else pd.DataFrame(),
+        )
+        combined.to_parquet(self.combined_tidy_path, index=False)
+
+        report_date = max(updated.values())
+        release_at = scheduled_release(report_date)
+        manifest, _ = publish_metrics(
+            combined,
+            root=self.processed_root,
+            extra={"report_date": str(report_date.date()), "trigger": "scheduler"},
+            cache=MetricsCache(),
+        )
+        published_at = self.clock.now()
+        self.known.update(updated)
+        self.pending.clear()
+        self._detected_at = None
+
+        record = {
+            "report_date": str(report_date.date()),
+            "datasets": sorted(updated),
+            "scheduled_release": release_at.isoformat(),
+            "detected_at": detected_at.isoformat(),
+            "published_at": published_at.isoformat(),
+            "version": manifest["version"],
+            # end-to-end: CFTC scheduled publication -> new release visible to the dashboard
+            "publication_to_dashboard_s": (published_at - release_at).total_seconds(),
+            "detect_to_publish_s": (published_at - detected_at).total_seconds(),
+        }
+        self._log(record)
+        if self.on_publish:
+            self.on_publish(record)
+        return record
+
+    def _log(self, record: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def next_wakeup(self) -> float:
+        """
+        Seconds to sleep before the next action.
+        """
+        now = self.clock.now()
+        release = latest_release_on_or_before(now + self.lead)
+
+        if self.caught_up(report_date_for_release(release)):
+            nxt = release + timedelta(days=7) - self.lead
+            return max((nxt - now).total_seconds(), 0.0)
+
+        # data due but not seen yet: poll hard right after release, then back off
+        if now - release <= self.fast_window:
+            return self.poll_seconds
+        return self.slow_poll_seconds
+
+    def run_forever(self, max_cycles: Optional[int] = None) -> None:
+        cycles = 0
+        while max_cycles is None or cycles < max_cycles:
+            cycles += 1
+            release = latest_release_on_or_before(self.clock.now() + self.lead)
+            if not self.caught_up(report_date_for_release(release)):
+                try:
+                    rec = self.run_once()
+                except Exception as e:
+                    # per-dataset failures are handled in run_once; this is the publish
+                    # step, and the refreshed datasets stay pending so the next poll retries it
+                    print(f"[scheduler] publish failed: {type(e).__name__}: {e}")
+                    rec = None
+                if rec:
+                    print(f"[scheduler] published {rec['version']} for {rec['report_date']} "
+                          f"({rec['publication_to_dashboard_s']:.0f}s after scheduled release)")
+            self.clock.sleep(self.next_wakeup())
+
+
+def latency_summary(log_path: str = REFRESH_LOG) -> pd.DataFrame:
+    """
+    Publication -> dashboard latency quantiles over all logged refreshes.
+    """
+    if not os.path.exists(log_path):
+        return pd.DataFrame()
+    log = pd.read_json(log_path, lines=True)
+    s = log["publication_to_dashboard_s"]
+    return s.describe(percentiles=[0.5, 0.9, 0.95]).to_frame("publication_to_dashboard_s")
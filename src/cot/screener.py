@@ -0,0 +1,207 @@
+# src/cot/screener.py
+from __future__ import annotations
+
+import os
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from src.cot.publish import read_manifest, release_path
+
+### Precomputed screener cube.
+### The screener / scatter only ever show the latest snapshot for one
+### (asset_class, expression, score type, lookback, change horizon, basis) selection.
+### There are only a few hundred such selections, so the pipeline materializes
+### every one of them up front, already sorted for both sort modes and with
+### flags attached. The dashboard keeps the cube in memory as a dict and a
+### widget change becomes a single dict lookup.
+
+EXPRESSIONS = ["net", "pct_oi_net"]
+SCORE_TYPES = ["percentile", "z", "minmax", "ewma_z", "ew_percentile",
+               "seasonal_percentile", "seasonal_z"]
+# window lookbacks for the rolling/expanding scores, half-lives for the EW family,
+# prior years for the seasonal (same weeks of the year) scores
+SEASONAL_SCORE_TYPES = ("seasonal_percentile", "seasonal_z")
+LOOKBACKS_BY_SCORE_TYPE = {
+    "percentile": ["3y", "5y", "max"],
+    "z": ["3y", "5y", "max"],
+    "minmax": ["3y", "5y", "max"],
+    "ewma_z": ["hl1y", "hl3y"],
+    "ew_percentile": ["hl1y", "hl3y"],
+    "seasonal_percentile": ["5y"],
+    "seasonal_z": ["5y"],
+}
+LOOKBACKS = ["3y", "5y", "max", "hl1y", "hl3y"]
+LOOKBACK_LABELS = {"hl1y": "half-life 1y", "hl3y": "half-life 3y"}
+HORIZONS = ["1w", "4w", "13w"]
+SORT_MODES = ["Most extreme", "Biggest change"]
+# "own" = vs the contract's own history, "peer" = vs asset-class peers on the same date
+BASES = ["own", "peer"]
+BASIS_LABELS = {"own": "Own history", "peer": "Vs asset-class peers"}
+
+CUBE_FILE = "cot_screener_cube.parquet"
+
+CUBE_KEYS = ["asset_class", "expression", "score_type", "lookback", "horizon", "basis"]
+CUBE_VALUE_COLS = [
+    "market", "market_short", "contract_name", "cftc_code", "date",
+    "net", "pct_oi_net", "score", "chg", "flag",
+]
+
+
+def score_column(expression: str, score_type: str, lookback: str, basis: str = "own") -> str:
+    """
+    Map UI selections to the metrics column name, e.g. ("net", "z", "5y") -> "net_z_5y".
+    basis="peer" ranks that time-series score across asset-class peers on the same
+    date (peers.py): percentile/minmax/ew_percentile -> "<col>_peer_pctile",
+    z/ewma_z -> "<col>_peer_z" (seasonal scores have no peer variant),
+    so the usual 90/10 and +/-2 flag thresholds still apply.
+    """
+    suffix = {"percentile": "pctile", "z": "z", "minmax": "minmax",
+              "ewma_z": "ewz", "ew_percentile": "ewpctile",
+              "seasonal_percentile": "seaspctile", "seasonal_z": "seasz"}[score_type]
+    col = f"{expression}_{suffix}_{lookback}"
+    if basis == "peer":
+        col += "_peer_z" if score_type in ("z", "ewma_z") else "_peer_pctile"
+    return col
+
+
+def change_column(expression: str, horizon: str) -> str:
+    return f"{expression}_chg_{horizon}"
+
+
+def short_market_name(s: str) -> str:
+    return s.split(" - ")[0].strip()
+
+
+# (extreme long at or above, extreme short at or below) per score type
+EXTREME_THRESHOLDS = {
+    "percentile": (90.0, 10.0),
+    "minmax": (90.0, 10.0),
+    "z": (2.0, -2.0),
+    "ewma_z": (2.0, -2.0),
+    "ew_percentile": (90.0, 10.0),
+    "seasonal_percentile": (90.0, 10.0),
+    "seasonal_z": (2.0, -2.0),
+}
+
+
+def extreme_direction(score, score_type: str) -> np.ndarray:
+    """
+    +1 extreme long, -1 extreme short, 0 otherwise (NaN -> 0).
+    percentile-type scores are on a 0-100 scale (>= 90 / <= 10),
+    z-scores (rolling, EWMA or seasonal) use +/- 2 standard deviations.
+    """
+    s = pd.to_numeric(pd.Series(score), errors="coerce").to_numpy(dtype=float)
+    hi, lo = EXTREME_THRESHOLDS[score_type]
+    return np.where(s >= hi, 1, np.where(s <= lo, -1, 0)).astype(np.int8)
+
+
+def extreme_flags(score: pd.Series, score_type: str) -> pd.Series:
+    """
+    Vectorized extreme-positioning flag label (see extreme_direction).
+    """
+    d = extreme_direction(score, score_type)
+    return pd.Series(np.select([d == 1, d == -1], ["Extreme long", "Extreme short"], default=""), index=score.index)
+
+
+def build_screener_cube(latest: pd.DataFrame) -> pd.DataFrame:
+    """
+    Long-format cube: one row per (selection, market) with `rank_extreme`
+    (score desc) and `rank_change` (|chg| desc) already assigned. NaNs rank last.
+    """
+    base = latest.copy()
+    base["market_short"] = base["market"].astype(str).map(short_market_name)
+    if "contract_name" not in base.columns:
+        base["contract_name"] = np.nan
+
+    frames = []
+    for expr, stype, lb, hz, basis in product(EXPRESSIONS, SCORE_TYPES, LOOKBACKS, HORIZONS, BASES):
+        s_col = score_column(expr, stype, lb, basis)
+        c_col = change_column(expr, hz)
+        if s_col not in base.columns or c_col not in base.columns:
+            continue
+
+        part = base[["asset_class", "market", "market_short", "contract_name",
+                     "cftc_code", "date", "net", "pct_oi_net"]].copy()
+        part["score"] = pd.to_numeric(base[s_col], errors="coerce")
+        if stype in SEASONAL_SCORE_TYPES:
+            # only the seasonal (DIS commodity) contracts carry these
+            keep = part["score"].notna().to_numpy()
+            part, c_vals = part[keep], base.loc[keep, c_col]
+        else:
+            c_vals = base[c_col]
+        part["chg"] = pd.to_numeric(c_vals, errors="coerce")
+        part["flag"] = extreme_flags(part["score"], stype)
+        part["expression"] = expr
+        part["score_type"] = stype
+        part["lookback"] = lb
+        part["horizon"] = hz
+        part["basis"] = basis
+        frames.append(part)
+
+    if not frames:
+        return pd.DataFrame(columns=CUBE_KEYS + CUBE_VALUE_COLS + ["rank_extreme", "rank_change"])
+
+    cube = pd.concat(frames, ignore_index=True)
+
+    # one sort per sort mode over the whole cube, ranks assigned with cumcount
+    cube = cube.sort_values(CUBE_KEYS + ["score"], ascending=[True] * len(CUBE_KEYS) + [False], na_position="last")
+    cube["rank_extreme"] = cube.groupby(CUBE_KEYS, sort=False).cumcount() + 1
+
+    cube["_abs_chg"] = cube["chg"].abs()
+    cube = cube.sort_values(CUBE_KEYS + ["_abs_chg"], ascending=[True] * len(CUBE_KEYS) + [False], na_position="last")
+    cube["rank_change"] = cube.groupby(CUBE_KEYS, sort=False).cumcount() + 1
+
+    cube = cube.drop(columns="_abs_chg")
+    for c in CUBE_KEYS:
+        cube[c] = cube[c].astype("category")
+
+    return cube[CUBE_KEYS + CUBE_VALUE_COLS + ["rank_extreme", "rank_change"]].reset_index(drop=True)
+
+
+def index_screener_cube(cube: pd.DataFrame) -> dict[tuple, pd.DataFrame]:
+    """
+    Turn the long cube into
+    {(asset_class, expression, score_type, lookback, horizon, basis, sort_mode): frame}.
+    Each frame is already in display order with a 1-based `rank` column.
+    """
+    out: dict[tuple, pd.DataFrame] = {}
+    for key, part in cube.groupby(CUBE_KEYS, observed=True, sort=False):
+        for mode, rank_col in zip(SORT_MODES, ["rank_extreme", "rank_change"]):
+            view = part.sort_values(rank_col)[CUBE_VALUE_COLS].reset_index(drop=True)
+            view.insert(0, "rank", np.arange(1, len(view) + 1))
+            out[tuple(str(k) for k in key) + (mode,)] = view
+    return out
+
+
+def lookup(
+    cube_index: dict[tuple, pd.DataFrame],
+    asset_class: str,
+    expression: str,
+    score_type: str,
+    lookback: str,
+    horizon: str,
+    sort_mode: str = "Most extreme",
+    basis: str = "own",
+) -> pd.DataFrame:
+    """
+    O(1) screener lookup. Returns an empty frame for selections the cube does not hold.
+    """
+    key = (asset_class, expression, score_type, lookback, horizon, basis, sort_mode)
+    return cube_index.get(key, pd.DataFrame(columns=["rank"] + CUBE_VALUE_COLS))
+
+
+def load_cube_index(manifest: dict | None = None) -> dict[tuple, pd.DataFrame]:
+    """
+    Load the published cube for the current release and index it.
+    Releases that predate the cube get one built from their snapshot instead.
+    """
+    if manifest is None:
+        manifest = read_manifest()
+    path = release_path(CUBE_FILE, manifest=manifest)
+    if os.path.exists(path):
+        cube = pd.read_parquet(path)
+    else:
+        cube = build_screener_cube(pd.read_parquet(release_path("cot_latest_snapshot.parquet", manifest=manifest)))
+    return index_screener_cube(cube)
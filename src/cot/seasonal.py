@@ -0,0 +1,123 @@
+# src/cot/seasonal.py
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.cot.instrument import span
+
+### Seasonal scores for commodity positioning.
+### Managed money in grains / softs / energy follows the crop and driving
+### seasons, so a plain 5y percentile mixes planting and harvest weeks. Here
+### each report is compared with the same part of the year in prior years:
+###
+###   sample(year y, ISO week w) = values in weeks w-h .. w+h of years y-N .. y-1
+###
+### Each contract is reshaped into a (ISO year x 53 weeks) grid, flattened so
+### that week arithmetic crosses year ends naturally; the sample for every row
+### is then one fancy-index gather of N * (2h+1) cells.
+###
+### Columns (tag = f"{N}y"):
+###   {expr}_seaspctile_{tag}   % of the seasonal sample <= current value (0-100)
+###   {expr}_seasz_{tag}        z-score vs the seasonal sample
+###   {expr}_seas_mean_{tag}, {expr}_seas_lo_{tag}, {expr}_seas_hi_{tag}
+###                             seasonal average and p10-p90 band (chart)
+
+SEASONAL_KEYS = ["dataset", "group", "cftc_code"]
+SEASONAL_DATASETS = ("DIS",)
+_WEEKS = 53
+
+
+def _band(sample: np.ndarray, n: np.ndarray, q: tuple[float, float] = (0.10, 0.90)):
+    """
+    Row-wise linear-interpolated quantiles of a NaN-padded sample
+    (np.sort puts the NaNs last, so the first n[i] items of row i are valid).
+    """
+    s = np.sort(sample, axis=1)
+    r = np.arange(len(s))
+    last = np.maximum(n - 1, 0)
+    out = []
+    for p in q:
+        pos = p * last
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, last)
+        w = pos - lo
+        out.append(s[r, lo] * (1.0 - w) + s[r, hi] * w)
+    return out
+
+
+def add_seasonal_scores(
+    dfm: pd.DataFrame,
+    compute_for: Optional[list[str]] = None,
+    years: int = 5,
+    half_window: int = 2,
+    min_obs: int = 10,
+    datasets: tuple[str, ...] = SEASONAL_DATASETS,
+) -> pd.DataFrame:
+    """
+    Add seasonal score and band columns for rows whose dataset is in
+    `datasets` (NaN elsewhere). Rows need fewer than `min_obs` seasonal
+    samples -> NaN. Input order and index are preserved.
+    """
+    compute_for = compute_for or ["net", "pct_oi_net"]
+    tag = f"{years}y"
+    mask = dfm["dataset"].isin(datasets).to_numpy()
+    sub = dfm.loc[mask]
+    n_rows = len(dfm)
+
+    with span("metrics.seasonal", lookback=tag) as sp:
+        new: Dict[str, np.ndarray] = {}
+        if len(sub):
+            iso = pd.to_datetime(sub["date"]).dt.isocalendar()
+            iso_year = iso["year"].to_numpy(dtype=np.int64)
+            week = iso["week"].to_numpy(dtype=np.int64) - 1
+            gid = sub.groupby(SEASONAL_KEYS, sort=False).ngroup().to_numpy()
+            n_groups = int(gid.max()) + 1
+            year_idx = iso_year - iso_year.min()
+            n_cells = (int(year_idx.max()) + 1) * _WEEKS
+            cell = year_idx * _WEEKS + week
+
+            # same weeks +/- half_window in each of the prior `years` years
+            back = np.arange(1, years + 1)[:, None] * _WEEKS
+            shift = np.arange(-half_window, half_window + 1)[None, :]
+            offsets = (shift - back).ravel()
+            idx = cell[:, None] + offsets[None, :]
+            in_range = (idx >= 0) & (idx < n_cells)
+            idx = np.clip(idx, 0, n_cells - 1)
+
+            for expr in compute_for:
+                if expr not in sub.columns:
+                    continue
+                x = pd.to_numeric(sub[expr], errors="coerce").to_numpy(dtype=float)
+                grid = np.full((n_groups, n_cells), np.nan)
+                grid[gid, cell] = x
+                sample = np.where(in_range, grid[gid[:, None], idx], np.nan)
+
+                valid = ~np.isnan(sample)
+                n = valid.sum(axis=1)
+                ok = (n >= min_obs) & ~np.isnan(x)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    pct = np.count_nonzero(sample <= x[:, None], axis=1) / n * 100.0
+                    mean = np.where(valid, sample, 0.0).sum(axis=1) / n
+                    dev = np.where(valid, sample - mean[:, None], 0.0)
+                    std = np.sqrt((dev * dev).sum(axis=1) / n)
+                    z = (x - mean) / np.where(std > 0, std, np.nan)
+                lo, hi = _band(sample, n)
+
+                for name, vals in [
+                    (f"{expr}_seaspctile_{tag}", np.where(ok, pct, np.nan)),
+                    (f"{expr}_seasz_{tag}", np.where(ok, z, np.nan)),
+                    (f"{expr}_seas_mean_{tag}", np.where(ok, mean, np.nan)),
+                    (f"{expr}_seas_lo_{tag}", np.where(ok, lo, np.nan)),
+                    (f"{expr}_seas_hi_{tag}", np.where(ok, hi, np.nan)),
+                ]:
+                    full = np.full(n_rows, np.nan)
+                    full[mask] = vals
+                    new[name] = full
+        sp.set(rows=int(mask.sum()))
+
+    if not new:
+        return dfm
+    return pd.concat([dfm, pd.DataFrame(new, index=dfm.index)], axis=1)
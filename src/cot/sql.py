@@ -0,0 +1,240 @@
+# src/cot/sql.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from src.cot.alerts import ALERTS_FILE
+from src.cot.correlation import CROWDING_FILE
+from src.cot.events import EVENTS_FILE
+from src.cot.instrument import span
+from src.cot.publish import PROCESSED_DIR, manifest_token, read_manifest, release_path
+from src.cot.tff_groups import TFF_GROUPS_FILE
+
+### Read-only SQL over the current release, on embedded DuckDB.
+###
+###   from src.cot.sql import run_sql
+###   run_sql("""
+###       SELECT market, date, pct_oi_net_pctile_5y, pct_oi_net_chg_4w
+###       FROM metrics
+###       WHERE asset_class = 'FX' AND year(date) = 2022
+###         AND pct_oi_net_pctile_5y > 90 AND pct_oi_net_chg_4w < 0
+###   """)
+###
+### Views (one per published parquet): metrics, snapshot, screener_cube,
+### events, alerts, crowding, tff_groups. DuckDB reads the parquet itself, so a query only decodes
+### the columns it names (projection pushdown) and skips row groups whose
+### min/max stats rule out its WHERE clause (filter pushdown; publish_release
+### writes PARQUET_ROW_GROUP_ROWS groups sorted by cftc_code then date, so a
+### filter on cftc_code reads only that contract's groups).
+###
+### Only single SELECT statements run, on a locked-down connection: once the
+### views exist, file access is limited to the release's own directory (no
+### read_csv('/any/file'), read_text, ATTACH or remote URLs), extensions are not
+### auto-installed or auto-loaded, and the configuration is locked so a query
+### cannot turn any of that back on. Results are capped at max_rows
+### (df.attrs["truncated"] says whether more rows matched) and kept in a
+### byte-bounded LRU keyed on (release, sql, max_rows); a new release changes
+### the key, so nothing stale is served.
+###
+### duckdb is optional: everything else runs without it, and this module only
+### imports it when the first query is made.
+
+TABLES = {
+    "metrics": "cot_metrics.parquet",
+    "snapshot": "cot_latest_snapshot.parquet",
+    "screener_cube": "cot_screener_cube.parquet",
+    "events": EVENTS_FILE,
+    "alerts": ALERTS_FILE,
+    "crowding": CROWDING_FILE,
+    "tff_groups": TFF_GROUPS_FILE,
+}
+DEFAULT_MAX_ROWS = 10_000
+CACHE_BYTES = 128 * 1024 * 1024
+
+
+class SQLError(ValueError):
+    pass
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("SQL over the release needs duckdb: pip install duckdb") from None
+    return duckdb
+
+
+class ResultCache:
+    """
+    Thread-safe LRU of query results, bounded by their in-memory size.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[tuple, tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: tuple, df: pd.DataFrame) -> None:
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (df, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+
+
+class ReleaseSQL:
+    """
+    DuckDB views over the current release. The manifest is stat()-ed per query
+    and the views are rebuilt when a new version is published.
+    """
+
+    def __init__(self, root: str = PROCESSED_DIR, cache: Optional[ResultCache] = None):
+        self.root = root
+        self.cache = cache or ResultCache()
+        self._lock = threading.Lock()
+        self._token: Any = object()
+        self._con = None
+        self.version: Optional[str] = None
+        self.tables: Dict[str, str] = {}
+
+    def _connection(self):
+        """
+        (connection, release version) as one consistent pair: a publish between
+        reading the two would otherwise cache one release's result under the
+        other's key.
+        """
+        token = manifest_token(self.root)
+        with self._lock:
+            if token != self._token or self._con is None:
+                duckdb = _duckdb()
+                manifest = read_manifest(self.root)
+                con = duckdb.connect(":memory:")
+                tables = {}
+                for name, fname in TABLES.items():
+                    path = release_path(fname, self.root, manifest)
+                    if os.path.exists(path):
+                        con.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{_quote(path)}')")
+                        tables[name] = path
+                _lock_down(con, tables.values())
+                self._con, self.tables = con, tables
+                self.version = (manifest or {}).get("version", "legacy")
+                self._token = token
+            return self._con, self.version
+
+    def schema(self) -> pd.DataFrame:
+        """
+        (table, column, type) for every view.
+        """
+        con, _ = self._connection()
+        cur = con.cursor()
+        frames = []
+        for name in self.tables:
+            d = cur.execute(f"DESCRIBE {name}").df()[["column_name", "column_type"]]
+            d.insert(0, "table", name)
+            frames.append(d)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["table", "column_name", "column_type"])
+
+    def query(self, sql: str, max_rows: int = DEFAULT_MAX_ROWS) -> pd.DataFrame:
+        """
+        Run one SELECT; returns at most max_rows rows. df.attrs carries
+        truncated / cached / elapsed_s / release.
+        """
+        con, version = self._connection()
+        duckdb = _duckdb()
+        sql = sql.strip().rstrip(";").strip()
+        key = (version, sql, int(max_rows))
+
+        hit = self.cache.get(key)
+        if hit is not None:
+            out = hit.copy(deep=False)
+            out.attrs = {**hit.attrs, "cached": True}
+            return out
+
+        cur = con.cursor()  # one cursor per call: safe across Streamlit session threads
+        try:
+            stmts = cur.extract_statements(sql)
+        except duckdb.Error as e:
+            raise SQLError(str(e)) from None
+        if len(stmts) != 1 or stmts[0].type != duckdb.StatementType.SELECT:
+            raise SQLError("only a single SELECT statement is allowed")
+
+        with span("sql.query", release=version) as sp:
+            t0 = time.perf_counter()
+            try:
+                # one extra row tells us whether the cap cut anything off
+                df = cur.execute(f"SELECT * FROM ({sql}) AS q LIMIT {int(max_rows) + 1}").df()
+            except duckdb.Error as e:
+                raise SQLError(str(e)) from None
+            elapsed = time.perf_counter() - t0
+            sp.set(rows=len(df))
+
+        truncated = len(df) > max_rows
+        df = df.iloc[:max_rows]
+        df.attrs = {"truncated": truncated, "cached": False, "elapsed_s": round(elapsed, 4), "release": version}
+        self.cache.put(key, df)
+        return df
+
+    def explain(self, sql: str) -> str:
+        """
+        DuckDB's physical plan (shows the projected columns and pushed-down filters).
+        """
+        con, _ = self._connection()
+        rows = con.cursor().execute(f"EXPLAIN {sql.strip().rstrip(';')}").fetchall()
+        return "\n".join(r[-1] for r in rows)
+
+
+def _quote(path: str) -> str:
+    return path.replace("'", "''")
+
+
+def _lock_down(con, paths) -> None:
+    """
+    Limit file access to the directories of the view files, stop extension
+    auto-install / auto-load, and lock the configuration.
+    """
+    dirs = sorted({os.path.join(os.path.abspath(os.path.dirname(p)), "") for p in paths})
+    allowed = ", ".join(f"'{_quote(d)}'" for d in dirs)
+    con.execute(f"SET allowed_directories = [{allowed}]")
+    con.execute("SET enable_external_access = false")
+    con.execute("SET autoinstall_known_extensions = false")
+    con.execute("SET autoload_known_extensions = false")
+    con.execute("SET lock_configuration = true")
+
+
+_default: Optional[ReleaseSQL] = None
+
+
+def run_sql(sql: str, max_rows: int = DEFAULT_MAX_ROWS) -> pd.DataFrame:
+    """
+    Query the current release through a process-wide ReleaseSQL.
+    """
+    global _default
+    if _default is None:
+        _default = ReleaseSQL()
+    return _default.query(sql, max_rows=max_rows)
@@ -0,0 +1,314 @@
+# src/cot/static_report.py
+from __future__ import annotations
+
+import hashlib
+import html
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.cot.instrument import span
+from src.cot.screener import extreme_flags, score_column, short_market_name
+
+### Static weekly report: the same picture as the dashboard, as flat files.
+###
+###   <out>/index.html                   asset classes + every market's latest score
+###   <out>/classes/<class>.html         screener table + score-vs-change scatter
+###   <out>/markets/<market>-<code>.html positioning/score chart + driver breakdown
+###
+### Charts are Vega-Lite specs with the data inlined, rendered client-side by
+### vega-embed, so the site needs nothing but a static file server.
+###
+### Each page has an input hash (its data slice + this module's source). Pages
+### whose hash matches <out>/_inputs.json and whose file exists are skipped, the
+### rest are rendered on a process pool. Re-running on an unchanged release
+### renders nothing; a weekly release only rewrites markets that reported.
+
+SITE_DIR = "data/site"
+INPUTS_FILE = "_inputs.json"
+
+# what the static pages show (the dashboard's most-used selection)
+REPORT_EXPRESSION = "pct_oi_net"
+REPORT_SCORE_TYPE = "percentile"
+REPORT_LOOKBACK = "5y"
+REPORT_HORIZON = "1w"
+
+MARKET_COLS = ["date", "net", "pct_oi_net", "long_chg_1w", "short_chg_1w"]
+VEGA_SCRIPTS = (
+    '<script src="https://cdn.jsdelivr.net/npm/vega@5"></script>\n'
+    '<script src="https://cdn.jsdelivr.net/npm/vega-lite@5"></script>\n'
+    '<script src="https://cdn.jsdelivr.net/npm/vega-embed@6"></script>'
+)
+_CSS = (
+    "body{font-family:system-ui,sans-serif;margin:2rem auto;max-width:1100px;padding:0 1rem}"
+    "table{border-collapse:collapse;font-size:.9rem}td,th{padding:.25rem .6rem;border-bottom:1px solid #ddd;"
+    "text-align:right}td:first-child,th:first-child{text-align:left}.chart{width:100%}"
+)
+
+
+def _renderer_fingerprint() -> str:
+    with open(__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def slug(s: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", str(s).lower()).strip("-")
+
+
+def market_page(market: str, cftc_code: str) -> str:
+    # full name: a contract that moved exchange keeps its code under a new name
+    return f"markets/{slug(market)}-{slug(cftc_code)}.html"
+
+
+def class_page(asset_class: str) -> str:
+    return f"classes/{slug(asset_class)}.html"
+
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    out = df.copy()
+    for c in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[c]):
+            out[c] = out[c].dt.strftime("%Y-%m-%d")
+    out = out.astype(object).where(out.notna(), None)
+    return out.to_dict("records")
+
+
+def _hash_frame(df: pd.DataFrame, *extra: Any) -> str:
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    h.update(json.dumps([list(df.columns), *extra], default=str).encode())
+    return h.hexdigest()
+
+
+# Vega-Lite specs
+
+
+def level_score_spec(hist: pd.DataFrame, score_col: str, title: str) -> Dict[str, Any]:
+    """
+    Same layout as the dashboard chart: level (solid, left axis) and score
+    (dotted, right axis).
+    """
+    data = hist[["date", REPORT_EXPRESSION, score_col]].rename(columns={score_col: "score"})
+    data["level"] = data[REPORT_EXPRESSION] * 100 if REPORT_EXPRESSION == "pct_oi_net" else data[REPORT_EXPRESSION]
+    x = {"field": "date", "type": "temporal", "title": "Date"}
+    return {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "title": title,
+        "width": "container",
+        "height": 320,
+        "data": {"values": _records(data[["date", "level", "score"]])},
+        "layer": [
+            {"mark": "line", "encoding": {"x": x, "y": {"field": "level", "type": "quantitative", "title": "% OI Net"}}},
+            {"mark": {"type": "line", "strokeDash": [4, 2]},
+             "encoding": {"x": x, "y": {"field": "score", "type": "quantitative",
+                                        "title": f"{REPORT_SCORE_TYPE} ({REPORT_LOOKBACK})"}}},
+        ],
+        "resolve": {"scale": {"y": "independent"}},
+    }
+
+
+def scatter_spec(view: pd.DataFrame) -> Dict[str, Any]:
+    return {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "width": "container",
+        "height": 360,
+        "data": {"values": _records(view[["market_short", "score", "chg", "flag"]].dropna(subset=["score", "chg"]))},
+        "mark": {"type": "point", "filled": True},
+        "encoding": {
+            "x": {"field": "score", "type": "quantitative", "title": f"{REPORT_SCORE_TYPE} ({REPORT_LOOKBACK})"},
+            "y": {"field": "chg", "type": "quantitative", "title": f"Δ % OI net ({REPORT_HORIZON})"},
+            "color": {"field": "flag", "type": "nominal", "title": "Flag"},
+            "tooltip": [{"field": "market_short"}, {"field": "score", "format": ".1f"}, {"field": "chg", "format": ".4f"}],
+        },
+    }
+
+
+# HTML
+
+
+def _html_page(title: str, body: str, specs: Dict[str, Dict[str, Any]], depth: int) -> str:
+    up = "../" * depth
+    # "</" inside the inlined JSON would end the script element early
+    js = {k: json.dumps(v).replace("</", "<\\/") for k, v in specs.items()}
+    embeds = "\n".join(f"vegaEmbed('#{k}', {v}, {{actions: false}});" for k, v in js.items())
+    return (
+        "<!doctype html>\n<html><head><meta charset='utf-8'>"
+        f"<title>{html.escape(title)}</title><style>{_CSS}</style>\n{VEGA_SCRIPTS if specs else ''}</head>\n"
+        f"<body><p><a href='{up}index.html'>CFTC CoT weekly report</a></p>\n<h1>{html.escape(title)}</h1>\n"
+        f"{body}\n" + (f"<script>\n{embeds}\n</script>\n" if specs else "") + "</body></html>\n"
+    )
+
+
+def _table(df: pd.DataFrame) -> str:
+    return df.to_html(index=False, border=0, na_rep="—", escape=True,
+                      float_format=lambda v: f"{v:,.4f}" if abs(v) < 10 else f"{v:,.0f}")
+
+
+def render_market(task: Dict[str, Any]) -> tuple[str, str]:
+    hist: pd.DataFrame = task["hist"]
+    row = hist.iloc[-1]
+    d_long, d_short = row["long_chg_1w"], -row["short_chg_1w"]
+    drivers = pd.DataFrame({
+        "metric": ["Δ long (1w)", "Δ short (1w)", "Implied Δ net"],
+        "value": [d_long, d_short, d_long + d_short],
+    })
+    score = row[task["score_col"]]
+    summary = pd.DataFrame([{
+        "as of": pd.Timestamp(row["date"]).strftime("%Y-%m-%d"),
+        "net": row["net"],
+        "% OI net": row["pct_oi_net"],
+        f"score ({REPORT_LOOKBACK})": score,
+        "flag": extreme_flags(pd.Series([score]), REPORT_SCORE_TYPE).iloc[0],
+    }])
+    body = (
+        f"<p>{html.escape(task['asset_class'])} · CFTC code {html.escape(str(task['cftc_code']))}</p>\n"
+        + _table(summary)
+        + "\n<h2>Positioning &amp; score over time</h2>\n<div id='chart' class='chart'></div>\n"
+        + "<h2>Driver breakdown</h2>\n<p>Δ short is S<sub>t-1</sub> − S<sub>t</sub> (short covering positive).</p>\n"
+        + _table(drivers)
+    )
+    spec = level_score_spec(hist, task["score_col"], task["market"])
+    return task["path"], _html_page(task["market"], body, {"chart": spec}, depth=1)
+
+
+def render_class(task: Dict[str, Any]) -> tuple[str, str]:
+    view: pd.DataFrame = task["view"]
+    tbl = view[["rank", "market_short", "date", "net", "pct_oi_net", "score", "chg", "flag"]].copy()
+    links = [f"<a href='../{p}'>{html.escape(m)}</a>" for p, m in zip(view["path"], view["market_short"])]
+    tbl["market_short"] = links
+    table = tbl.to_html(index=False, border=0, na_rep="—", escape=False,
+                        float_format=lambda v: f"{v:,.4f}" if abs(v) < 10 else f"{v:,.0f}")
+    body = (
+        f"<p>{REPORT_SCORE_TYPE} of % OI net over {REPORT_LOOKBACK}, change over {REPORT_HORIZON}; "
+        "ranked most extreme first.</p>\n<div id='scatter' class='chart'></div>\n" + table
+    )
+    return task["path"], _html_page(task["asset_class"], body, {"scatter": scatter_spec(view)}, depth=1)
+
+
+def render_index(task: Dict[str, Any]) -> tuple[str, str]:
+    parts = []
+    for cls, part in task["latest"].groupby("asset_class", sort=True):
+        items = "".join(
+            f"<li><a href='{p}'>{html.escape(m)}</a> — {s:.0f}{(' · ' + f) if f else ''}</li>"
+            if pd.notna(s) else f"<li><a href='{p}'>{html.escape(m)}</a></li>"
+            for p, m, s, f in zip(part["path"], part["market_short"], part["score"], part["flag"])
+        )
+        parts.append(f"<h2><a href='{class_page(cls)}'>{html.escape(cls)}</a></h2><ul>{items}</ul>")
+    body = f"<p>Report date {html.escape(task['as_of'])} · release {html.escape(str(task['version']))}</p>\n" + "\n".join(parts)
+    return task["path"], _html_page("CFTC CoT weekly positioning report", body, {}, depth=0)
+
+
+_RENDERERS = {"market": render_market, "class": render_class, "index": render_index}
+
+
+def _render(task: Dict[str, Any]) -> tuple[str, str]:
+    return _RENDERERS[task["kind"]](task)
+
+
+# Build
+
+
+def plan_pages(metrics: pd.DataFrame, latest: pd.DataFrame, cube: pd.DataFrame,
+               version: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    One task per page, each carrying only the data it renders and its input hash.
+    """
+    fp = _renderer_fingerprint()
+    score_col = score_column(REPORT_EXPRESSION, REPORT_SCORE_TYPE, REPORT_LOOKBACK)
+    cols = MARKET_COLS + ([score_col] if score_col not in MARKET_COLS else [])
+    tasks: List[Dict[str, Any]] = []
+
+    hist_all = metrics[["asset_class", "market", "cftc_code"] + cols].sort_values("date")
+    for (cls, mkt, code), hist in hist_all.groupby(["asset_class", "market", "cftc_code"], sort=False):
+        hist = hist[cols].reset_index(drop=True)
+        tasks.append({
+            "kind": "market", "path": market_page(mkt, code), "hist": hist, "score_col": score_col,
+            "market": mkt, "asset_class": cls, "cftc_code": code,
+            "hash": _hash_frame(hist, fp, mkt, cls, code),
+        })
+
+    sel = cube[
+        (cube["expression"] == REPORT_EXPRESSION) & (cube["score_type"] == REPORT_SCORE_TYPE)
+        & (cube["lookback"] == REPORT_LOOKBACK) & (cube["horizon"] == REPORT_HORIZON)
+        & (cube["basis"] == "own")
+    ]
+    for cls, part in sel.groupby("asset_class", observed=True, sort=True):
+        view = part.sort_values("rank_extreme").reset_index(drop=True)
+        view = view[["market", "market_short", "cftc_code", "date", "net", "pct_oi_net", "score", "chg", "flag"]]
+        view.insert(0, "rank", np.arange(1, len(view) + 1))
+        view["path"] = [market_page(m, c) for m, c in zip(view["market"], view["cftc_code"])]
+        tasks.append({"kind": "class", "path": class_page(str(cls)), "view": view, "asset_class": str(cls),
+                      "hash": _hash_frame(view, fp, str(cls))})
+
+    idx = latest[["asset_class", "market", "cftc_code", "date"]].copy()
+    idx["market_short"] = idx["market"].astype(str).map(short_market_name)
+    idx["score"] = pd.to_numeric(latest[score_col], errors="coerce") if score_col in latest.columns else np.nan
+    idx["flag"] = extreme_flags(idx["score"], REPORT_SCORE_TYPE)
+    idx["path"] = [market_page(m, c) for m, c in zip(idx["market"], idx["cftc_code"])]
+    idx = idx.sort_values(["asset_class", "market_short"]).reset_index(drop=True)
+    as_of = pd.to_datetime(idx["date"]).max()
+    as_of = as_of.strftime("%Y-%m-%d") if pd.notna(as_of) else "—"
+    tasks.append({"kind": "index", "path": "index.html", "latest": idx, "as_of": as_of, "version": version,
+                  "hash": _hash_frame(idx, fp, as_of, version)})
+    return tasks
+
+
+def build_site(
+    metrics: pd.DataFrame,
+    latest: pd.DataFrame,
+    cube: pd.DataFrame,
+    out_dir: str = SITE_DIR,
+    version: Optional[str] = None,
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, int]:
+    """
+    Render every page whose inputs changed (all of them with force=True) and
+    remove pages of markets that disappeared. Returns page counts.
+    """
+    inputs_path = os.path.join(out_dir, INPUTS_FILE)
+    prev: Dict[str, str] = {}
+    if os.path.exists(inputs_path):
+        with open(inputs_path) as f:
+            prev = json.load(f)
+
+    with span("report.plan") as sp:
+        tasks = plan_pages(metrics, latest, cube, version=version)
+        todo = [t for t in tasks
+                if force or prev.get(t["path"]) != t["hash"]
+                or not os.path.exists(os.path.join(out_dir, t["path"]))]
+        sp.set(rows=len(tasks))
+
+    with span("report.render", pages=len(todo)) as sp:
+        written = 0
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                for path, page in ex.map(_render, todo, chunksize=8):
+                    full = os.path.join(out_dir, path)
+                    os.makedirs(os.path.dirname(full), exist_ok=True)
+                    tmp = full + ".tmp"
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        f.write(page)
+                    os.replace(tmp, full)
+                    written += len(page)
+        sp.set(rows=len(todo), bytes=written)
+
+    current = {t["path"]: t["hash"] for t in tasks}
+    removed = 0
+    for path in set(prev) - set(current):
+        full = os.path.join(out_dir, path)
+        if os.path.exists(full):
+            os.remove(full)
+            removed += 1
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(inputs_path + ".tmp", "w") as f:
+        json.dump(current, f, indent=0, sort_keys=True)
+    os.replace(inputs_path + ".tmp", inputs_path)
+
+    return {"pages": len(tasks), "rendered": len(todo), "skipped": len(tasks) - len(todo), "removed": removed}
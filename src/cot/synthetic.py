@@ -0,0 +1,88 @@
+# src/cot/synthetic.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+### Synthetic tidy CoT panels for benchmarks and equivalence checks.
+### Produces the same columns as transform.standardize_* + combine_tidy, with the
+### awkward cases real CFTC data has: missing weeks, late listings, NaNs,
+### zero open interest and duplicated report dates.
+
+
+def make_synthetic_panel(
+    n_contracts: int = 50,
+    n_weeks: int = 520,
+    gap_frac: float = 0.02,
+    nan_frac: float = 0.01,
+    zero_oi_frac: float = 0.005,
+    dup_frac: float = 0.002,
+    late_start_frac: float = 0.2,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Random-walk long/short positions on a weekly Tuesday calendar.
+
+    gap_frac       share of contract-weeks dropped (holiday shifts, delisting gaps)
+    nan_frac       share of rows with NaN long/short
+    zero_oi_frac   share of rows with open_interest == 0 (-> NaN %OI)
+    dup_frac       share of rows duplicated with the same report date
+    late_start_frac share of contracts listed part-way through the sample
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2006-06-13", periods=n_weeks, freq="W-TUE")
+
+    codes = np.array([f"{i:06d}" for i in range(n_contracts)])
+    code_idx = np.repeat(np.arange(n_contracts), n_weeks)
+    week_idx = np.tile(np.arange(n_weeks), n_contracts)
+
+    # contract scale + random walks, all contracts at once
+    scale = rng.lognormal(mean=10, sigma=1, size=n_contracts)[:, None]
+    long_ = np.abs(scale * (1 + 0.05 * rng.standard_normal((n_contracts, n_weeks)).cumsum(axis=1)))
+    short = np.abs(scale * (1 + 0.05 * rng.standard_normal((n_contracts, n_weeks)).cumsum(axis=1)))
+    spreading = np.abs(scale * 0.1 * (1 + 0.02 * rng.standard_normal((n_contracts, n_weeks))))
+    oi = (long_ + short + spreading) * rng.uniform(1.5, 4.0, size=(n_contracts, 1))
+
+    df = pd.DataFrame({
+        "cftc_code": codes[code_idx],
+        "date": dates[week_idx],
+        "open_interest": np.round(oi.ravel()),
+        "long": np.round(long_.ravel()),
+        "short": np.round(short.ravel()),
+        "spreading": np.round(spreading.ravel()),
+    })
+
+    # late listings: drop everything before a random start week
+    late = rng.random(n_contracts) < late_start_frac
+    start_week = np.where(late, rng.integers(0, max(n_weeks // 2, 1), n_contracts), 0)
+    keep = week_idx >= start_week[code_idx]
+
+    # random gaps
+    keep &= rng.random(len(df)) >= gap_frac
+    df = df[keep].reset_index(drop=True)
+
+    n = len(df)
+    nan_mask = rng.random(n) < nan_frac
+    df.loc[nan_mask, ["long", "short"]] = np.nan
+    df.loc[rng.random(n) < zero_oi_frac, "open_interest"] = 0.0
+
+    dups = df[rng.random(n) < dup_frac].copy()
+    dups["long"] = dups["long"] * 1.01
+    df = pd.concat([df, dups], ignore_index=True)
+
+    df["net"] = df["long"] - df["short"]
+    oi_pos = df["open_interest"].where(df["open_interest"] > 0)
+    df["pct_oi_net"] = df["net"] / oi_pos
+    df["pct_oi_long"] = df["long"] / oi_pos
+    df["pct_oi_short"] = df["short"] / oi_pos
+
+    df["contract_name"] = "SYN " + df["cftc_code"]
+    df["market"] = df["contract_name"] + " - SYNTHETIC EXCHANGE"
+    df["dataset"] = np.where(df["cftc_code"].str[-1].astype(int) % 2 == 0, "TFF", "DIS")
+    df["group"] = np.where(df["dataset"] == "TFF", "leveraged_funds", "managed_money")
+    df["asset_class"] = np.where(df["dataset"] == "TFF", "FX", "Commodities")
+
+    cols = ["contract_name", "market", "cftc_code", "date", "open_interest", "long", "short",
+            "spreading", "net", "pct_oi_net", "pct_oi_long", "pct_oi_short",
+            "dataset", "group", "asset_class"]
+    return df[cols]
@@ -0,0 +1,149 @@
+# src/cot/tff_groups.py
+from __future__ import annotations
+
+import os
+from itertools import combinations
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.cot.instrument import span
+from src.cot.publish import read_manifest, release_path
+from src.cot.raw_store import RAW_HISTORY_DIR, RawStore
+from src.cot.report_calendar import calendar_grid, calendar_window_scores
+from src.cot.transform import TFF_GROUP_COLUMNS, infer_asset_class_from_market, required_raw_columns
+
+### All TFF trader categories side by side, and how far apart they sit.
+###
+### The main pipeline scores one category per contract (leveraged funds). Here
+### dealer / asset manager / leveraged funds positions come from the same raw
+### rows and are stacked into (category x contract) series, laid on the report
+### calendar (report_calendar.py) as one grid, so every category is scored by a
+### single pass of the window kernels. Per contract and report date:
+###
+###   <cat>_net, <cat>_pct_oi_net                      positions
+###   <cat>_<expr>_pctile_<lb>, <cat>_<expr>_z_<lb>    vs the category's own history
+###   <a>_vs_<b>_<expr>_pctile_<lb>                    pctile(a) - pctile(b), -100..100
+###   <a>_vs_<b>_<expr>_z_<lb>                         z(a) - z(b)
+###
+### e.g. asset_mgr_vs_lev_money_pct_oi_net_pctile_5y = +90 means asset managers
+### are near their 5y max long while leveraged funds are near their 5y max short.
+
+TFF_GROUPS_FILE = "cot_tff_groups.parquet"
+TFF_GROUPS = tuple(TFF_GROUP_COLUMNS)
+GROUP_EXPRESSIONS = ["net", "pct_oi_net"]
+GROUP_LOOKBACKS = {"3y": 156, "5y": 260}
+GROUP_MIN_COVERAGE = 0.9
+TFF_RAW_PATH = "data/raw/tff_raw.parquet"
+
+
+def load_tff_raw(path: str = TFF_RAW_PATH, history_root: str = RAW_HISTORY_DIR) -> Optional[pd.DataFrame]:
+    """
+    Latest TFF raw rows with every category's columns (raw store first, then
+    the flat parquet). None when neither has them, e.g. a lev_money-only pull.
+    """
+    cols = required_raw_columns("TFF", groups=TFF_GROUPS)
+    store = RawStore("tff", root=history_root)
+    if not store.empty and set(cols) <= set(store.columns):
+        return store.as_of(columns=cols)
+    if os.path.exists(path):
+        if set(cols) <= set(pq.read_schema(path).names):
+            return pd.read_parquet(path, columns=cols)
+    return None
+
+
+def stack_groups(raw: pd.DataFrame, groups: tuple[str, ...] = TFF_GROUPS) -> tuple[pd.DataFrame, Dict[str, np.ndarray]]:
+    """
+    (one row per contract x report date, {expr: (groups x rows) array}).
+    """
+    rows = raw[required_raw_columns("TFF", groups=groups)].rename(columns={
+        "contract_market_name": "contract_name",
+        "market_and_exchange_names": "market",
+        "cftc_contract_market_code": "cftc_code",
+        "report_date_as_yyyy_mm_dd": "date",
+        "open_interest_all": "open_interest",
+    })
+    rows["date"] = pd.to_datetime(rows["date"], errors="coerce")
+    rows = (rows.dropna(subset=["date"])
+                .sort_values(["cftc_code", "date"])
+                .drop_duplicates(["cftc_code", "date"], keep="last")
+                .reset_index(drop=True))
+
+    def num(c: str) -> np.ndarray:
+        return pd.to_numeric(rows[c], errors="coerce").to_numpy(dtype=float)
+
+    long_ = np.stack([num(TFF_GROUP_COLUMNS[g][0]) for g in groups])
+    short = np.stack([num(TFF_GROUP_COLUMNS[g][1]) for g in groups])
+    oi = num("open_interest")
+    net = long_ - short
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = net / np.where(oi > 0, oi, np.nan)
+
+    base = rows[["contract_name", "market", "cftc_code", "date"]].copy()
+    base["open_interest"] = oi
+    base["asset_class"] = base["market"].map(infer_asset_class_from_market)
+    return base, {"net": net, "pct_oi_net": pct}
+
+
+def build_tff_groups(
+    raw: pd.DataFrame,
+    groups: tuple[str, ...] = TFF_GROUPS,
+    expressions: Optional[list[str]] = None,
+    lookbacks_weeks: Optional[Dict[str, int]] = None,
+    min_coverage: float = GROUP_MIN_COVERAGE,
+) -> pd.DataFrame:
+    """
+    Per-category positions and scores plus pairwise divergences, one row per
+    (cftc_code, date).
+    """
+    expressions = expressions or GROUP_EXPRESSIONS
+    lookbacks_weeks = lookbacks_weeks or GROUP_LOOKBACKS
+
+    with span("tff_groups.stack", groups=len(groups)) as sp:
+        base, values = stack_groups(raw, groups)
+        sp.set(rows=len(base))
+
+    # (category, contract) series stacked end to end: one calendar grid whose
+    # contract ids are offset per category, so the kernels run once for all
+    cal = calendar_grid(base, ["cftc_code"])
+    n_contracts = int(cal.contract.max()) + 1 if cal.size else 0
+    contract = np.concatenate([cal.contract + k * n_contracts for k in range(len(groups))])
+
+    cols: Dict[str, np.ndarray] = {}
+    for expr in expressions:
+        v = values[expr]
+        for k, g in enumerate(groups):
+            cols[f"{g}_{expr}"] = v[k]
+        grid = np.concatenate([cal.scatter(v[k]) for k in range(len(groups))])
+
+        for tag, w in lookbacks_weeks.items():
+            with span("tff_groups.scores", expr=expr, lookback=tag) as sp:
+                s = calendar_window_scores(grid, contract, w, min_coverage)
+                sp.set(rows=len(grid))
+            # back to (groups x rows)
+            per = {kind: s[kind].reshape(len(groups), cal.size)[:, cal.pos] for kind in ("pctile", "z")}
+            for kind, arr in per.items():
+                for k, g in enumerate(groups):
+                    cols[f"{g}_{expr}_{kind}_{tag}"] = arr[k]
+                for a, b in combinations(range(len(groups)), 2):
+                    cols[f"{groups[a]}_vs_{groups[b]}_{expr}_{kind}_{tag}"] = arr[a] - arr[b]
+
+    return pd.concat([base, pd.DataFrame(cols, index=base.index)], axis=1)
+
+
+def divergence_columns(df: pd.DataFrame) -> list[str]:
+    return [c for c in df.columns if "_vs_" in c]
+
+
+def load_tff_groups(manifest: dict | None = None) -> Optional[pd.DataFrame]:
+    """
+    Published per-category table for the current release (None for releases without one).
+    """
+    if manifest is None:
+        manifest = read_manifest()
+    path = release_path(TFF_GROUPS_FILE, manifest=manifest)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
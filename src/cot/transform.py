@@ -2,6 +2,39 @@
 from __future__ import annotations
 import pandas as pd
 
+from src.cot.config import ASSET_CLASS_MAP
+from src.cot.instrument import span
+
+
+# raw Socrata columns each transform reads (fetch.py projects $select onto these)
+RAW_ID_COLUMNS = [
+    "contract_market_name",
+    "market_and_exchange_names",
+    "cftc_contract_market_code",
+    "report_date_as_yyyy_mm_dd",
+    "open_interest_all",
+]
+TFF_GROUP_COLUMNS = {
+    "dealer": ("dealer_positions_long_all", "dealer_positions_short_all", "dealer_positions_spread_all"),
+    "asset_mgr": ("asset_mgr_positions_long_all", "asset_mgr_positions_short_all", "asset_mgr_positions_spread_all"),
+    "lev_money": ("lev_money_positions_long", "lev_money_positions_short", "lev_money_positions_spread"),
+}
+# tidy "group" label per TFF trader category
+TFF_GROUP_LABELS = {"dealer": "dealer", "asset_mgr": "asset_manager", "lev_money": "leveraged_funds"}
+DIS_MANAGED_MONEY_COLUMNS = ("m_money_positions_long_all", "m_money_positions_short_all", "m_money_positions_spread")
+
+
+def required_raw_columns(dataset: str, groups: tuple[str, ...] = ("lev_money",)) -> list[str]:
+    """
+    Raw columns needed to standardize `dataset` ("TFF" for the given trader
+    groups, "DIS" for managed money).
+    """
+    if dataset == "TFF":
+        return RAW_ID_COLUMNS + [c for g in groups for c in TFF_GROUP_COLUMNS[g]]
+    if dataset == "DIS":
+        return RAW_ID_COLUMNS + list(DIS_MANAGED_MONEY_COLUMNS)
+    raise ValueError(f"Unknown dataset={dataset}")
+
 
 def _to_datetime(s: pd.Series) -> pd.Series:
     return pd.to_datetime(s, errors="coerce")
@@ -12,6 +45,13 @@ def _to_numeric(s: pd.Series) -> pd.Series:
 
 
 def standardize_tff_group(df_raw: pd.DataFrame, group: str = "lev_money") -> pd.DataFrame:
+    with span("transform.tff", group=group) as sp:
+        out = _standardize_tff_group(df_raw, group)
+        sp.set(rows=len(out))
+    return out
+
+
+def _standardize_tff_group(df_raw: pd.DataFrame, group: str) -> pd.DataFrame:
     df = df_raw.copy()
 
     date_col = "report_date_as_yyyy_mm_dd"
@@ -20,16 +60,10 @@ def standardize_tff_group(df_raw: pd.DataFrame, group: str = "lev_money") -> pd.
     code_col = "cftc_contract_market_code"
     name_col = "contract_market_name"   
 
-    group_map = {
-        "dealer": ("dealer_positions_long_all", "dealer_positions_short_all", "dealer_positions_spread_all"),
-        "asset_mgr": ("asset_mgr_positions_long_all", "asset_mgr_positions_short_all", "asset_mgr_positions_spread_all"),
-        "lev_money": ("lev_money_positions_long", "lev_money_positions_short", "lev_money_positions_spread"),
-    }
-
-    if group not in group_map:
-        raise ValueError(f"Unknown group={group}. Use one of: {list(group_map.keys())}")
+    if group not in TFF_GROUP_COLUMNS:
+        raise ValueError(f"Unknown group={group}. Use one of: {list(TFF_GROUP_COLUMNS.keys())}")
 
-    long_col, short_col, spread_col = group_map[group]
+    long_col, short_col, spread_col = TFF_GROUP_COLUMNS[group]
 
     needed = [
         name_col,                
@@ -69,7 +103,7 @@ def standardize_tff_group(df_raw: pd.DataFrame, group: str = "lev_money") -> pd.
     out["pct_oi_short"] = out["short"] / oi.where(oi > 0)
 
     out["dataset"] = "TFF"
-    out["group"] = "leveraged_funds"
+    out["group"] = TFF_GROUP_LABELS[group]
 
     out = (
         out
@@ -81,6 +115,13 @@ def standardize_tff_group(df_raw: pd.DataFrame, group: str = "lev_money") -> pd.
 
 
 def standardize_dis_managed_money(df_raw: pd.DataFrame) -> pd.DataFrame:
+    with span("transform.dis", group="managed_money") as sp:
+        out = _standardize_dis_managed_money(df_raw)
+        sp.set(rows=len(out))
+    return out
+
+
+def _standardize_dis_managed_money(df_raw: pd.DataFrame) -> pd.DataFrame:
     df = df_raw.copy()
 
     date_col = "report_date_as_yyyy_mm_dd"
@@ -89,9 +130,7 @@ def standardize_dis_managed_money(df_raw: pd.DataFrame) -> pd.DataFrame:
     code_col = "cftc_contract_market_code"
     name_col = "contract_market_name"   
 
-    long_col = "m_money_positions_long_all"
-    short_col = "m_money_positions_short_all"
-    spread_col = "m_money_positions_spread"
+    long_col, short_col, spread_col = DIS_MANAGED_MONEY_COLUMNS
 
     needed = [
         name_col,              
@@ -140,3 +179,24 @@ def standardize_dis_managed_money(df_raw: pd.DataFrame) -> pd.DataFrame:
     )
 
     return out.reset_index(drop=True)
+
+
+def infer_asset_class_from_market(market: str) -> str:
+    """
+    market looks like: 'CORN - CHICAGO BOARD OF TRADE'
+    We match using the base name before ' - '.
+    """
+    base = market.split(" - ")[0].strip()
+    for cls, names in ASSET_CLASS_MAP.items():
+        if base in names:
+            return cls
+    return "Other"
+
+
+def combine_tidy(df_tff: pd.DataFrame, df_dis: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stack TFF + DIS tidy frames and add the asset_class label used by the dashboard.
+    """
+    df = pd.concat([df_tff, df_dis], ignore_index=True)
+    df["asset_class"] = df["market"].map(infer_asset_class_from_market)
+    return df